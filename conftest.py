@@ -1,14 +1,20 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client
 from rest_framework.test import APIClient
+
+from users.api import generate_access_token
 from users.models import UserSettings
 
 User = get_user_model()
 
+
 @pytest.fixture
 def api_client():
     return APIClient()
 
+
 @pytest.fixture
 def test_user(db):
     user = User.objects.create_user(
@@ -21,6 +27,7 @@ def test_user(db):
     UserSettings.objects.create(user=user)
     return user
 
+
 @pytest.fixture
 def test_user2(db):
     user = User.objects.create_user(
@@ -33,6 +40,7 @@ def test_user2(db):
     UserSettings.objects.create(user=user)
     return user
 
+
 @pytest.fixture
 def admin_user(db):
     user = User.objects.create_superuser(
@@ -43,12 +51,41 @@ def admin_user(db):
     UserSettings.objects.create(user=user)
     return user
 
+
 @pytest.fixture
 def authenticated_client(api_client, test_user):
     api_client.force_authenticate(user=test_user)
     return api_client
 
+
 @pytest.fixture
 def admin_client(api_client, admin_user):
     api_client.force_authenticate(user=admin_user)
-    return api_client 
\ No newline at end of file
+    return api_client
+
+
+@pytest.fixture
+def local_cache(settings):
+    """Cache en mémoire du processus à la place de Redis, diffusion des posts synchrone"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.FEED_FANOUT_ASYNC = False
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def client(test_user):
+    """Client de test authentifié par un jeton de test_user"""
+    return Client(HTTP_AUTHORIZATION=f'Bearer {generate_access_token(test_user)}')
+
+
+@pytest.fixture
+def local_buffer(local_cache, settings):
+    """Tampon des compteurs en mémoire du processus, vidé uniquement à la demande"""
+    from social import counters
+
+    settings.COUNTERS_FLUSH_INTERVAL = 3600
+    counters._local.clear()
+    yield
+    counters._local.clear()
@@ -2,13 +2,18 @@ from typing import List, Optional
 from ninja import Router, Schema, File
 from ninja.files import UploadedFile
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.http import HttpResponse
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.core.cache import cache
 from datetime import datetime, timedelta
 from django.utils import timezone
 
 from users.api import AuthBearer
 from .models import Conversation, Message, MessageReaction
 from users.models import User
+from yoursocial.pagination import paginate_keyset
 
 router = Router()
 
@@ -40,39 +45,64 @@ class ConversationResponseSchema(Schema):
 class MessageReactionSchema(Schema):
     emoji: str
 
+def _unread_count(user):
+    """Annotation : messages non lus reçus par `user` dans la conversation, sans requête par ligne"""
+    unread = Message.objects.filter(
+        conversation=OuterRef('pk'), is_read=False
+    ).exclude(sender=user).order_by().values('conversation').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(unread), Value(0))
+
+def _inbox_queryset(user):
+    """Conversations de `user` avec participants, dernier message et nombre de non-lus"""
+    return Conversation.objects.filter(
+        participants=user
+    ).select_related('last_message__sender').prefetch_related('participants').annotate(
+        unread_count=_unread_count(user)
+    )
+
+def _message_dict(msg):
+    return {
+        'id': msg.id,
+        'conversation_id': msg.conversation_id,
+        'sender_id': msg.sender_id,
+        'sender_username': msg.sender.username,
+        'content': msg.content,
+        'media': msg.media.url if msg.media else None,
+        'media_type': msg.media_type,
+        'is_read': msg.is_read,
+        'created_at': msg.created_at,
+        'updated_at': msg.updated_at
+    }
+
+def _conversation_dict(conv):
+    return {
+        'id': conv.id,
+        'participants': [
+            {
+                'id': p.id,
+                'username': p.username,
+                'avatar': p.avatar.url if p.avatar else None
+            }
+            for p in conv.participants.all()
+        ],
+        'last_message': _message_dict(conv.last_message) if conv.last_message else None,
+        'updated_at': conv.updated_at,
+        'unread_count': conv.unread_count
+    }
+
 # Routes pour les conversations
 @router.get("/conversations", response=List[ConversationResponseSchema], auth=AuthBearer())
-def list_conversations(request, page: int = 1, limit: int = 20):
-    start = (page - 1) * limit
-    end = start + limit
-    
-    conversations = Conversation.objects.filter(
-        participants=request.user
-    ).select_related('last_message').prefetch_related('participants')[start:end]
-    
-    result = []
-    for conv in conversations:
-        unread_count = Message.objects.filter(
-            conversation=conv,
-            is_read=False
-        ).exclude(sender=request.user).count()
-        
-        result.append({
-            'id': conv.id,
-            'participants': [
-                {
-                    'id': p.id,
-                    'username': p.username,
-                    'avatar': p.avatar.url if p.avatar else None
-                }
-                for p in conv.participants.all()
-            ],
-            'last_message': conv.last_message,
-            'updated_at': conv.updated_at,
-            'unread_count': unread_count
-        })
-    
-    return result
+def list_conversations(request, response: HttpResponse, page: int = 1, limit: int = 20, cursor: Optional[str] = None):
+    conversations = paginate_keyset(
+        _inbox_queryset(request.user), response, cursor, page, limit, ordering=('-updated_at', '-id'),
+    )
+    return [_conversation_dict(conv) for conv in conversations]
+
+# Conversations récentes (déclarée avant /conversations/{conversation_id})
+@router.get("/conversations/recent", response=List[ConversationResponseSchema], auth=AuthBearer())
+def get_recent_conversations(request, limit: int = 5):
+    conversations = _inbox_queryset(request.user).order_by('-updated_at')[:limit]
+    return [_conversation_dict(conv) for conv in conversations]
 
 @router.post("/conversations", response=ConversationResponseSchema, auth=AuthBearer())
 def create_conversation(request, participant_id: int):
@@ -145,38 +175,25 @@ def send_message(request, conversation_id: int, payload: MessageCreateSchema):
     }
 
 @router.get("/conversations/{conversation_id}/messages", response=List[MessageResponseSchema], auth=AuthBearer())
-def list_messages(request, conversation_id: int, page: int = 1, limit: int = 50):
+def list_messages(request, response: HttpResponse, conversation_id: int, page: int = 1, limit: int = 50,
+                  cursor: Optional[str] = None):
     conversation = get_object_or_404(
         Conversation.objects.filter(participants=request.user),
         id=conversation_id
     )
     
-    start = (page - 1) * limit
-    end = start + limit
-    
-    messages = Message.objects.filter(
-        conversation=conversation
-    ).select_related('sender').order_by('-created_at')[start:end]
+    messages = paginate_keyset(
+        Message.objects.filter(conversation=conversation).select_related('sender'),
+        response, cursor, page, limit,
+    )
     
     # Marquer les messages comme lus
-    unread_messages = messages.filter(is_read=False).exclude(sender=request.user)
+    unread_messages = Message.objects.filter(
+        id__in=[msg.id for msg in messages], is_read=False
+    ).exclude(sender=request.user)
     unread_messages.update(is_read=True, read_at=timezone.now())
     
-    return [
-        {
-            'id': msg.id,
-            'conversation_id': conversation.id,
-            'sender_id': msg.sender.id,
-            'sender_username': msg.sender.username,
-            'content': msg.content,
-            'media': msg.media.url if msg.media else None,
-            'media_type': msg.media_type,
-            'is_read': msg.is_read,
-            'created_at': msg.created_at,
-            'updated_at': msg.updated_at
-        }
-        for msg in messages
-    ]
+    return [_message_dict(msg) for msg in messages]
 
 # Routes pour les réactions aux messages
 @router.post("/messages/{message_id}/reactions", auth=AuthBearer())
@@ -326,70 +343,23 @@ def mark_conversation_as_read(request, conversation_id: int):
     
     return {"marked_as_read": count}
 
-# Routes pour les conversations récentes
-@router.get("/conversations/recent", response=List[ConversationResponseSchema], auth=AuthBearer())
-def get_recent_conversations(request, limit: int = 5):
-    conversations = Conversation.objects.filter(
-        participants=request.user
-    ).select_related('last_message').prefetch_related('participants').order_by('-updated_at')[:limit]
-    
-    result = []
-    for conv in conversations:
-        unread_count = Message.objects.filter(
-            conversation=conv,
-            is_read=False
-        ).exclude(sender=request.user).count()
-        
-        result.append({
-            'id': conv.id,
-            'participants': [
-                {
-                    'id': p.id,
-                    'username': p.username,
-                    'avatar': p.avatar.url if p.avatar else None
-                }
-                for p in conv.participants.all()
-            ],
-            'last_message': conv.last_message,
-            'updated_at': conv.updated_at,
-            'unread_count': unread_count
-        })
-    
-    return result
-
 # Routes pour les statistiques de messagerie
 @router.get("/statistics", auth=AuthBearer())
 def get_messaging_statistics(request):
     user = request.user
-    
-    # Conversations totales
-    total_conversations = Conversation.objects.filter(participants=user).count()
-    
-    # Messages envoyés
-    messages_sent = Message.objects.filter(sender=user).count()
-    
-    # Messages reçus
-    messages_received = Message.objects.filter(
-        conversation__participants=user
-    ).exclude(sender=user).count()
-    
-    # Messages non lus
-    unread_messages = Message.objects.filter(
-        conversation__participants=user,
-        is_read=False
-    ).exclude(sender=user).count()
-    
-    # Messages des dernières 24h
-    yesterday = timezone.now() - timedelta(days=1)
-    messages_24h = Message.objects.filter(
-        conversation__participants=user,
-        created_at__gte=yesterday
-    ).count()
-    
-    return {
-        'total_conversations': total_conversations,
-        'messages_sent': messages_sent,
-        'messages_received': messages_received,
-        'unread_messages': unread_messages,
-        'messages_24h': messages_24h
-    } 
\ No newline at end of file
+    key = f'messaging:statistics:{user.id}'
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    # Une seule agrégation : conversations de l'utilisateur jointes à leurs messages
+    received = ~Q(messages__sender=user)
+    stats = Conversation.objects.filter(participants=user).aggregate(
+        total_conversations=Count('pk', distinct=True),
+        messages_sent=Count('messages', filter=Q(messages__sender=user)),
+        messages_received=Count('messages', filter=received),
+        unread_messages=Count('messages', filter=received & Q(messages__is_read=False)),
+        messages_24h=Count('messages', filter=Q(messages__created_at__gte=timezone.now() - timedelta(days=1))),
+    )
+    cache.set(key, stats, settings.USER_STATISTICS_CACHE_TIMEOUT)
+    return stats
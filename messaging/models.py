@@ -27,6 +27,10 @@ class Conversation(models.Model):
         verbose_name = _('conversation')
         verbose_name_plural = _('conversations')
         ordering = ['-updated_at']
+        # Index de la pagination par curseur
+        indexes = [
+            models.Index(fields=['-updated_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Conversation entre {', '.join(p.username for p in self.participants.all())}"
@@ -70,6 +74,13 @@ class Message(models.Model):
         verbose_name = _('message')
         verbose_name_plural = _('messages')
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['conversation', '-created_at', '-id']),
+            # Messages non lus d'une conversation (hors expéditeur)
+            models.Index(fields=['conversation', 'is_read', 'sender']),
+            # Agrégation horaire (social/metrics.py)
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Message de {self.sender.username} dans {self.conversation}"
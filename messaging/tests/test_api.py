@@ -2,7 +2,6 @@ import pytest
 from django.urls import reverse
 from rest_framework import status
 from messaging.models import Conversation, Message, MessageReaction
-from users.tests.conftest import authenticated_client, test_user, test_user2
 
 @pytest.mark.django_db
 class TestConversationAPI:
@@ -163,4 +162,28 @@ class TestMessageReactionAPI:
         url = reverse('api:list_reactions', kwargs={'message_id': message.id})
         response = authenticated_client.get(url)
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 2 
\ No newline at end of file
+        assert len(response.data) == 2 
+
+
+@pytest.mark.django_db
+def test_list_messages_cursor_pagination(client, test_user, test_user2):
+    conversation = Conversation.objects.create()
+    conversation.participants.add(test_user, test_user2)
+    messages = [
+        Message.objects.create(conversation=conversation, sender=test_user2, content=f'Message {i}')
+        for i in range(5)
+    ]
+    url = f'/api/messaging/conversations/{conversation.id}/messages'
+
+    ids = []
+    params = {'limit': 2}
+    while True:
+        response = client.get(url, params)
+        assert response.status_code == 200
+        ids.extend(message['id'] for message in response.json())
+        if 'X-Next-Cursor' not in response.headers:
+            break
+        params = {'limit': 2, 'cursor': response.headers['X-Next-Cursor']}
+
+    assert ids == [message.id for message in reversed(messages)]
+    assert not Message.objects.filter(conversation=conversation, is_read=False).exists()
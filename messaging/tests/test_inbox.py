@@ -0,0 +1,59 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from messaging.models import Conversation, Message
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+def inbox(user, other, size):
+    """`size` conversations ; la i-ème a i messages non lus de `other` et un message lu de `user`"""
+    conversations = []
+    for i in range(size):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(user, other)
+        Message.objects.bulk_create(
+            [Message(conversation=conversation, sender=other, content=f'm{n}') for n in range(i % 4)]
+        )
+        last = Message.objects.create(conversation=conversation, sender=user, content='r', is_read=True)
+        Conversation.objects.filter(pk=conversation.pk).update(last_message=last)
+        conversations.append(conversation)
+    return conversations
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response.json(), len(queries)
+
+
+@pytest.mark.django_db
+class TestInbox:
+    def test_unread_counts_and_last_message(self, client, test_user, test_user2):
+        inbox(test_user, test_user2, 4)
+        conversations, _ = count_queries(client, '/api/messaging/conversations')
+        assert sorted(conv['unread_count'] for conv in conversations) == [0, 1, 2, 3]
+        last = conversations[0]['last_message']
+        assert (last['sender_username'], last['content']) == (test_user.username, 'r')
+
+    def test_constant_queries_for_50_conversations(self, client, test_user, test_user2):
+        inbox(test_user, test_user2, 5)
+        # Première requête : utilisateur authentifié mis en cache
+        client.get('/api/messaging/conversations')
+        _, small = count_queries(client, '/api/messaging/conversations?limit=50')
+        inbox(test_user, test_user2, 45)
+        conversations, large = count_queries(client, '/api/messaging/conversations?limit=50')
+        assert len(conversations) == 50
+        # Conversations annotées avec leur dernier message, puis participants
+        assert large == small == 2
+
+    def test_recent_conversations(self, client, test_user, test_user2):
+        inbox(test_user, test_user2, 50)
+        client.get('/api/messaging/conversations/recent')
+        conversations, small = count_queries(client, '/api/messaging/conversations/recent?limit=5')
+        assert [conv['unread_count'] for conv in conversations] == [1, 0, 3, 2, 1]
+        _, large = count_queries(client, '/api/messaging/conversations/recent?limit=50')
+        assert large == small
@@ -1,7 +1,6 @@
 import pytest
 from django.utils import timezone
 from messaging.models import Conversation, Message, MessageReaction
-from users.tests.conftest import test_user, test_user2
 
 @pytest.mark.django_db
 class TestConversationModel:
@@ -0,0 +1,39 @@
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from messaging.models import Conversation, Message
+from users.api import generate_access_token
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+@pytest.mark.django_db
+class TestMessagingStatistics:
+    url = '/api/messaging/statistics'
+
+    def test_single_aggregate_then_cache(self, test_user, test_user2):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(test_user, test_user2)
+        Conversation.objects.create().participants.add(test_user)
+        Message.objects.create(conversation=conversation, sender=test_user, content='a')
+        Message.objects.create(conversation=conversation, sender=test_user2, content='b', is_read=True)
+        Message.objects.create(conversation=conversation, sender=test_user2, content='c')
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {generate_access_token(test_user)}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        assert response.json() == {
+            'total_conversations': 2,
+            'messages_sent': 1,
+            'messages_received': 2,
+            'unread_messages': 1,
+            'messages_24h': 3,
+        }
+        assert len([q for q in queries if 'messaging_' in q['sql']]) == 1
+
+        with CaptureQueriesContext(connection) as queries:
+            assert client.get(self.url).json()['messages_sent'] == 1
+        assert not [q for q in queries if 'messaging_' in q['sql']]
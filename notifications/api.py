@@ -1,10 +1,12 @@
 from typing import List, Optional
 from ninja import Router, Schema
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponse
 from django.utils import timezone
 from django.db.models import Q
 
 from users.api import AuthBearer
+from yoursocial.pagination import paginate_keyset
 from .models import Notification, NotificationPreference
 
 router = Router()
@@ -34,21 +36,20 @@ class NotificationPreferenceSchema(Schema):
     story_notifications: bool
 
 # Routes pour les notifications
-@router.get("/notifications", response=List[NotificationResponseSchema], auth=AuthBearer())
-def list_notifications(request, page: int = 1, limit: int = 20, unread_only: bool = False):
-    start = (page - 1) * limit
-    end = start + limit
-    
+@router.get("/notifications", response=List[NotificationResponseSchema], auth=AuthBearer(claims_only=True))
+def list_notifications(request, response: HttpResponse, page: int = 1, limit: int = 20, unread_only: bool = False,
+                       cursor: Optional[str] = None):
     notifications = Notification.objects.filter(
-        recipient=request.user
+        recipient_id=request.user.id
     )
     
     if unread_only:
         notifications = notifications.filter(is_read=False)
     
-    notifications = notifications.select_related(
-        'sender', 'content_type'
-    ).order_by('-created_at')[start:end]
+    notifications = paginate_keyset(
+        notifications.select_related('sender', 'content_type'),
+        response, cursor, page, limit,
+    )
     
     return [
         {
@@ -94,10 +95,10 @@ def mark_all_notifications_as_read(request):
     
     return {"marked_as_read": count}
 
-@router.get("/notifications/unread-count", auth=AuthBearer())
+@router.get("/notifications/unread-count", auth=AuthBearer(claims_only=True))
 def get_unread_count(request):
     count = Notification.objects.filter(
-        recipient=request.user,
+        recipient_id=request.user.id,
         is_read=False
     ).count()
     
@@ -51,6 +51,11 @@ class Notification(models.Model):
         verbose_name = _('notification')
         verbose_name_plural = _('notifications')
         ordering = ['-created_at']
+        # Index de la pagination par curseur et des notifications non lues
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id']),
+            models.Index(fields=['recipient', 'is_read', '-created_at']),
+        ]
 
     def __str__(self):
         return f"Notification pour {self.recipient.username} - {self.get_notification_type_display()}"
@@ -2,7 +2,7 @@ import pytest
 from django.urls import reverse
 from rest_framework import status
 from notifications.models import Notification, NotificationPreference
-from users.tests.conftest import authenticated_client, test_user, test_user2
+from users.cache import clear_local_cache
 
 @pytest.mark.django_db
 class TestNotificationAPI:
@@ -138,4 +138,22 @@ class TestNotificationPreferenceAPI:
         assert not preferences.post_mention_notifications
         assert preferences.comment_notifications
         assert not preferences.like_notifications
-        assert preferences.message_notifications 
\ No newline at end of file
+        assert preferences.message_notifications 
+
+
+@pytest.mark.django_db
+def test_list_notifications_runs_off_token_claims(client, test_user, test_user2, local_cache, django_assert_num_queries):
+    clear_local_cache()
+    Notification.objects.create(
+        recipient=test_user,
+        sender=test_user2,
+        notification_type='follow',
+        content='Test notification'
+    )
+    # Premier appel : l'état partagé du jeton est publié
+    client.get('/api/notifications/notifications')
+    # Une seule requête : les notifications (aucun chargement de l'utilisateur courant)
+    with django_assert_num_queries(1):
+        response = client.get('/api/notifications/notifications')
+    assert response.status_code == 200
+    assert [n['sender_username'] for n in response.json()] == ['testuser2']
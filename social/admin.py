@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Post, Comment, Like, Story, StoryView
+from .models import Post, Comment, Like, Story, StoryView, Hashtag, StatisticsSnapshot
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -35,3 +35,14 @@ class StoryViewAdmin(admin.ModelAdmin):
     list_filter = ('viewed_at',)
     search_fields = ('story__author__username', 'viewer__username')
     date_hierarchy = 'viewed_at'
+
+@admin.register(Hashtag)
+class HashtagAdmin(admin.ModelAdmin):
+    list_display = ('tag', 'posts_count', 'stories_count', 'last_used')
+    search_fields = ('tag',)
+    readonly_fields = ('posts_count', 'stories_count', 'last_used')
+
+@admin.register(StatisticsSnapshot)
+class StatisticsSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'total_users', 'total_posts', 'active_users_24h', 'new_posts_24h')
+    date_hierarchy = 'created_at'
@@ -1,14 +1,21 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from ninja import Router, Schema, File
 from ninja.files import UploadedFile
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, F
 from django.utils import timezone
 from datetime import datetime, timedelta
 
 from users.api import AuthBearer, PostResponseSchema
-from .models import Story, StoryView, Post
+from . import autocomplete, hot, trending
+from .hashtags import normalize
+from .likes import set_viewer_flags
+from .models import Hashtag, Post, Story, StoryView
 from users.models import User
+from yoursocial.pagination import paginate_keyset
 
 router = Router()
 
@@ -40,7 +47,11 @@ class HashtagResponseSchema(Schema):
     tag: str
     posts_count: int
     stories_count: int
-    last_used: datetime
+    last_used: Optional[datetime]
+
+class HashtagSuggestionSchema(Schema):
+    tag: str
+    count: int
 
 # Routes pour les stories
 @router.post("/stories", response=StoryResponseSchema, auth=AuthBearer())
@@ -81,13 +92,17 @@ def create_story(request, payload: StoryCreateSchema):
         'has_viewed': False
     }
 
-@router.get("/stories", response=List[StoryResponseSchema], auth=AuthBearer())
+@router.get("/stories", response=List[StoryResponseSchema], auth=AuthBearer(claims_only=True))
 def list_stories(request):
     # Récupérer les stories des utilisateurs suivis et de l'utilisateur courant
-    # qui n'ont pas expiré
+    # qui n'ont pas expiré (uniquement par ID : request.user vient des claims)
+    following_ids = User.following.through.objects.filter(
+        from_user_id=request.user.id
+    ).values('to_user_id')
+    
     stories = Story.objects.filter(
-        Q(author=request.user) |
-        Q(author__in=request.user.following.all())
+        Q(author_id=request.user.id) |
+        Q(author_id__in=following_ids)
     ).filter(
         expires_at__gt=timezone.now()
     ).select_related('author').prefetch_related(
@@ -99,7 +114,7 @@ def list_stories(request):
         view.story_id: view
         for view in StoryView.objects.filter(
             story__in=stories,
-            viewer=request.user
+            viewer_id=request.user.id
         )
     }
     
@@ -173,75 +188,31 @@ def list_story_views(request, story_id: int):
 # Routes pour les hashtags
 @router.get("/hashtags", response=List[HashtagResponseSchema], auth=AuthBearer())
 def list_hashtags(request, query: Optional[str] = None, limit: int = 20):
-    # Récupérer les hashtags les plus utilisés
-    hashtags = Post.objects.exclude(
-        hashtags__isnull=True
-    ).values_list(
-        'hashtags', flat=True
-    )
-    
-    # Aplatir la liste des hashtags
-    all_hashtags = []
-    for tags in hashtags:
-        all_hashtags.extend(tags)
+    # Hashtags les plus utilisés, triés sur l'index de popularité
+    hashtags = Hashtag.objects.annotate(
+        usage=F('posts_count') + F('stories_count')
+    ).filter(usage__gt=0)
     
-    # Filtrer par la requête si fournie
+    # Filtrer par préfixe de la forme normalisée (LIKE 'q%', couvert par l'index unique de tag)
     if query:
-        all_hashtags = [tag for tag in all_hashtags if query.lower() in tag.lower()]
-    
-    # Compter les occurrences
-    hashtag_counts = {}
-    for tag in all_hashtags:
-        if tag not in hashtag_counts:
-            hashtag_counts[tag] = {
-                'posts_count': 0,
-                'stories_count': 0,
-                'last_used': None
-            }
-        hashtag_counts[tag]['posts_count'] += 1
-    
-    # Ajouter les hashtags des stories
-    story_hashtags = Story.objects.exclude(
-        hashtags__isnull=True
-    ).values_list('hashtags', flat=True)
-    
-    for tags in story_hashtags:
-        for tag in tags:
-            if tag not in hashtag_counts:
-                hashtag_counts[tag] = {
-                    'posts_count': 0,
-                    'stories_count': 0,
-                    'last_used': None
-                }
-            hashtag_counts[tag]['stories_count'] += 1
-    
-    # Trier par popularité
-    sorted_hashtags = sorted(
-        hashtag_counts.items(),
-        key=lambda x: x[1]['posts_count'] + x[1]['stories_count'],
-        reverse=True
-    )[:limit]
+        hashtags = hashtags.filter(tag__startswith=normalize(query) or query.lower())
     
-    return [
-        {
-            'tag': tag,
-            'posts_count': data['posts_count'],
-            'stories_count': data['stories_count'],
-            'last_used': data['last_used']
-        }
-        for tag, data in sorted_hashtags
-    ]
+    return hashtags.order_by('-usage', 'tag')[:limit]
+
+@router.get("/hashtags/autocomplete", response=List[HashtagSuggestionSchema], auth=AuthBearer(claims_only=True))
+def autocomplete_hashtags(request, q: str, limit: int = 10):
+    # Servi depuis l'index en mémoire (social/autocomplete.py), sans requête SQL
+    return [{'tag': tag, 'count': count} for tag, count in autocomplete.complete(q, limit)]
 
 @router.get("/hashtags/{tag}", response=List[PostResponseSchema], auth=AuthBearer())
-def get_hashtag_posts(request, tag: str, page: int = 1, limit: int = 20):
-    start = (page - 1) * limit
-    end = start + limit
-    
-    posts = Post.objects.filter(
-        hashtags__contains=[tag]
-    ).select_related('author').order_by('-created_at')[start:end]
-    
-    return posts
+def get_hashtag_posts(request, response: HttpResponse, tag: str, page: int = 1, limit: int = 20,
+                      cursor: Optional[str] = None, order: Literal['recent', 'hot'] = 'recent'):
+    ordering = {'ordering': hot.ORDERING, 'types': hot.CURSOR_TYPES} if order == 'hot' else {}
+    posts = paginate_keyset(
+        Post.objects.filter(hashtag_links__hashtag__tag=normalize(tag)).select_related('author'),
+        response, cursor, page, limit, **ordering,
+    )
+    return set_viewer_flags(posts, request.user.id)
 
 @router.get("/hashtags/{tag}/stories", response=List[StoryResponseSchema], auth=AuthBearer())
 def get_hashtag_stories(request, tag: str, page: int = 1, limit: int = 20):
@@ -249,7 +220,7 @@ def get_hashtag_stories(request, tag: str, page: int = 1, limit: int = 20):
     end = start + limit
     
     stories = Story.objects.filter(
-        hashtags__contains=[tag],
+        hashtag_links__hashtag__tag=normalize(tag),
         expires_at__gt=timezone.now()
     ).select_related('author').order_by('-created_at')[start:end]
     
@@ -281,42 +252,25 @@ def get_hashtag_stories(request, tag: str, page: int = 1, limit: int = 20):
 
 # Routes pour les tendances
 @router.get("/trending", auth=AuthBearer())
-def get_trending_content(request, limit: int = 10):
-    # Posts tendance (basé sur les likes et commentaires des dernières 24h)
-    yesterday = timezone.now() - timedelta(days=1)
-    
-    trending_posts = Post.objects.filter(
-        created_at__gte=yesterday
-    ).annotate(
-        engagement=Count('likes') + Count('comments')
-    ).order_by('-engagement')[:limit]
+def get_trending_content(request, limit: int = 10, window: Literal['1h', '24h', '7d'] = '24h'):
+    # Classements précalculés (social/trending.py) : engagement et usage des
+    # hashtags sur la fenêtre demandée
+    scores = {int(post_id): score for post_id, score in trending.leaderboard('posts', window) if score > 0}
+    posts = Post.objects.filter(is_private=False).select_related('author').in_bulk(list(scores))
+    trending_posts = [posts[post_id] for post_id in scores if post_id in posts][:limit]
     
-    # Hashtags tendance
-    trending_hashtags = Post.objects.filter(
-        created_at__gte=yesterday
-    ).exclude(
-        hashtags__isnull=True
-    ).values_list('hashtags', flat=True)
-    
-    hashtag_counts = {}
-    for tags in trending_hashtags:
-        for tag in tags:
-            hashtag_counts[tag] = hashtag_counts.get(tag, 0) + 1
-    
-    top_hashtags = sorted(
-        hashtag_counts.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )[:limit]
+    top_hashtags = [(tag, score) for tag, score in trending.leaderboard('hashtags', window) if score > 0][:limit]
     
     return {
+        'window': window,
         'trending_posts': [
             {
                 'id': post.id,
                 'content': post.content[:100] + '...' if len(post.content) > 100 else post.content,
                 'author_username': post.author.username,
-                'likes_count': post.likes.count(),
-                'comments_count': post.comments.count(),
+                'likes_count': post.likes_count,
+                'comments_count': post.comments_count,
+                'engagement': int(scores[post.id]),
                 'created_at': post.created_at
             }
             for post in trending_posts
@@ -324,7 +278,7 @@ def get_trending_content(request, limit: int = 10):
         'trending_hashtags': [
             {
                 'tag': tag,
-                'count': count
+                'count': int(count)
             }
             for tag, count in top_hashtags
         ]
@@ -358,32 +312,18 @@ def get_expired_stories(request, page: int = 1, limit: int = 20):
 @router.get("/stories/statistics", auth=AuthBearer())
 def get_story_statistics(request):
     user = request.user
-    
-    # Stories actives
-    active_stories = user.stories.filter(
-        expires_at__gt=timezone.now()
-    ).count()
-    
-    # Stories expirées
-    expired_stories = user.stories.filter(
-        expires_at__lte=timezone.now()
-    ).count()
-    
-    # Vues totales
-    total_views = StoryView.objects.filter(
-        story__author=user
-    ).count()
-    
-    # Vues des dernières 24h
-    yesterday = timezone.now() - timedelta(days=1)
-    views_24h = StoryView.objects.filter(
-        story__author=user,
-        viewed_at__gte=yesterday
-    ).count()
-    
-    return {
-        'active_stories': active_stories,
-        'expired_stories': expired_stories,
-        'total_views': total_views,
-        'views_24h': views_24h
-    } 
\ No newline at end of file
+    key = f'stories:statistics:{user.id}'
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    # Une seule agrégation : stories de l'utilisateur jointes à leurs vues
+    now = timezone.now()
+    stats = Story.objects.filter(author=user).aggregate(
+        active_stories=Count('pk', filter=Q(expires_at__gt=now), distinct=True),
+        expired_stories=Count('pk', filter=Q(expires_at__lte=now), distinct=True),
+        total_views=Count('views'),
+        views_24h=Count('views', filter=Q(views__viewed_at__gte=now - timedelta(days=1))),
+    )
+    cache.set(key, stats, settings.USER_STATISTICS_CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,213 @@
+"""
+Autocomplétion des hashtags par préfixe, servie depuis la mémoire du processus.
+
+L'index est une liste triée des tags normalisés et leur poids (posts_count +
+stories_count) : un préfixe correspond à une tranche contiguë trouvée par
+dichotomie. Les tranches courtes sont classées à la volée ; pour les préfixes
+qui couvrent plus de AUTOCOMPLETE_SCAN_LIMIT tags (« a », « ph »…), les
+meilleurs résultats sont précalculés et tenus à jour à chaque écriture.
+
+Chaque processus relit les hashtags modifiés depuis son dernier passage
+(colonne Hashtag.updated_at) au plus toutes les AUTOCOMPLETE_REFRESH_INTERVAL
+secondes, et immédiatement après ses propres écritures. Un instantané complet
+est gardé dans le cache (tâche snapshot_hashtag_index) : un nouveau worker s'y
+charge puis ne relit que les modifications postérieures.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .hashtags import normalize
+from .models import Hashtag
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'hashtags:autocomplete'
+
+
+def _upper_bound(prefix):
+    """Plus petite chaîne supérieure à toutes celles qui commencent par `prefix`"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class HashtagIndex:
+    """
+    Liste triée de tags pondérés, avec les meilleurs résultats précalculés des
+    préfixes trop larges pour être parcourus à chaque requête
+    """
+
+    def __init__(self, weights=None, scan_limit=None, top_size=None):
+        self.scan_limit = scan_limit or settings.AUTOCOMPLETE_SCAN_LIMIT
+        self.top_size = top_size or settings.AUTOCOMPLETE_MAX_RESULTS
+        self.weights = {tag: weight for tag, weight in (weights or {}).items() if weight > 0}
+        self.tags = sorted(self.weights)
+        # Préfixe large -> [(-poids, tag)] trié, au plus top_size entrées
+        self.top = {}
+        self._lock = threading.Lock()
+        self._precompute('', 0, len(self.tags))
+
+    def _range(self, prefix):
+        if not prefix:
+            return 0, len(self.tags)
+        return bisect_left(self.tags, prefix), bisect_left(self.tags, _upper_bound(prefix))
+
+    def _best(self, lo, hi, count):
+        return heapq.nsmallest(count, ((-self.weights[tag], tag) for tag in self.tags[lo:hi]))
+
+    def _precompute(self, prefix, lo, hi):
+        """Précalculer récursivement les préfixes de plus de scan_limit tags"""
+        depth = len(prefix) + 1
+        while lo < hi:
+            child = self.tags[lo][:depth]
+            child_hi = bisect_left(self.tags, _upper_bound(child), lo, hi)
+            if child_hi - lo > self.scan_limit:
+                self.top[child] = self._best(lo, child_hi, self.top_size)
+                # Le tag égal au préfixe, s'il existe, est en tête de tranche
+                self._precompute(child, lo + 1 if self.tags[lo] == child else lo, child_hi)
+            lo = child_hi
+
+    def complete(self, prefix, limit=10):
+        """Retourner jusqu'à `limit` couples (tag, poids) commençant par `prefix`, les plus utilisés d'abord"""
+        limit = min(limit, self.top_size)
+        # Même verrou que update() : une tranche lue pendant une insertion ou un
+        # retrait pourrait être décalée ou viser un tag sans poids
+        with self._lock:
+            top = self.top.get(prefix)
+            if top is None:
+                lo, hi = self._range(prefix)
+                if hi - lo > self.scan_limit:
+                    # Préfixe large invalidé par une baisse de poids : recalcul unique
+                    top = self.top[prefix] = self._best(lo, hi, self.top_size)
+                else:
+                    top = self._best(lo, hi, limit)
+        return [(tag, -weight) for weight, tag in top[:limit]]
+
+    def update(self, tag, weight):
+        """Appliquer le nouveau poids d'un tag (0 le retire)"""
+        with self._lock:
+            previous = self.weights.get(tag, 0)
+            if weight == previous:
+                return
+            if weight > 0:
+                if not previous:
+                    insort(self.tags, tag)
+                self.weights[tag] = weight
+            else:
+                del self.tags[bisect_left(self.tags, tag)]
+                del self.weights[tag]
+
+            for depth in range(1, len(tag) + 1):
+                prefix = tag[:depth]
+                top = self.top.get(prefix)
+                if top is None:
+                    continue
+                entries = [entry for entry in top if entry[1] != tag]
+                if weight < previous and len(entries) < len(top):
+                    # Un tag hors du classement peut maintenant le dépasser
+                    del self.top[prefix]
+                    continue
+                if weight > 0:
+                    insort(entries, (-weight, tag))
+                self.top[prefix] = entries[:self.top_size]
+
+    def dump(self):
+        return self.tags, self.weights, self.top
+
+    @classmethod
+    def restore(cls, data):
+        """Recréer un index depuis dump(), sans retrier ni recalculer"""
+        index = cls.__new__(cls)
+        index.scan_limit = settings.AUTOCOMPLETE_SCAN_LIMIT
+        index.top_size = settings.AUTOCOMPLETE_MAX_RESULTS
+        index.tags, index.weights, index.top = data
+        index._lock = threading.Lock()
+        return index
+
+
+# Index du processus, chargé au premier appel
+_index = None
+_watermark = None
+_last_refresh = 0.0
+_load_lock = threading.Lock()
+
+
+def _rows(since=None):
+    queryset = Hashtag.objects.all()
+    if since is not None:
+        # Marge pour les transactions validées après avoir daté leurs lignes
+        queryset = queryset.filter(updated_at__gte=since - timedelta(seconds=settings.AUTOCOMPLETE_REFRESH_LAG))
+    return queryset.values_list('tag', F('posts_count') + F('stories_count'), 'updated_at')
+
+
+def _load():
+    """Charger l'index depuis l'instantané du cache, ou le construire depuis la base"""
+    global _index, _watermark, _last_refresh
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is not None:
+        _watermark, data = snapshot
+        _index = HashtagIndex.restore(data)
+        refresh()
+        return
+
+    weights, watermark = {}, None
+    for tag, weight, updated_at in _rows().iterator(chunk_size=10000):
+        weights[tag] = weight
+        watermark = updated_at if watermark is None else max(watermark, updated_at)
+    _index, _watermark, _last_refresh = HashtagIndex(weights), watermark, time.monotonic()
+
+
+def refresh():
+    """Appliquer à l'index les hashtags modifiés depuis le dernier passage"""
+    global _watermark, _last_refresh
+    if _index is None:
+        return 0
+    _last_refresh = time.monotonic()
+    updated = 0
+    for tag, weight, updated_at in _rows(_watermark):
+        _index.update(tag, weight)
+        _watermark = updated_at if _watermark is None else max(_watermark, updated_at)
+        updated += 1
+    return updated
+
+
+def get_index():
+    """Retourner l'index du processus, rafraîchi s'il date de plus de AUTOCOMPLETE_REFRESH_INTERVAL"""
+    if _index is None:
+        with _load_lock:
+            if _index is None:
+                _load()
+    elif time.monotonic() - _last_refresh >= settings.AUTOCOMPLETE_REFRESH_INTERVAL:
+        try:
+            refresh()
+        except Exception:
+            # Un index légèrement en retard reste utilisable
+            logger.warning("Rafraîchissement de l'index des hashtags impossible", exc_info=True)
+    return _index
+
+
+def complete(prefix, limit=10):
+    """Suggestions (tag, poids) pour un début de hashtag saisi"""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    return get_index().complete(prefix, limit)
+
+
+def snapshot():
+    """Enregistrer l'index courant dans le cache pour les prochains workers"""
+    index = get_index()
+    cache.set(SNAPSHOT_KEY, (_watermark, index.dump()), None)
+    return len(index.tags)
+
+
+def reset():
+    """Oublier l'index du processus (rechargé au prochain appel)"""
+    global _index, _watermark, _last_refresh
+    _index, _watermark, _last_refresh = None, None, 0.0
@@ -0,0 +1,217 @@
+"""
+Compteurs dénormalisés en écriture différée (likes et commentaires).
+
+Un like ou un commentaire n'écrit pas dans la ligne du post : l'événement
+incrémente un tampon (hash Redis via HINCRBY, ou dictionnaire en mémoire du
+processus sans Redis). La tâche flush_counters vide périodiquement le tampon et
+applique les deltas en masse avec des UPDATE … SET x = x + delta, un par
+(modèle, champ, delta). Un post viral ne sérialise donc plus ses likes sur le
+verrou de sa ligne, au prix d'un décalage de COUNTERS_FLUSH_INTERVAL secondes.
+reconcile_counters recompte depuis les tables de likes et de commentaires et
+corrige les dérives (tampon perdu, suppressions en cascade). Le même vidage met
+à jour le score de popularité des posts concernés (social/hot.py) et les likes
+et commentaires reçus par leurs auteurs (UserStats, users/stats.py).
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import UserStats
+from yoursocial.redis_client import get_redis
+
+from . import hot
+from .models import Comment, Like, Post
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'counters:pending'
+
+_MODELS = {'post': Post, 'comment': Comment, 'userstats': UserStats}
+
+# Compteur d'un objet -> statistique reçue par son auteur
+RECEIVED = {
+    ('post', 'likes_count'): 'likes_received',
+    ('post', 'comments_count'): 'comments_received',
+    ('comment', 'likes_count'): 'likes_received',
+}
+
+# Tampon du processus quand Redis n'est pas disponible (tests, développement)
+_local = Counter()
+_local_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _field(model_name, pk, field):
+    return f'{model_name}:{pk}:{field}'
+
+
+def incr(model_name, pk, field, delta=1):
+    """Ajouter `delta` au compteur `field` de l'objet, à appliquer au prochain vidage"""
+    key = _field(model_name, pk, field)
+    client = get_redis()
+    if client is not None:
+        client.hincrby(PENDING_KEY, key, delta)
+        return
+
+    with _local_lock:
+        _local[key] += delta
+        due = time.monotonic() - _last_flush >= settings.COUNTERS_FLUSH_INTERVAL
+    # Sans Redis, aucun worker ne voit ce tampon : le processus le vide lui-même
+    if due:
+        flush()
+
+
+def incr_on_commit(model_name, pk, field, delta=1):
+    """Compter un événement dans le tampon une fois la transaction validée"""
+
+    def apply():
+        try:
+            incr(model_name, pk, field, delta)
+        except Exception:
+            # La réconciliation périodique rattrapera l'écart
+            logger.warning("Impossible de compter %s sur %s %s", field, model_name, pk, exc_info=True)
+
+    transaction.on_commit(apply)
+
+
+def _drain():
+    """Retirer atomiquement le contenu du tampon : {champ: delta}"""
+    global _last_flush
+    client = get_redis()
+    if client is None:
+        with _local_lock:
+            pending = dict(_local)
+            _local.clear()
+            _last_flush = time.monotonic()
+        return pending
+
+    from redis.exceptions import ResponseError
+
+    # RENAMENX est atomique : les incréments suivants repartent dans un hash
+    # neuf. Le cliché porte un nom propre à ce vidage, jamais écrasé par un
+    # vidage concurrent.
+    flushing = f'{PENDING_KEY}:{uuid.uuid4().hex}'
+    try:
+        if not client.renamenx(PENDING_KEY, flushing):
+            return {}
+    except ResponseError:
+        # Tampon vide, ou déjà emporté par un vidage concurrent
+        return {}
+    pipe = client.pipeline()
+    pipe.hgetall(flushing)
+    pipe.delete(flushing)
+    items, _ = pipe.execute()
+    return {key.decode() if isinstance(key, bytes) else key: int(value) for key, value in items.items()}
+
+
+def _restore(pending):
+    """Remettre des deltas non appliqués dans le tampon"""
+    client = get_redis()
+    if client is None:
+        with _local_lock:
+            _local.update(pending)
+        return
+    pipe = client.pipeline(transaction=False)
+    for key, delta in pending.items():
+        pipe.hincrby(PENDING_KEY, key, delta)
+    pipe.execute()
+
+
+def flush():
+    """Appliquer les deltas en attente en base, retourne le nombre de lignes mises à jour"""
+    pending = _drain()
+    if not pending:
+        return 0
+
+    # Regroupement par (modèle, champ, delta) : un UPDATE par groupe
+    groups = defaultdict(list)
+    for key, delta in pending.items():
+        if delta:
+            model_name, pk, field = key.split(':')
+            groups[model_name, field, delta].append(int(pk))
+
+    # Engagement pondéré par post pour le score de popularité
+    weights = settings.HOT_SCORE_WEIGHTS
+    engagement = Counter()
+    for (model_name, field, delta), pks in groups.items():
+        if model_name == 'post' and field in weights:
+            for pk in pks:
+                engagement[pk] += delta * weights[field]
+
+    updated = 0
+    try:
+        with transaction.atomic():
+            for (model_name, field, delta), pks in sorted(groups.items()):
+                updated += _MODELS[model_name].objects.filter(pk__in=sorted(pks)).update(
+                    **{field: Greatest(F(field) + delta, 0)}
+                )
+            hot.apply_deltas(engagement)
+            # Statistiques des auteurs, hors du nombre de compteurs appliqués
+            for (field, delta), user_ids in sorted(_received(groups).items()):
+                UserStats.objects.filter(pk__in=sorted(user_ids)).update(**{field: Greatest(F(field) + delta, 0)})
+    except Exception:
+        _restore(pending)
+        raise
+    return updated
+
+
+def _received(groups):
+    """Deltas reçus par les auteurs des objets comptés : {(champ, delta): [user_id]}"""
+    pks = defaultdict(set)
+    for (model_name, field, _), group_pks in groups.items():
+        if (model_name, field) in RECEIVED:
+            pks[model_name].update(group_pks)
+    authors = {
+        model_name: dict(_MODELS[model_name].objects.filter(pk__in=model_pks).values_list('pk', 'author_id'))
+        for model_name, model_pks in pks.items()
+    }
+    totals = Counter()
+    for (model_name, field, delta), group_pks in groups.items():
+        received = RECEIVED.get((model_name, field))
+        if received is None:
+            continue
+        for pk in group_pks:
+            # Objet supprimé entre-temps : sa suppression ou la réconciliation ajuste l'auteur
+            author_id = authors[model_name].get(pk)
+            if author_id is not None:
+                totals[author_id, received] += delta
+
+    received = defaultdict(list)
+    for (author_id, field), delta in totals.items():
+        if delta:
+            received[field, delta].append(author_id)
+    return received
+
+
+def _count(model, **outer):
+    """Sous-requête COUNT(*) corrélée à l'objet courant, 0 s'il n'y a aucune ligne"""
+    rows = model.objects.filter(**outer).order_by().values(*outer).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def reconcile():
+    """
+    Recompter les compteurs depuis les tables sources et corriger les lignes
+    qui ont dérivé. Le tampon est vidé d'abord pour ne pas écraser des deltas
+    déjà comptés ; retourne le nombre de compteurs corrigés.
+    """
+    flush()
+    sources = [
+        (Post, 'likes_count', _count(Like, post=OuterRef('pk'))),
+        (Post, 'comments_count', _count(Comment, post=OuterRef('pk'))),
+        (Comment, 'likes_count', _count(Like, comment=OuterRef('pk'))),
+    ]
+    repaired = 0
+    for model, field, actual in sources:
+        drifted = model.objects.annotate(actual=actual).exclude(**{field: F('actual')})
+        repaired += drifted.update(**{field: actual})
+    if repaired:
+        logger.warning('%s compteurs de likes/commentaires corrigés', repaired)
+    return repaired
@@ -0,0 +1,350 @@
+"""
+Fil d'actualité matérialisé (diffusion à l'écriture).
+
+Chaque utilisateur a une timeline plafonnée à FEED_MAX_LENGTH entrées : les
+IDs de ses posts et de ceux des comptes qu'il suit, avec la date de création
+comme score. Les posts publics de tous les auteurs passent par un flux global
+commun, fusionné à la lecture. Une timeline absente (utilisateur inactif,
+abonnement modifié) est reconstruite depuis la base, et les pages au-delà du
+plafond sont lues directement en SQL.
+
+Mode hybride : les auteurs qui dépassent FEED_FANOUT_THRESHOLD abonnés ne sont
+pas diffusés. Leurs posts vont dans leur propre timeline d'auteur, fusionnée
+à la lecture (fusion k-way par date) avec celles des lecteurs qui les suivent.
+"""
+import heapq
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from users.models import User
+from yoursocial.pagination import keyset_filter
+from yoursocial.redis_client import get_redis
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_KEY = 'feed:public'
+
+# Membre sentinelle (aucun post n'a l'ID 0) : une timeline vide existe quand même
+_SENTINEL = 0
+
+
+def timeline_key(user_id):
+    return f'feed:timeline:{user_id}'
+
+
+def author_key(user_id):
+    return f'feed:author:{user_id}'
+
+
+def _celebrities_key(user_id):
+    return f'feed:celebrities:{user_id}'
+
+
+def is_celebrity(followers_count):
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    return threshold > 0 and followers_count >= threshold
+
+
+class TimelineStore:
+    """
+    Interface commune des stockages de timelines
+    """
+
+    def range(self, key, count, ttl=None, max_score=None):
+        """Entrées les plus récentes d'une timeline, ou None si elle n'existe pas"""
+        return self.range_many([key], count, ttl, max_score)[key]
+
+
+class RedisTimelineStore(TimelineStore):
+    """
+    Timelines dans des sorted sets Redis, score = timestamp de création
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def push(self, keys, post_id, score):
+        """Ajouter un post aux timelines existantes et les plafonner"""
+        keys = list(keys)
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        # Une timeline absente sera reconstruite complète à la prochaine lecture
+        keys = [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zadd(key, {post_id: score})
+            pipe.zremrangebyrank(key, 0, -(settings.FEED_MAX_LENGTH + 1))
+        pipe.execute()
+        return len(keys)
+
+    def range_many(self, keys, count, ttl=None, max_score=None):
+        """
+        Retourner les `count` entrées les plus récentes de chaque timeline
+        {clé: [(score, post_id)]}, None pour les timelines absentes. Un seul
+        aller-retour Redis, qui prolonge aussi leur durée de vie. `max_score`
+        limite aux entrées de score inférieur ou égal (pagination par curseur).
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            if ttl:
+                pipe.expire(key, ttl)
+            else:
+                pipe.exists(key)
+            if max_score is None:
+                pipe.zrevrange(key, 0, count, withscores=True)
+            else:
+                pipe.zrevrangebyscore(key, max_score, '-inf', start=0, num=count + 1, withscores=True)
+        results = pipe.execute()
+
+        timelines = {}
+        for key, exists, items in zip(keys, results[::2], results[1::2]):
+            if not exists:
+                timelines[key] = None
+                continue
+            entries = [(score, int(member)) for member, score in items]
+            timelines[key] = [entry for entry in entries if entry[1] != _SENTINEL][:count]
+        return timelines
+
+    def replace(self, key, entries, ttl=None):
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.zadd(key, {_SENTINEL: 0, **{post_id: score for score, post_id in entries}})
+        if ttl:
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def remove(self, key, post_id):
+        self.client.zrem(key, post_id)
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*keys)
+
+
+class CacheTimelineStore(TimelineStore):
+    """
+    Équivalent via le cache Django, quand il n'est pas servi par Redis (tests,
+    développement). Les mises à jour ne sont pas atomiques entre processus.
+    """
+
+    def push(self, keys, post_id, score):
+        timelines = cache.get_many(list(keys))
+        for key, entries in timelines.items():
+            entries.append((score, post_id))
+            entries.sort(reverse=True)
+            del entries[settings.FEED_MAX_LENGTH:]
+        cache.set_many(timelines, settings.FEED_TIMELINE_TTL)
+        return len(timelines)
+
+    def range_many(self, keys, count, ttl=None, max_score=None):
+        timelines = cache.get_many(keys)
+        result = {}
+        for key in keys:
+            entries = timelines.get(key)
+            if entries is not None and max_score is not None:
+                entries = [entry for entry in entries if entry[0] <= max_score]
+            result[key] = entries[:count] if entries is not None else None
+        return result
+
+    def replace(self, key, entries, ttl=None):
+        cache.set(key, list(entries), ttl)
+
+    def remove(self, key, post_id):
+        entries = cache.get(key)
+        if entries is not None:
+            cache.set(key, [entry for entry in entries if entry[1] != post_id], settings.FEED_TIMELINE_TTL)
+
+    def delete(self, keys):
+        cache.delete_many(list(keys))
+
+
+def get_store():
+    """Retourner le stockage des timelines : Redis si disponible, sinon le cache Django"""
+    client = get_redis()
+    if client is not None:
+        return RedisTimelineStore(client)
+    return CacheTimelineStore()
+
+
+def _following_ids(user_id):
+    return User.following.through.objects.filter(from_user_id=user_id).values('to_user_id')
+
+
+def _entries(queryset):
+    rows = queryset.order_by('-created_at', '-id').values_list('created_at', 'id')[:settings.FEED_MAX_LENGTH]
+    return [(created_at.timestamp(), post_id) for created_at, post_id in rows]
+
+
+def rebuild_timeline(user_id, store=None):
+    """Reconstruire la timeline d'un utilisateur depuis la base"""
+    store = store or get_store()
+    entries = _entries(Post.objects.filter(Q(author_id=user_id) | Q(author_id__in=_following_ids(user_id))))
+    store.replace(timeline_key(user_id), entries, settings.FEED_TIMELINE_TTL)
+    return entries
+
+
+def rebuild_author_timeline(user_id, store=None):
+    """Reconstruire la timeline d'un auteur non diffusé depuis la base"""
+    store = store or get_store()
+    entries = _entries(Post.objects.filter(author_id=user_id))
+    store.replace(author_key(user_id), entries, settings.FEED_TIMELINE_TTL)
+    return entries
+
+
+def rebuild_public_stream(store=None):
+    """Reconstruire le flux global des posts publics depuis la base"""
+    store = store or get_store()
+    entries = _entries(Post.objects.filter(is_private=False))
+    store.replace(PUBLIC_KEY, entries, settings.FEED_TIMELINE_TTL)
+    return entries
+
+
+def invalidate_timelines(user_ids):
+    """Supprimer des timelines, reconstruites à la prochaine lecture"""
+    get_store().delete([timeline_key(user_id) for user_id in user_ids])
+    cache.delete_many([_celebrities_key(user_id) for user_id in user_ids])
+
+
+def fan_out(post_id):
+    """
+    Pousser un post dans la timeline de son auteur, de ses abonnés et, s'il
+    est public, dans le flux global. Retourne le nombre de timelines mises à jour.
+
+    Les posts des auteurs au-delà du seuil ne vont que dans leur timeline
+    d'auteur : l'écriture reste en O(1) quel que soit le nombre d'abonnés.
+    """
+    post = Post.objects.filter(id=post_id).values(
+        'author_id', 'author__followers_count', 'created_at', 'is_private'
+    ).first()
+    if post is None:
+        return 0
+
+    store = get_store()
+    score = post['created_at'].timestamp()
+    if not post['is_private']:
+        store.push([PUBLIC_KEY], post_id, score)
+
+    follower_ids = User.following.through.objects.filter(
+        to_user_id=post['author_id']
+    ).values_list('from_user_id', flat=True).order_by('from_user_id').iterator(chunk_size=settings.FEED_FANOUT_BATCH)
+
+    pushed = store.push([timeline_key(post['author_id'])], post_id, score)
+    if is_celebrity(post['author__followers_count']):
+        return pushed + store.push([author_key(post['author_id'])], post_id, score)
+
+    while batch := list(islice(follower_ids, settings.FEED_FANOUT_BATCH)):
+        pushed += store.push([timeline_key(user_id) for user_id in batch], post_id, score)
+    return pushed
+
+
+def feed_queryset(user_id):
+    """Fil calculé en SQL : posts de l'utilisateur, de ses abonnements et posts publics"""
+    return Post.objects.filter(
+        Q(author_id=user_id) |
+        Q(author_id__in=_following_ids(user_id)) |
+        Q(is_private=False)
+    ).select_related('author').order_by('-created_at', '-id')
+
+
+def followed_celebrities(user_id):
+    """IDs des comptes suivis dont les posts ne sont pas diffusés (mis en cache)"""
+    key = _celebrities_key(user_id)
+    author_ids = cache.get(key)
+    if author_ids is None:
+        threshold = settings.FEED_FANOUT_THRESHOLD
+        if threshold > 0:
+            author_ids = list(User.following.through.objects.filter(
+                from_user_id=user_id, to_user__followers_count__gte=threshold
+            ).values_list('to_user_id', flat=True))
+        else:
+            author_ids = []
+        cache.set(key, author_ids, settings.FEED_CELEBRITIES_CACHE_TIMEOUT)
+    return author_ids
+
+
+# Entrées lues en plus par source après un curseur : les posts de même date
+# que le dernier servi sont écartés après coup
+_TIE_SLACK = 10
+
+
+def _read_ids(user_id, count, after=None):
+    store = get_store()
+    rebuilders = {
+        timeline_key(user_id): lambda: rebuild_timeline(user_id, store),
+        PUBLIC_KEY: lambda: rebuild_public_stream(store),
+    }
+    for author_id in followed_celebrities(user_id):
+        rebuilders[author_key(author_id)] = lambda author_id=author_id: rebuild_author_timeline(author_id, store)
+
+    max_score = None
+    if after is not None:
+        max_score = after[0]
+        count += _TIE_SLACK
+
+    # Toutes les sources en un aller-retour, les absentes reconstruites en SQL
+    sources = store.range_many(list(rebuilders), count, settings.FEED_TIMELINE_TTL, max_score)
+    for key, entries in sources.items():
+        if entries is None:
+            entries = rebuilders[key]()
+            if max_score is not None:
+                entries = [entry for entry in entries if entry[0] <= max_score]
+            sources[key] = entries[:count]
+        if after is not None:
+            sources[key] = [entry for entry in sources[key] if entry < after]
+
+    # Fusion k-way des sources, chacune triée par date décroissante
+    ids = []
+    seen = set()
+    for _, post_id in heapq.merge(*sources.values(), reverse=True):
+        if post_id not in seen:
+            seen.add(post_id)
+            ids.append(post_id)
+            if len(ids) == count:
+                break
+    return ids
+
+
+def get_feed(user_id, offset=0, limit=20, after=None):
+    """
+    Retourner une page du fil d'un utilisateur (instances Post, auteur chargé).
+
+    Les IDs viennent des timelines matérialisées et sont hydratés en une
+    requête, qui revérifie la visibilité (post devenu privé, abonnement retiré).
+    En pagination par curseur, `after` est le couple (created_at, id) du
+    dernier post servi et `offset` le nombre de posts déjà servis.
+    """
+    count = offset + limit
+    if count > settings.FEED_MAX_LENGTH:
+        return _feed_from_sql(user_id, offset, limit, after)
+
+    try:
+        if after is None:
+            ids = _read_ids(user_id, count)[offset:]
+        else:
+            ids = _read_ids(user_id, limit, (after[0].timestamp(), after[1]))[:limit]
+    except Exception:
+        # Le stockage des timelines est une optimisation : on retombe sur le SQL
+        logger.warning("Timelines indisponibles, fil calculé en SQL", exc_info=True)
+        return _feed_from_sql(user_id, offset, limit, after)
+
+    posts = Post.objects.filter(
+        Q(author_id=user_id) |
+        Q(is_private=False) |
+        Q(author_id__in=_following_ids(user_id))
+    ).select_related('author').in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def _feed_from_sql(user_id, offset, limit, after):
+    queryset = feed_queryset(user_id)
+    if after is not None:
+        return list(queryset.filter(keyset_filter(('-created_at', '-id'), after))[:limit])
+    return list(queryset[offset:offset + limit])
@@ -0,0 +1,132 @@
+"""
+Index normalisé des hashtags.
+
+Les listes JSON Post.hashtags et Story.hashtags restent la saisie d'origine ;
+chaque enregistrement est répercuté dans les tables PostHashtag/StoryHashtag et
+dans les compteurs de Hashtag (posts_count, stories_count, last_used). Lister
+les hashtags populaires devient un ORDER BY indexé sur une petite table au lieu
+d'un parcours de tous les posts. Les tags sont normalisés : sans « # », en
+minuscules.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from .models import Hashtag, Post, PostHashtag, Story, StoryHashtag
+
+MAX_LENGTH = Hashtag._meta.get_field('tag').max_length
+
+# Modèle source : (table de liaison, champ de la source, compteur de Hashtag)
+_SOURCES = {
+    Post: (PostHashtag, 'post', 'posts_count'),
+    Story: (StoryHashtag, 'story', 'stories_count'),
+}
+
+
+def normalize(tag):
+    """Forme canonique d'un hashtag, None s'il est vide ou invalide"""
+    if not isinstance(tag, str):
+        return None
+    tag = tag.strip().lstrip('#').strip().lower()
+    if not tag or len(tag) > MAX_LENGTH:
+        return None
+    return tag
+
+
+def normalize_all(tags):
+    return sorted({tag for tag in map(normalize, tags or []) if tag})
+
+
+def hashtag_ids(tags):
+    """Retourner {tag: id} en créant les hashtags manquants"""
+    Hashtag.objects.bulk_create([Hashtag(tag=tag) for tag in tags], ignore_conflicts=True)
+    return dict(Hashtag.objects.filter(tag__in=tags).values_list('tag', 'id'))
+
+
+def sync(instance):
+    """Aligner les liens et les compteurs d'un post ou d'une story sur sa liste de hashtags"""
+    link_model, field, count_field = _SOURCES[type(instance)]
+    tags = normalize_all(instance.hashtags)
+
+    with transaction.atomic():
+        current = dict(
+            link_model.objects.filter(**{field: instance}).values_list('hashtag__tag', 'hashtag_id')
+        )
+        added = [tag for tag in tags if tag not in current]
+        removed = sorted(hashtag_id for tag, hashtag_id in current.items() if tag not in tags)
+
+        if added:
+            ids = hashtag_ids(added)
+            link_model.objects.bulk_create(
+                [link_model(**{field: instance}, hashtag_id=ids[tag]) for tag in added],
+                ignore_conflicts=True,
+            )
+            used_at = instance.created_at
+            Hashtag.objects.filter(id__in=sorted(ids.values())).update(**{
+                count_field: F(count_field) + 1,
+                'last_used': Greatest(Coalesce(F('last_used'), Value(used_at)), Value(used_at)),
+                'updated_at': Now(),
+            })
+        if removed:
+            link_model.objects.filter(**{field: instance}, hashtag_id__in=removed).delete()
+            Hashtag.objects.filter(id__in=removed).update(
+                **{count_field: Greatest(F(count_field) - 1, 0), 'updated_at': Now()}
+            )
+
+
+def detach(instance):
+    """Décompter les hashtags d'un post ou d'une story sur le point d'être supprimé"""
+    link_model, field, count_field = _SOURCES[type(instance)]
+    linked = link_model.objects.filter(**{field: instance}).values('hashtag_id')
+    Hashtag.objects.filter(id__in=linked).update(
+        **{count_field: Greatest(F(count_field) - 1, 0), 'updated_at': Now()}
+    )
+
+
+def backfill(model, chunk_size=1000):
+    """
+    Créer les liens manquants pour les lignes existantes de `model`, par
+    paquets de `chunk_size` lignes (une transaction par paquet). Retourne le
+    nombre de lignes traitées ; les compteurs sont à recalculer avec recount().
+    """
+    link_model, field, _ = _SOURCES[model]
+    last_pk, processed = 0, 0
+    while True:
+        rows = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'hashtags')[:chunk_size]
+        )
+        if not rows:
+            return processed
+        last_pk = rows[-1][0]
+        processed += len(rows)
+
+        tags_by_pk = {pk: normalize_all(tags) for pk, tags in rows}
+        with transaction.atomic():
+            ids = hashtag_ids(sorted(set().union(*tags_by_pk.values())))
+            link_model.objects.bulk_create(
+                [
+                    link_model(**{f'{field}_id': pk}, hashtag_id=ids[tag])
+                    for pk, tags in tags_by_pk.items()
+                    for tag in tags
+                ],
+                ignore_conflicts=True,
+                batch_size=chunk_size,
+            )
+
+
+def _per_hashtag(link_model, aggregate):
+    rows = link_model.objects.filter(hashtag=OuterRef('pk')).order_by().values('hashtag')
+    return Subquery(rows.annotate(value=aggregate).values('value'))
+
+
+def recount():
+    """Recalculer tous les compteurs et dates de dernière utilisation depuis les liens"""
+    posts_last = _per_hashtag(PostHashtag, Max('post__created_at'))
+    stories_last = _per_hashtag(StoryHashtag, Max('story__created_at'))
+    return Hashtag.objects.update(
+        posts_count=Coalesce(_per_hashtag(PostHashtag, Count('pk')), 0),
+        stories_count=Coalesce(_per_hashtag(StoryHashtag, Count('pk')), 0),
+        # GREATEST renvoie NULL sous SQLite dès qu'un argument l'est
+        last_used=Greatest(Coalesce(posts_last, stories_last), Coalesce(stories_last, posts_last)),
+        updated_at=Now(),
+    )
@@ -0,0 +1,169 @@
+"""
+Score de popularité (« hot ») des posts, persisté dans Post.hot_score.
+
+Un engagement reçu à l'instant t pèse HOT_SCORE_WEIGHTS[champ] ×
+10^((t − EPOCH) / HOT_SCORE_DECAY) : à poids égal, un like reçu
+HOT_SCORE_DECAY secondes plus tard compte dix fois plus. Le score est le log10
+de la somme des poids, la publication comptant pour un engagement. Comparer
+deux scores revient donc à comparer l'engagement décru à l'instant présent,
+sans jamais réécrire les posts qui ne reçoivent plus rien ; le calcul en
+logarithme évite le dépassement de 10^x.
+
+Le vidage des compteurs (social/counters.py) applique au score les deltas de
+likes et de commentaires. Un retrait de like est approximé (il retire le poids
+d'un like reçu maintenant) : recompute() rescore en une passe vectorisée les
+posts des HOT_SCORE_RECOMPUTE_DAYS derniers jours depuis les tables sources, et
+backfill() (commande backfill_hot_scores) tous les posts, une fois après l'ajout
+de la colonne.
+"""
+import math
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+EPOCH = 1704067200  # 2024-01-01 UTC
+
+# Tri order=hot et types des valeurs de son curseur (yoursocial/pagination.py)
+ORDERING = ('-hot_score', '-id')
+CURSOR_TYPES = (float, int)
+
+
+def exponent(timestamp, weight=1):
+    """log10 du poids d'un engagement de poids `weight` reçu à `timestamp`"""
+    return math.log10(weight) + (timestamp - EPOCH) / settings.HOT_SCORE_DECAY
+
+
+def initial_score():
+    """Score d'un post publié maintenant, sans engagement"""
+    return exponent(time.time())
+
+
+def shift(score, weight, timestamp, floor):
+    """
+    Ajouter au score un engagement de poids `weight` (retirer s'il est
+    négatif), sans descendre sous `floor`, le score du post sans engagement
+    """
+    if weight > 0:
+        added = exponent(timestamp, weight)
+        high, low = max(score, added), min(score, added)
+        return high + math.log10(1 + 10 ** (low - high))
+    if weight < 0:
+        removed = exponent(timestamp, -weight)
+        if removed >= score:
+            return floor
+        return max(floor, score + math.log10(1 - 10 ** (removed - score)))
+    return score
+
+
+def apply_deltas(deltas, now=None):
+    """
+    Appliquer des engagements pondérés {post_id: delta} reçus à `now`.
+    À appeler dans une transaction : les lignes sont verrouillées le temps du calcul.
+    """
+    from .models import Post
+
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    now = now if now is not None else time.time()
+    posts = list(Post.objects.filter(pk__in=sorted(deltas)).select_for_update().only('hot_score', 'created_at'))
+    for post in posts:
+        floor = exponent(post.created_at.timestamp())
+        post.hot_score = shift(post.hot_score, deltas[post.pk], now, floor)
+    return Post.objects.bulk_update(posts, ['hot_score'], batch_size=1000)
+
+
+def _exponents(datetimes):
+    timestamps = np.fromiter((value.timestamp() for value in datetimes), dtype=np.float64, count=len(datetimes))
+    return (timestamps - EPOCH) / settings.HOT_SCORE_DECAY
+
+
+def scores(post_ids, created_at, event_post_ids, event_exponents):
+    """
+    Scores des posts `post_ids` (triés) depuis leurs engagements, en une passe :
+    log10(10^base + Σ 10^x), calculé par rapport au maximum de chaque post
+    """
+    base = _exponents(created_at)
+    index = np.searchsorted(post_ids, event_post_ids)
+    # Engagements d'un post publié après la lecture des posts : ignorés
+    known = index < len(post_ids)
+    known[known] = post_ids[index[known]] == event_post_ids[known]
+    index, event_exponents = index[known], event_exponents[known]
+    peak = base.copy()
+    np.maximum.at(peak, index, event_exponents)
+    total = 10.0 ** (base - peak)
+    np.add.at(total, index, 10.0 ** (event_exponents - peak[index]))
+    return peak + np.log10(total)
+
+
+def _rescore(rows, events, batch_size):
+    """
+    Rescorer les posts `rows` [(pk, created_at, hot_score)] triés par pk depuis
+    leurs likes et commentaires filtrés par `events` ; retourne le nombre de
+    scores corrigés
+    """
+    from .models import Comment, Like, Post
+
+    post_ids, created_at, current = zip(*rows)
+    post_ids = np.array(post_ids, dtype=np.int64)
+
+    event_ids, event_exponents = [], []
+    for model, field in ((Like, 'likes_count'), (Comment, 'comments_count')):
+        found = list(model.objects.filter(**events).values_list('post_id', 'created_at'))
+        if found:
+            ids, times = zip(*found)
+            event_ids.append(np.array(ids, dtype=np.int64))
+            event_exponents.append(_exponents(times) + math.log10(settings.HOT_SCORE_WEIGHTS[field]))
+    if event_ids:
+        event_ids, event_exponents = np.concatenate(event_ids), np.concatenate(event_exponents)
+    else:
+        event_ids, event_exponents = np.empty(0, dtype=np.int64), np.empty(0)
+
+    computed = scores(post_ids, created_at, event_ids, event_exponents)
+    changed = np.flatnonzero(np.abs(computed - np.array(current, dtype=np.float64)) > 1e-9)
+    Post.objects.bulk_update(
+        [Post(pk=int(post_ids[i]), hot_score=float(computed[i])) for i in changed],
+        ['hot_score'], batch_size=batch_size,
+    )
+    return len(changed)
+
+
+def recompute(days=None, batch_size=1000):
+    """
+    Recalculer depuis les likes et commentaires le score des posts publiés ces
+    `days` derniers jours ; retourne le nombre de scores corrigés
+    """
+    from .counters import flush
+    from .models import Post
+
+    # Les engagements en attente dans le tampon seraient sinon comptés deux fois
+    flush()
+    days = settings.HOT_SCORE_RECOMPUTE_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    rows = list(Post.objects.filter(created_at__gte=cutoff).order_by('pk').values_list('pk', 'created_at', 'hot_score'))
+    if not rows:
+        return 0
+    return _rescore(rows, {'post__created_at__gte': cutoff}, batch_size)
+
+
+def backfill(chunk_size=10000, batch_size=1000):
+    """
+    Recalculer le score de tous les posts, par tranches d'IDs croissants : les
+    posts antérieurs à la colonne ont tous reçu le score de la migration.
+    Retourne le nombre de scores corrigés.
+    """
+    from .counters import flush
+    from .models import Post
+
+    flush()
+    changed = 0
+    last_id = 0
+    while rows := list(
+        Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'created_at', 'hot_score')[:chunk_size]
+    ):
+        changed += _rescore(rows, {'post_id__gt': last_id, 'post_id__lte': rows[-1][0]}, batch_size)
+        last_id = rows[-1][0]
+    return changed
@@ -0,0 +1,144 @@
+"""
+Écriture des likes en une requête par opération.
+
+Un like est un INSERT … ON CONFLICT DO NOTHING (contrainte unique utilisateur/
+cible) et un retrait un DELETE, sans lecture préalable : un double appui
+concurrent ne peut plus lever d'IntegrityError. Quand la base sait renvoyer les
+lignes écrites (RETURNING : PostgreSQL, SQLite ≥ 3.35), les cibles réellement
+modifiées sont connues sans requête supplémentaire ; sinon elles sont lues
+avant l'écriture. Les compteurs sont ajustés via le tampon de social.counters.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import counters, trending
+from .models import Comment, Like, Post
+
+TARGETS = {'post': Post, 'comment': Comment}
+
+
+def _column(kind):
+    return Like._meta.get_field(kind).column
+
+
+def _supports_returning():
+    return connection.features.can_return_rows_from_bulk_insert
+
+
+def insert_likes(user_id, kind, ids):
+    """Liker les cibles `ids` (type `kind`), retourne celles qui ne l'étaient pas déjà"""
+    ids = sorted(set(ids))
+    if not ids:
+        return set()
+    column = _column(kind)
+
+    if _supports_returning():
+        qn = connection.ops.quote_name
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows = ', '.join(['(%s, %s, %s)'] * len(ids))
+        params = [value for target_id in ids for value in (user_id, target_id, now)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(Like._meta.db_table)} ({qn("user_id")}, {qn(column)}, {qn("created_at")}) '
+                f'VALUES {rows} ON CONFLICT DO NOTHING RETURNING {qn(column)}',
+                params,
+            )
+            inserted = {row[0] for row in cursor.fetchall()}
+    else:
+        with transaction.atomic():
+            existing = set(Like.objects.filter(user_id=user_id, **{f'{kind}_id__in': ids})
+                           .values_list(f'{kind}_id', flat=True))
+            inserted = set(ids) - existing
+            Like.objects.bulk_create(
+                [Like(user_id=user_id, **{f'{kind}_id': target_id}) for target_id in sorted(inserted)],
+                ignore_conflicts=True,
+            )
+
+    for target_id in inserted:
+        counters.incr_on_commit(kind, target_id, 'likes_count', 1)
+    if kind == 'post':
+        trending.record_on_commit('posts', inserted)
+    return inserted
+
+
+def delete_likes(user_id, kind, ids):
+    """Retirer les likes de l'utilisateur sur `ids`, retourne les cibles effectivement retirées"""
+    ids = sorted(set(ids))
+    if not ids:
+        return set()
+    column = _column(kind)
+
+    if _supports_returning():
+        qn = connection.ops.quote_name
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {qn(Like._meta.db_table)} WHERE {qn("user_id")} = %s '
+                f'AND {qn(column)} IN ({placeholders}) RETURNING {qn(column)}',
+                [user_id, *ids],
+            )
+            deleted = {row[0] for row in cursor.fetchall()}
+    else:
+        with transaction.atomic():
+            likes = Like.objects.filter(user_id=user_id, **{f'{kind}_id__in': ids})
+            deleted = set(likes.values_list(f'{kind}_id', flat=True))
+            likes.delete()
+
+    for target_id in deleted:
+        counters.incr_on_commit(kind, target_id, 'likes_count', -1)
+    if kind == 'post':
+        trending.record_on_commit('posts', deleted, -1)
+    return deleted
+
+
+def toggle_like(user_id, kind, target_id):
+    """
+    Inverser le like de l'utilisateur sur une cible : un INSERT si elle n'était
+    pas likée, sinon un INSERT sans effet suivi d'un DELETE. Retourne True si
+    la cible est désormais likée.
+    """
+    if insert_likes(user_id, kind, [target_id]):
+        return True
+    delete_likes(user_id, kind, [target_id])
+    return False
+
+
+def apply_like_operations(user_id, operations):
+    """
+    Appliquer une file d'opérations (kind, id, like: bool) rejouée par un
+    client. Seule la dernière opération par cible compte, les cibles
+    inexistantes sont ignorées ; au plus deux écritures par type de cible.
+    Retourne (likés, retirés, ignorés).
+    """
+    final = {}
+    for kind, target_id, like in operations:
+        final[kind, target_id] = like
+
+    liked = unliked = 0
+    with transaction.atomic():
+        for kind, model in TARGETS.items():
+            wanted = {target_id: like for (k, target_id), like in final.items() if k == kind}
+            if not wanted:
+                continue
+            existing = set(model.objects.filter(id__in=wanted).values_list('id', flat=True))
+            liked += len(insert_likes(user_id, kind, [i for i in existing if wanted[i]]))
+            unliked += len(delete_likes(user_id, kind, [i for i in existing if not wanted[i]]))
+    skipped = len(operations) - liked - unliked
+    return liked, unliked, skipped
+
+
+def set_viewer_flags(posts, user_id):
+    """
+    Positionner has_liked et has_commented sur une page de posts pour le
+    lecteur : deux requêtes pour toute la page, quelle que soit sa taille
+    """
+    posts = list(posts)
+    ids = [post.id for post in posts]
+    liked = set(Like.objects.filter(user_id=user_id, post_id__in=ids).values_list('post_id', flat=True))
+    commented = set(
+        Comment.objects.filter(author_id=user_id, post_id__in=ids).values_list('post_id', flat=True).distinct()
+    )
+    for post in posts:
+        post.has_liked = post.id in liked
+        post.has_commented = post.id in commented
+    return posts
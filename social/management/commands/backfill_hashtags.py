@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social import hashtags
+from social.models import Post, Story
+
+
+class Command(BaseCommand):
+    help = "Alimente l'index des hashtags depuis les listes JSON des posts et stories existants."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Lignes traitées par transaction")
+
+    def handle(self, *args, **options):
+        for model in (Post, Story):
+            start = time.perf_counter()
+            processed = hashtags.backfill(model, options['chunk_size'])
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural} : {processed} lignes traitées "
+                f"en {time.perf_counter() - start:.1f}s"
+            )
+
+        updated = hashtags.recount()
+        self.stdout.write(self.style.SUCCESS(f"Compteurs recalculés pour {updated} hashtags"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social import hot
+
+
+class Command(BaseCommand):
+    help = "Recalcule le score de popularité de tous les posts depuis leurs likes et commentaires."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Posts lus par tranche")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        changed = hot.backfill(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{changed} scores corrigés en {time.perf_counter() - start:.1f}s"
+        ))
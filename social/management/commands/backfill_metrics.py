@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from social import metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrège par heure l'activité passée (MetricBucket). Chaque heure est validée séparément : "
+        "une exécution interrompue reprend aux heures non agrégées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Profondeur de l'historique, en jours")
+        parser.add_argument('--force', action='store_true', help="Recalculer aussi les heures déjà agrégées")
+
+    def handle(self, *args, **options):
+        end = timezone.now()
+        start = end - timedelta(days=options['days'])
+        hours = list(metrics.closed_hours(start, end)) if options['force'] else metrics.pending_hours(start, end)
+        began = time.perf_counter()
+        for done, hour in enumerate(hours, start=1):
+            buckets = metrics.rollup_hour(hour)
+            if done % 24 == 0 or done == len(hours):
+                self.stdout.write(f"{hour:%Y-%m-%d %H:00} : {done}/{len(hours)} heures ({buckets} tranches)")
+        self.stdout.write(f"{len(hours)} heures agrégées en {time.perf_counter() - began:.1f}s")
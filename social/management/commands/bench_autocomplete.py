@@ -0,0 +1,74 @@
+import pickle
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from social.autocomplete import HashtagIndex
+
+SYLLABLES = ['a', 'ar', 'ba', 'ca', 'de', 'di', 'en', 'fo', 'ga', 'in', 'ja', 'ko', 'la', 'li', 'ma', 'mo',
+             'na', 'on', 'pa', 'pho', 'ra', 're', 'sa', 'so', 'ta', 'te', 'to', 'un', 'va', 'yo', 'za']
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence de l'autocomplétion des hashtags sur un index synthétique."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=1000000, help="Nombre de hashtags distincts")
+        parser.add_argument('--queries', type=int, default=20000, help="Requêtes mesurées")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Tags formés de syllabes (préfixes partagés comme dans la réalité),
+        # poids en loi de puissance
+        weights = {}
+        while len(weights) < options['tags']:
+            tag = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 6))) + str(rng.randint(0, 99))
+            weights[tag] = int(rng.paretovariate(1.2))
+
+        start = time.perf_counter()
+        index = HashtagIndex(weights)
+        self.stdout.write(
+            f"Construction : {time.perf_counter() - start:.2f}s "
+            f"({len(index.tags)} tags, {len(index.top)} préfixes précalculés)"
+        )
+
+        data = pickle.dumps(index.dump(), protocol=pickle.HIGHEST_PROTOCOL)
+        start = time.perf_counter()
+        HashtagIndex.restore(pickle.loads(data))
+        self.stdout.write(
+            f"Instantané : {len(data) / 1e6:.1f} Mo, chargé en {time.perf_counter() - start:.2f}s"
+        )
+
+        tags = index.tags
+        prefixes = [rng.choice(tags)[:rng.randint(1, 4)] for _ in range(options['queries'])]
+        latencies = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.complete(prefix, 10)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        self.report('Préfixe', latencies)
+
+        latencies = []
+        for _ in range(options['queries'] // 10):
+            tag = rng.choice(tags)
+            start = time.perf_counter()
+            index.update(tag, max(index.weights.get(tag, 0) + rng.choice([-1, 1, 5]), 0))
+            latencies.append((time.perf_counter() - start) * 1e6)
+        self.report('Mise à jour', latencies)
+
+        # Référence : le filtrage par sous-chaîne fait jusqu'ici à chaque requête
+        latencies = []
+        for prefix in prefixes[:20]:
+            start = time.perf_counter()
+            sorted((tag for tag in tags if prefix in tag), key=weights.get, reverse=True)[:10]
+            latencies.append((time.perf_counter() - start) * 1e6)
+        self.report('Parcours', latencies)
+
+    def report(self, label, latencies):
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(f"{label:<12} p50 {p50:>10.1f}µs   p99 {p99:>10.1f}µs")
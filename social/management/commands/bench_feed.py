@@ -0,0 +1,103 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from social import feed
+from social.models import Post
+
+User = get_user_model()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = "Mesure la diffusion d'un post et la lecture du fil, SQL contre timelines matérialisées."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=10000, help="Abonnés de l'auteur diffusé")
+        parser.add_argument('--posts', type=int, default=20000, help="Posts publics existants")
+        parser.add_argument('--reads', type=int, default=500, help="Lectures de fil mesurées")
+
+    def handle(self, *args, **options):
+        store = feed.get_store()
+        self.stdout.write(f"Stockage des timelines : {type(store).__name__}")
+
+        # Les données de test sont créées dans une transaction annulée à la fin
+        with transaction.atomic():
+            author = User.objects.create(email='bench-feed-author@example.com', username='bench-feed-author')
+            others = User.objects.bulk_create([
+                User(email=f'bench-feed-other-{i}@example.com', username=f'bench-feed-other-{i}')
+                for i in range(100)
+            ])
+            followers = User.objects.bulk_create([
+                User(email=f'bench-feed-{i}@example.com', username=f'bench-feed-{i}')
+                for i in range(options['followers'])
+            ], batch_size=1000)
+            User.following.through.objects.bulk_create([
+                User.following.through(from_user_id=follower.id, to_user_id=author.id)
+                for follower in followers
+            ], batch_size=1000)
+            User.objects.filter(pk=author.pk).update(followers_count=len(followers))
+            Post.objects.bulk_create([
+                Post(author=others[i % len(others)], content=f'bench {i}')
+                for i in range(options['posts'])
+            ], batch_size=1000)
+
+            start = time.perf_counter()
+            feed.rebuild_public_stream(store)
+            for follower in followers:
+                feed.rebuild_timeline(follower.id, store)
+            self.stdout.write(
+                f"Construction de {len(followers)} timelines : {time.perf_counter() - start:.2f}s"
+            )
+
+            readers = [random.choice(followers).id for _ in range(options['reads'])]
+            self.report('Avant (SQL)', lambda user_id: list(feed.feed_queryset(user_id)[:20]), readers)
+
+            # Diffusion complète, puis mode hybride : l'auteur dépasse le seuil
+            with override_settings(FEED_FANOUT_THRESHOLD=0):
+                self.fan_out(author, 'Diffusion complète')
+                self.report('Après (diffusion)', lambda user_id: feed.get_feed(user_id, 0, 20), readers)
+            with override_settings(FEED_FANOUT_THRESHOLD=len(followers)):
+                # Les listes de comptes suivis au-delà du seuil sont recalculées
+                feed.invalidate_timelines(readers)
+                for user_id in set(readers):
+                    feed.get_feed(user_id, 0, 20)
+                self.fan_out(author, 'Mode hybride')
+                self.report('Après (hybride)', lambda user_id: feed.get_feed(user_id, 0, 20), readers)
+
+            store.delete(
+                [feed.timeline_key(user.id) for user in [author, *followers]]
+                + [feed.author_key(author.id), feed.PUBLIC_KEY]
+            )
+            feed.invalidate_timelines(readers)
+            transaction.set_rollback(True)
+
+    def fan_out(self, author, label):
+        post = Post.objects.create(author=author, content='bench fan-out')
+        start = time.perf_counter()
+        pushed = feed.fan_out(post.id)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<20} post diffusé dans {pushed} timelines en {elapsed * 1000:.1f}ms")
+
+    def report(self, label, read, user_ids):
+        latencies = []
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            for user_id in user_ids:
+                start = time.perf_counter()
+                read(user_id)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        self.stdout.write(
+            f"{label:<20} requêtes/lecture={len(queries) / len(user_ids):.2f} "
+            f"p50={percentile(latencies, 50):.3f}ms p99={percentile(latencies, 99):.3f}ms"
+        )
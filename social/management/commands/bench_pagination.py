@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from social.models import Post
+from yoursocial.pagination import NEXT_CURSOR_HEADER, paginate_keyset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare la latence par page de la pagination OFFSET et par curseur en profondeur."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help="Nombre de posts")
+        parser.add_argument('--pages', type=int, default=1000, help="Profondeur parcourue")
+        parser.add_argument('--limit', type=int, default=20, help="Taille de page")
+
+    def handle(self, *args, **options):
+        limit, pages = options['limit'], options['pages']
+        checkpoints = sorted({1, 10, 100, pages // 2, pages} - {0})
+
+        # Les données de test sont créées dans une transaction annulée à la fin
+        with transaction.atomic():
+            author = User.objects.create(email='bench-pagination@example.com', username='bench-pagination')
+            start = time.perf_counter()
+            for offset in range(0, options['rows'], 10000):
+                Post.objects.bulk_create(
+                    [Post(author=author, content=f'bench {i}') for i in range(offset, min(offset + 10000, options['rows']))],
+                    batch_size=2000,
+                )
+            self.stdout.write(f"{options['rows']} posts insérés en {time.perf_counter() - start:.1f}s")
+
+            queryset = Post.objects.select_related('author')
+
+            # Parcours complet par curseur, en gardant le curseur des pages mesurées
+            cursors = {}
+            response, cursor = {}, None
+            for page in range(1, pages + 1):
+                cursors[page] = cursor
+                paginate_keyset(queryset, response, cursor, limit=limit)
+                cursor = response.pop(NEXT_CURSOR_HEADER)
+
+            self.stdout.write(f"{'page':>6} {'OFFSET':>12} {'curseur':>12}")
+            for page in checkpoints:
+                offset_ms = self.measure(lambda: paginate_keyset(queryset, page=page, limit=limit))
+                keyset_ms = self.measure(lambda: paginate_keyset(queryset, {}, cursors[page], limit=limit))
+                self.stdout.write(f"{page:>6} {offset_ms:>10.2f}ms {keyset_ms:>10.2f}ms")
+
+            transaction.set_rollback(True)
+
+    def measure(self, read, repeat=7):
+        """Latence médiane d'une lecture de page, en millisecondes"""
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            read()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return sorted(latencies)[repeat // 2]
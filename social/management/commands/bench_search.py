@@ -0,0 +1,100 @@
+import random
+import time
+import uuid
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from social import search
+from social.models import Post
+from users.models import User
+
+SYLLABLES = ['a', 'ar', 'ba', 'ca', 'de', 'di', 'en', 'fo', 'ga', 'in', 'ja', 'ko', 'la', 'li', 'ma', 'mo',
+             'na', 'on', 'pa', 'pho', 'ra', 're', 'sa', 'so', 'ta', 'te', 'to', 'un', 'va', 'yo', 'za']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la recherche plein texte au filtrage icontains sur des posts synthétiques "
+        "(créés dans une transaction annulée à la fin)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000, help="Nombre de posts générés")
+        parser.add_argument('--words', type=int, default=50000, help="Taille du vocabulaire")
+        parser.add_argument('--queries', type=int, default=500, help="Requêtes mesurées par type")
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(random.Random(options['seed']), options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rng, options):
+        vocabulary = set()
+        while len(vocabulary) < options['words']:
+            vocabulary.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+        vocabulary = sorted(vocabulary)
+        rng.shuffle(vocabulary)
+        # Fréquence des mots en loi de Zipf
+        cumulative = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        author = User.objects.create_user(
+            email=f'bench-{uuid.uuid4().hex}@example.com', username=f'bench-{uuid.uuid4().hex[:12]}', password=None,
+        )
+        created = indexed = 0.0
+        remaining = options['posts']
+        while remaining:
+            size = min(remaining, options['chunk_size'])
+            posts = [
+                Post(
+                    author=author,
+                    content=' '.join(rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(8, 30))),
+                    hashtags=rng.choices(vocabulary[:1000], k=rng.randint(0, 3)),
+                )
+                for _ in range(size)
+            ]
+            start = time.perf_counter()
+            Post.objects.bulk_create(posts)
+            created += time.perf_counter() - start
+            start = time.perf_counter()
+            search.index('posts', posts)
+            indexed += time.perf_counter() - start
+            remaining -= size
+        self.stdout.write(
+            f"{options['posts']} posts : insertion {created:.1f}s, indexation {indexed:.1f}s "
+            f"({options['posts'] / indexed:,.0f} documents/s)"
+        )
+
+        count = options['queries']
+        workloads = {
+            'Mot fréquent': [rng.choice(vocabulary[:100]) for _ in range(count)],
+            'Mot rare': [rng.choice(vocabulary[-10000:]) for _ in range(count)],
+            'Deux mots': [f'{rng.choice(vocabulary[:2000])} {rng.choice(vocabulary[:2000])}' for _ in range(count)],
+            'Préfixe': [rng.choice(vocabulary[:5000])[:3] for _ in range(count)],
+        }
+        for label, queries in workloads.items():
+            self.measure(f'{label} (index)', queries, lambda query: search.search('posts', query, 20))
+            # Référence : le LIKE '%q%' d'avant, sur une partie des requêtes seulement
+            self.measure(f'{label} (icontains)', queries[:max(count // 50, 5)],
+                         lambda query: list(Post.objects.filter(content__icontains=query.split()[0])[:20]))
+
+    def measure(self, label, queries, run):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            run(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(f"{label:<26} p50 {p50:>9.2f}ms   p99 {p99:>9.2f}ms")
@@ -0,0 +1,87 @@
+import random
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from social import trending
+
+
+class MemoryStore:
+    """Tranches en mémoire, mêmes opérations que les sorted sets Redis"""
+
+    def __init__(self):
+        self.buckets = defaultdict(Counter)
+
+    def incr(self, entries):
+        for key, member, weight, _ in entries:
+            self.buckets[key][str(member)] += weight
+
+    def top(self, keys, count):
+        total = Counter()
+        for key in keys:
+            total.update(self.buckets.get(key, ()))
+        return [(member, float(score)) for member, score in total.most_common(count)]
+
+    def trim(self, keys, capacity):
+        for key in keys:
+            counts = self.buckets.get(key)
+            if counts is not None and len(counts) > capacity:
+                self.buckets[key] = Counter(dict(counts.most_common(capacity)))
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit et la précision du calcul des tendances sur un flux synthétique."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=500000, help="Événements répartis sur 7 jours")
+        parser.add_argument('--members', type=int, default=200000, help="Posts distincts")
+        parser.add_argument('--capacity', type=int, default=None, help="Taille des tranches closes")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        capacity = options['capacity'] or settings.TRENDING_BUCKET_CAPACITY
+        end = int(time.time())
+        start = end - 7 * 86400
+
+        # Popularité en loi de Zipf, avec des posts qui montent en fin de période
+        members = list(range(options['members']))
+        rng.shuffle(members)
+        weights = [1 / (rank + 1) for rank in range(len(members))]
+        events = sorted(
+            (rng.randint(start, end), member)
+            for member in rng.choices(members, weights, k=options['events'])
+        )
+
+        store = MemoryStore()
+        clock = time.perf_counter()
+        next_refresh = start + 60
+        for at, member in events:
+            trending.record('posts', [member], at=at, store=store)
+            if at >= next_refresh:
+                # Réduction des tranches closes comme le fait refresh_trending
+                for size in trending.bucket_sizes():
+                    keys = trending._keys('posts', size, trending._longest(size), at)[:-1]
+                    store.trim(keys[-2:], capacity)
+                next_refresh = at + 60
+        elapsed = time.perf_counter() - clock
+        self.stdout.write(f"Ingestion : {len(events) / elapsed:,.0f} événements/s (capacité {capacity})")
+
+        for window, (duration, _) in trending.WINDOWS.items():
+            exact = Counter(str(member) for at, member in events if at > end - duration)
+            clock = time.perf_counter()
+            board = store.top(trending.window_keys('posts', window, end), 100)
+            elapsed = (time.perf_counter() - clock) * 1000
+            truth = exact.most_common(100)
+            errors = [abs(score - exact[member]) / exact[member] for member, score in board]
+            self.stdout.write(
+                f"{window:<4} précision@10 {self.precision(board, truth, 10):.2f}   "
+                f"précision@100 {self.precision(board, truth, 100):.2f}   "
+                f"erreur moyenne {sum(errors) / len(errors):.2%}   classement en {elapsed:.1f}ms"
+            )
+
+    def precision(self, board, truth, count):
+        expected = {member for member, _ in truth[:count]}
+        return len(expected & {member for member, _ in board[:count]}) / max(len(expected), 1)
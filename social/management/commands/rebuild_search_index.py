@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index plein texte des utilisateurs, posts et stories."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Lignes indexées par transaction")
+        parser.add_argument('--kind', choices=list(search.SOURCES), action='append',
+                            help="Type de document à reconstruire (tous par défaut)")
+
+    def handle(self, *args, **options):
+        search.install()
+        for kind in options['kind'] or search.SOURCES:
+            start = time.perf_counter()
+            indexed = search.rebuild(kind, options['chunk_size'])
+            self.stdout.write(f"{kind} : {indexed} documents indexés en {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,150 @@
+"""
+Métriques d'activité agrégées par heure (MetricBucket).
+
+Chaque heure close est comptée une fois, pour la plateforme (portée
+'global') et pour chaque utilisateur concerné (portée 'user:<id>') : la
+tâche Celery rollup_metrics traite les heures récentes, la commande
+backfill_metrics l'historique. Une heure est recalculée entièrement dans une
+transaction (suppression puis insertion) et marquée d'un MetricRollup :
+recalculer une heure donne les mêmes tranches, et une reprise repart des
+heures non marquées.
+
+window() répond aux questions « sur les N dernières heures » en sommant au
+plus N tranches, et compte en direct les heures pas encore agrégées (l'heure
+en cours, un retard de la tâche). Les fenêtres sont alignées sur l'heure :
+les 24 dernières heures commencent au début de l'heure d'il y a 24 heures.
+
+La métrique logins compte les dernières connexions (last_login) tombant dans
+l'heure au moment de l'agrégation : une reconnexion ultérieure déplace la
+connexion précédente d'une heure non encore agrégée.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from messaging.models import Message
+from users.models import User
+
+from .models import Comment, Like, MetricBucket, MetricRollup, Post, Story, StoryView
+
+GLOBAL = 'global'
+HOUR = timedelta(hours=1)
+
+# Métrique -> (modèle, champ de date, utilisateur concerné : champ, expression ou None)
+METRICS = {
+    'posts': (Post, 'created_at', 'author_id'),
+    'stories': (Story, 'created_at', 'author_id'),
+    # Likes et commentaires reçus
+    'likes': (Like, 'created_at', Coalesce('post__author_id', 'comment__author_id')),
+    'comments': (Comment, 'created_at', 'post__author_id'),
+    # Messages des conversations de l'utilisateur, envoyés compris
+    'messages': (Message, 'created_at', 'conversation__participants'),
+    'story_views': (StoryView, 'viewed_at', 'story__author_id'),
+    'logins': (User, 'last_login', None),
+}
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def floor_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _events(metric, start, end):
+    model, field, _ = METRICS[metric]
+    return model.objects.filter(**{f'{field}__gte': start, f'{field}__lt': end}).order_by()
+
+
+def _owner(metric):
+    _, _, owner = METRICS[metric]
+    return F(owner) if isinstance(owner, str) else owner
+
+
+def rollup_hour(hour):
+    """(Re)calculer les tranches de l'heure commençant à `hour` ; retourne leur nombre"""
+    end = hour + HOUR
+    with transaction.atomic():
+        buckets = []
+        for metric, (_, _, owner) in METRICS.items():
+            events = _events(metric, hour, end)
+            total = events.count()
+            if not total:
+                continue
+            buckets.append(MetricBucket(metric=metric, scope=GLOBAL, hour=hour, value=total))
+            if owner is None:
+                continue
+            for row in events.values(owner_id=_owner(metric)).annotate(value=Count('pk')):
+                if row['owner_id'] is not None:
+                    buckets.append(MetricBucket(
+                        metric=metric, scope=user_scope(row['owner_id']), hour=hour, value=row['value'],
+                    ))
+        MetricBucket.objects.filter(hour=hour).delete()
+        MetricBucket.objects.bulk_create(buckets, batch_size=1000)
+        MetricRollup.objects.update_or_create(hour=hour, defaults={'completed_at': timezone.now()})
+    return len(buckets)
+
+
+def closed_hours(start, end):
+    """Heures closes de [start, end), dans l'ordre"""
+    hour = floor_hour(start)
+    while hour + HOUR <= end:
+        yield hour
+        hour += HOUR
+
+
+def pending_hours(start, end):
+    """Heures closes de [start, end) sans MetricRollup, dans l'ordre"""
+    done = set(MetricRollup.objects.filter(hour__gte=floor_hour(start), hour__lt=end).values_list('hour', flat=True))
+    return [hour for hour in closed_hours(start, end) if hour not in done]
+
+
+def rollup(start, end=None, force=False):
+    """Agréger les heures closes de [start, end) pas encore agrégées (toutes si `force`) ; retourne leur nombre"""
+    end = min(end or timezone.now(), timezone.now())
+    hours = closed_hours(start, end) if force else pending_hours(start, end)
+    count = 0
+    for hour in hours:
+        rollup_hour(hour)
+        count += 1
+    return count
+
+
+def window(metrics, scope=GLOBAL, hours=24, now=None):
+    """
+    {métrique: total} sur les `hours` dernières heures : tranches des heures
+    agrégées, comptage en direct des autres
+    """
+    now = now or timezone.now()
+    start = floor_hour(now - timedelta(hours=hours))
+    totals = dict.fromkeys(metrics, 0)
+    # Les tranches d'une heure n'existent qu'une fois l'heure marquée
+    for metric, value in MetricBucket.objects.filter(
+        metric__in=metrics, scope=scope, hour__gte=start
+    ).values_list('metric').annotate(total=Sum('value')):
+        totals[metric] = value
+
+    # Heures non agrégées, l'heure en cours comprise, regroupées en intervalles
+    done = set(MetricRollup.objects.filter(hour__gte=start).values_list('hour', flat=True))
+    gaps = []
+    for hour in closed_hours(start, floor_hour(now) + HOUR):
+        if hour in done:
+            continue
+        if gaps and gaps[-1][1] == hour:
+            gaps[-1][1] = hour + HOUR
+        else:
+            gaps.append([hour, hour + HOUR])
+    for metric in metrics:
+        for begin, end in gaps:
+            events = _events(metric, begin, min(end, now))
+            if scope != GLOBAL:
+                _, _, owner = METRICS[metric]
+                if owner is None:
+                    raise ValueError(f"Métrique {metric} sans portée utilisateur")
+                events = events.alias(owner_id=_owner(metric)).filter(owner_id=int(scope.split(':')[1]))
+            totals[metric] += events.count()
+    return totals
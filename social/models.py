@@ -4,6 +4,8 @@ from django.conf import settings
 from django.utils import timezone
 from django.db.models import JSONField
 
+from .hot import initial_score
+
 class Post(models.Model):
     """
     Modèle pour les publications
@@ -45,11 +47,20 @@ class Post(models.Model):
     updated_at = models.DateTimeField(_('date de modification'), auto_now=True)
     likes_count = models.PositiveIntegerField(_('nombre de likes'), default=0)
     comments_count = models.PositiveIntegerField(_('nombre de commentaires'), default=0)
+    # Popularité décroissante dans le temps, voir social/hot.py
+    hot_score = models.FloatField(_('score de popularité'), default=initial_score)
 
     class Meta:
         verbose_name = _('publication')
         verbose_name_plural = _('publications')
         ordering = ['-created_at']
+        # Index de la pagination par curseur (created_at, id) et du flux public
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-id']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['is_private', '-created_at']),
+            models.Index(fields=['-hot_score', '-id']),
+        ]
 
     def __str__(self):
         return f"Post de {self.author.username} - {self.created_at}"
@@ -87,6 +98,11 @@ class Comment(models.Model):
         verbose_name = _('commentaire')
         verbose_name_plural = _('commentaires')
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id']),
+            # Agrégation horaire (social/metrics.py)
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Commentaire de {self.author.username} sur {self.post}"
@@ -126,6 +142,10 @@ class Like(models.Model):
             ('user', 'post'),
             ('user', 'comment')
         ]
+        # Agrégation horaire (social/metrics.py)
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         if self.post:
@@ -171,6 +191,11 @@ class Story(models.Model):
         verbose_name = _('story')
         verbose_name_plural = _('stories')
         ordering = ['-created_at']
+        # Stories actives d'un auteur ; agrégation horaire (social/metrics.py)
+        indexes = [
+            models.Index(fields=['author', 'expires_at']),
+            models.Index(fields=['created_at']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -202,6 +227,165 @@ class StoryView(models.Model):
         verbose_name = _('visualisation de story')
         verbose_name_plural = _('visualisations de stories')
         unique_together = ['story', 'viewer']
+        # Spectateurs d'une story par date de visualisation ; agrégation horaire (social/metrics.py)
+        indexes = [
+            models.Index(fields=['story', 'viewed_at']),
+            models.Index(fields=['viewed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.viewer.username} a vu la story de {self.story.author.username}"
+
+class Hashtag(models.Model):
+    """
+    Index des hashtags utilisés par les posts et les stories, avec compteurs
+    dénormalisés (maintenus par social.hashtags)
+    """
+    tag = models.CharField(_('tag'), max_length=100, unique=True)
+    posts_count = models.PositiveIntegerField(_('nombre de publications'), default=0)
+    stories_count = models.PositiveIntegerField(_('nombre de stories'), default=0)
+    last_used = models.DateTimeField(_('dernière utilisation'), null=True, blank=True)
+    # Renseignée aussi par les update() de social.hashtags : sert de repère
+    # aux index d'autocomplétion pour relire les hashtags modifiés
+    updated_at = models.DateTimeField(_('date de modification'), auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('hashtag')
+        verbose_name_plural = _('hashtags')
+        # Classement par popularité
+        indexes = [
+            models.Index(
+                (models.F('posts_count') + models.F('stories_count')).desc(), 'tag',
+                name='social_hashtag_usage_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.tag}"
+
+class PostHashtag(models.Model):
+    """
+    Hashtag utilisé par un post
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='hashtag_links',
+        verbose_name=_('publication')
+    )
+    hashtag = models.ForeignKey(
+        Hashtag,
+        on_delete=models.CASCADE,
+        related_name='post_links',
+        verbose_name=_('hashtag')
+    )
+
+    class Meta:
+        verbose_name = _('hashtag de publication')
+        verbose_name_plural = _('hashtags de publications')
+        unique_together = ['post', 'hashtag']
+        indexes = [
+            models.Index(fields=['hashtag', 'post']),
+        ]
+
+class StoryHashtag(models.Model):
+    """
+    Hashtag utilisé par une story
+    """
+    story = models.ForeignKey(
+        Story,
+        on_delete=models.CASCADE,
+        related_name='hashtag_links',
+        verbose_name=_('story')
+    )
+    hashtag = models.ForeignKey(
+        Hashtag,
+        on_delete=models.CASCADE,
+        related_name='story_links',
+        verbose_name=_('hashtag')
+    )
+
+    class Meta:
+        verbose_name = _('hashtag de story')
+        verbose_name_plural = _('hashtags de stories')
+        unique_together = ['story', 'hashtag']
+        indexes = [
+            models.Index(fields=['hashtag', 'story']),
+        ]
+
+class StatisticsSnapshot(models.Model):
+    """
+    Statistiques globales de la plateforme à un instant donné, écrites par la
+    tâche generate_statistics ; l'historique est conservé pour suivre la
+    croissance
+    """
+    created_at = models.DateTimeField(_('date de création'), default=timezone.now)
+    total_users = models.PositiveIntegerField(_('utilisateurs'), default=0)
+    total_posts = models.PositiveIntegerField(_('publications'), default=0)
+    total_stories = models.PositiveIntegerField(_('stories'), default=0)
+    total_likes = models.PositiveIntegerField(_('likes'), default=0)
+    total_comments = models.PositiveIntegerField(_('commentaires'), default=0)
+    total_messages = models.PositiveIntegerField(_('messages'), default=0)
+    total_conversations = models.PositiveIntegerField(_('conversations'), default=0)
+    total_notifications = models.PositiveIntegerField(_('notifications'), default=0)
+    new_users_24h = models.PositiveIntegerField(_('nouveaux utilisateurs (24h)'), default=0)
+    new_posts_24h = models.PositiveIntegerField(_('nouvelles publications (24h)'), default=0)
+    new_stories_24h = models.PositiveIntegerField(_('nouvelles stories (24h)'), default=0)
+    new_likes_24h = models.PositiveIntegerField(_('nouveaux likes (24h)'), default=0)
+    new_comments_24h = models.PositiveIntegerField(_('nouveaux commentaires (24h)'), default=0)
+    new_messages_24h = models.PositiveIntegerField(_('nouveaux messages (24h)'), default=0)
+    active_users_24h = models.PositiveIntegerField(_('utilisateurs actifs (24h)'), default=0)
+    popular_hashtags = JSONField(verbose_name=_('hashtags populaires'), default=list)
+
+    class Meta:
+        verbose_name = _('instantané des statistiques')
+        verbose_name_plural = _('instantanés des statistiques')
+        ordering = ['-created_at']
+        get_latest_by = 'created_at'
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Statistiques du {self.created_at:%Y-%m-%d %H:%M}"
+
+class MetricBucket(models.Model):
+    """
+    Nombre d'événements d'une métrique pendant une heure, pour la plateforme
+    (portée 'global') ou pour un utilisateur (portée 'user:<id>'), écrit par
+    social/metrics.py
+    """
+    metric = models.CharField(_('métrique'), max_length=32)
+    scope = models.CharField(_('portée'), max_length=32)
+    hour = models.DateTimeField(_('heure'))
+    value = models.PositiveBigIntegerField(_('valeur'), default=0)
+
+    class Meta:
+        verbose_name = _('tranche horaire de métrique')
+        verbose_name_plural = _('tranches horaires de métriques')
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'scope', 'hour'], name='unique_metric_bucket'),
+        ]
+        indexes = [
+            # Recalcul d'une heure
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} {self.scope} {self.hour:%Y-%m-%d %H:00} : {self.value}"
+
+class MetricRollup(models.Model):
+    """
+    Heure dont les MetricBucket sont complets : une heure sans marque est
+    (re)calculée par la prochaine agrégation et comptée en direct à la lecture
+    """
+    hour = models.DateTimeField(_('heure'), unique=True)
+    completed_at = models.DateTimeField(_("date d'agrégation"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('heure agrégée')
+        verbose_name_plural = _('heures agrégées')
+        ordering = ['-hour']
 
     def __str__(self):
-        return f"{self.viewer.username} a vu la story de {self.story.author.username}"
\ No newline at end of file
+        return f"{self.hour:%Y-%m-%d %H:00}"
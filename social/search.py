@@ -0,0 +1,316 @@
+"""
+Recherche plein texte des utilisateurs, posts et stories.
+
+Chaque type de document a sa table d'index (search_users, search_posts,
+search_stories), créée après chaque migrate, tenue à jour à l'écriture par les
+signaux et remplie pour l'existant par la commande rebuild_search_index. Le
+moteur dépend de la base :
+
+- PostgreSQL : colonne tsvector (titre pondéré A, corps B) sous index GIN,
+  pertinence ts_rank ;
+- SQLite : table virtuelle FTS5, pertinence BM25.
+
+Tous les termes d'une requête doivent apparaître, le dernier en préfixe
+(saisie en cours). Seuls les SEARCH_CANDIDATES documents correspondants les
+plus récents (identifiants les plus grands) sont classés : le coût d'un mot
+très courant reste borné, et les résultats récents sont privilégiés. Les
+tables ne contiennent que les identifiants : les résultats sont hydratés
+depuis les tables des modèles, qui font foi pour la visibilité.
+
+federated_search() interroge plusieurs types à la fois (en parallèle hors
+transaction) et fusionne leurs résultats par score normalisé : chaque score
+est divisé par le meilleur score de son type pour la requête, figé dans le
+curseur dès la première page. Le curseur porte, par type, le nombre de
+documents déjà parcourus.
+"""
+import heapq
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, connections, transaction
+
+from users.models import User
+from yoursocial.pagination import decode_cursor
+
+from .models import Post, Story
+
+# Poids du titre face au corps dans le score BM25
+TITLE_WEIGHT = 4.0
+
+
+def _user_document(user):
+    return ' '.join(filter(None, [user.username, user.first_name, user.last_name])), user.bio or ''
+
+
+def _post_document(post):
+    return ' '.join(post.hashtags or []), post.content or ''
+
+
+def _story_document(story):
+    return ' '.join(story.hashtags or []), story.caption or ''
+
+
+# Type de document -> (modèle, champs indexés, fonction retournant (titre, corps))
+SOURCES = {
+    'users': (User, {'username', 'first_name', 'last_name', 'bio'}, _user_document),
+    'posts': (Post, {'content', 'hashtags'}, _post_document),
+    'stories': (Story, {'caption', 'hashtags'}, _story_document),
+}
+
+
+def table(kind):
+    return f'search_{kind}'
+
+
+def kind_of(model):
+    return next(kind for kind, (source, _, _) in SOURCES.items() if source is model)
+
+
+def terms(query):
+    """Termes d'une requête en minuscules, au plus SEARCH_MAX_TERMS"""
+    return re.findall(r'\w+', query.lower())[:settings.SEARCH_MAX_TERMS]
+
+
+class PostgresSearchBackend:
+    """Vecteurs tsvector pondérés sous index GIN, classés par ts_rank"""
+
+    def install(self, cursor):
+        for kind in SOURCES:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {table(kind)} (object_id bigint PRIMARY KEY, vector tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {table(kind)}_vector_idx ON {table(kind)} USING gin (vector)')
+
+    def index(self, kind, documents):
+        config = settings.SEARCH_CONFIG
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table(kind)} (object_id, vector) "
+                f"VALUES (%s, setweight(to_tsvector(%s, %s), 'A') || setweight(to_tsvector(%s, %s), 'B')) "
+                f"ON CONFLICT (object_id) DO UPDATE SET vector = EXCLUDED.vector",
+                [(pk, config, title, config, body) for pk, title, body in documents],
+            )
+
+    def remove(self, kind, ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table(kind)} WHERE object_id = ANY(%s)', [list(ids)])
+
+    def clear(self, kind):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {table(kind)}')
+
+    def search(self, kind, words, limit, offset=0):
+        lexemes = [f"'{word}'" for word in words]
+        lexemes[-1] += ':*'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id, ts_rank(vector, query) AS score FROM ("
+                f"  SELECT object_id, vector, query FROM {table(kind)}, to_tsquery(%s, %s) query "
+                f"  WHERE vector @@ query ORDER BY object_id DESC LIMIT %s"
+                f") candidates ORDER BY score DESC, object_id DESC LIMIT %s OFFSET %s",
+                [settings.SEARCH_CONFIG, ' & '.join(lexemes), settings.SEARCH_CANDIDATES, limit, offset],
+            )
+            return [(pk, float(score)) for pk, score in cursor.fetchall()]
+
+
+class SQLiteSearchBackend:
+    """Tables virtuelles FTS5, classées par BM25"""
+
+    def install(self, cursor):
+        for kind in SOURCES:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table(kind)} "
+                f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def index(self, kind, documents):
+        documents = list(documents)
+        with connection.cursor() as cursor:
+            # FTS5 n'a pas d'UPSERT
+            cursor.executemany(f'DELETE FROM {table(kind)} WHERE rowid = %s', [(pk,) for pk, _, _ in documents])
+            cursor.executemany(f'INSERT INTO {table(kind)} (rowid, title, body) VALUES (%s, %s, %s)', documents)
+
+    def remove(self, kind, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table(kind)} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def clear(self, kind):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table(kind)}')
+
+    def search(self, kind, words, limit, offset=0):
+        # Chaque terme entre guillemets : la syntaxe FTS5 de l'utilisateur n'est pas interprétée
+        match = ' '.join(f'"{word}"' for word in words) + '*'
+        rank = f'bm25({table(kind)}, {TITLE_WEIGHT}, 1.0)'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, score FROM ('
+                f'  SELECT rowid, -{rank} AS score FROM {table(kind)} '
+                f'  WHERE {table(kind)} MATCH %s ORDER BY rowid DESC LIMIT %s'
+                f') ORDER BY score DESC, rowid DESC LIMIT %s OFFSET %s',
+                [match, settings.SEARCH_CANDIDATES, limit, offset],
+            )
+            return [(pk, float(score)) for pk, score in cursor.fetchall()]
+
+
+_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    """Retourner le moteur de recherche adapté à la base"""
+    vendor = vendor or connection.vendor
+    try:
+        return _BACKENDS[vendor]()
+    except KeyError:
+        raise ImproperlyConfigured(f"Recherche plein texte non disponible pour la base {vendor}")
+
+
+def install(using='default', **kwargs):
+    """Créer les tables d'index (receiver de post_migrate)"""
+    db = connections[using]
+    backend = _BACKENDS.get(db.vendor)
+    if backend is not None:
+        with db.cursor() as cursor:
+            backend().install(cursor)
+
+
+def index(kind, objects):
+    """Indexer (ou réindexer) des instances du type `kind`"""
+    _, _, document = SOURCES[kind]
+    documents = [(obj.pk, *document(obj)) for obj in objects]
+    if documents:
+        get_backend().index(kind, documents)
+
+
+def remove(kind, ids):
+    ids = list(ids)
+    if ids:
+        get_backend().remove(kind, ids)
+
+
+def search(kind, query, limit=20, offset=0):
+    """[(id, score)] des documents correspondant à la requête, les plus pertinents d'abord"""
+    words = terms(query)
+    if not words:
+        return []
+    return get_backend().search(kind, words, limit, offset)
+
+
+def rebuild(kind, chunk_size=1000):
+    """Réindexer tous les objets d'un type, par lots d'une transaction ; retourne leur nombre"""
+    model, fields, _ = SOURCES[kind]
+    backend = get_backend()
+    backend.clear(kind)
+    objects = model.objects.only(*fields).order_by('pk').iterator(chunk_size=chunk_size)
+    indexed = 0
+    while batch := list(islice(objects, chunk_size)):
+        with transaction.atomic():
+            index(kind, batch)
+        indexed += len(batch)
+    return indexed
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.SEARCH_WORKERS, thread_name_prefix='search')
+    return _executor
+
+
+def _fetch(kind, words, hydrate, offset, count):
+    """
+    Documents d'un type à partir de la position `offset` :
+    ([(position, score, résultat hydraté ou None s'il n'est pas visible)], durée en ms)
+    """
+    start = time.perf_counter()
+    hits = get_backend().search(kind, words, count, offset)
+    results = hydrate([pk for pk, _ in hits]) if hits else {}
+    fetched = [(offset + i, score, results.get(pk)) for i, (pk, score) in enumerate(hits)]
+    return fetched, (time.perf_counter() - start) * 1000
+
+
+def _fetch_in_thread(*args):
+    # Chaque thread du pool garde sa connexion d'une recherche à l'autre, comme
+    # un worker d'une requête à l'autre : fermée seulement au-delà de
+    # CONN_MAX_AGE ou après une erreur
+    close_old_connections()
+    try:
+        return _fetch(*args)
+    finally:
+        close_old_connections()
+
+
+def federated_search(query, sources, limit=20, cursor=None, skip=0):
+    """
+    Rechercher `query` dans plusieurs types et fusionner les résultats par
+    score normalisé (relevance_score entre 0 et 1).
+
+    `sources` associe chaque type à une fonction qui hydrate une liste d'ids
+    en {id: résultat} en écartant les documents non visibles. `skip` saute des
+    résultats (pagination par numéro de page, sans curseur). Retourne
+    (résultats, valeurs du curseur suivant ou None, durée par type en ms).
+    """
+    words = terms(query)
+    kinds = list(sources)
+    if cursor:
+        values = decode_cursor(cursor, 2 * len(kinds), (int, float) * len(kinds))
+        state = {kind: (values[2 * i], values[2 * i + 1]) for i, kind in enumerate(kinds)}
+    else:
+        state = {kind: (0, 0.0) for kind in kinds}
+    # Une position négative marque un type épuisé
+    active = [kind for kind in kinds if state[kind][0] >= 0] if words else []
+
+    # Un document de plus par type pour savoir s'il en reste
+    count = skip + limit + 1
+    jobs = {kind: (kind, words, sources[kind], state[kind][0], count) for kind in active}
+    if len(jobs) > 1 and settings.SEARCH_PARALLEL and not connection.in_atomic_block:
+        futures = {kind: _get_executor().submit(_fetch_in_thread, *job) for kind, job in jobs.items()}
+        fetched = {kind: future.result() for kind, future in futures.items()}
+    else:
+        # Dans une transaction, les autres connexions ne verraient pas ses écritures
+        fetched = {kind: _fetch(*job) for kind, job in jobs.items()}
+
+    # Clé de fusion (-score normalisé, type, position) : un ordre total,
+    # identique d'une page à l'autre
+    entries, scales = {}, {}
+    for index, kind in enumerate(active):
+        hits, _ = fetched[kind]
+        scale = state[kind][1] or (hits[0][1] if hits else 0.0)
+        scales[kind] = scale if scale > 0 else 1.0
+        entries[kind] = [((-score / scales[kind], index, position), result) for position, score, result in hits]
+
+    merged = heapq.merge(*entries.values(), key=lambda entry: entry[0])
+    taken = list(islice((entry for entry in merged if entry[1] is not None), skip + limit))
+    # Page pleine : les documents classés après le dernier servi restent à parcourir
+    cutoff = taken[-1][0] if len(taken) == skip + limit else None
+
+    values = []
+    for kind in kinds:
+        if kind not in entries:
+            values += [-1, 0.0]
+            continue
+        hits = entries[kind]
+        consumed = sum(1 for key, _ in hits if cutoff is None or key <= cutoff)
+        exhausted = consumed == len(hits) and len(hits) < count
+        values += [-1 if exhausted else state[kind][0] + consumed, scales[kind]]
+
+    results = []
+    for (key, _, _), result in taken[skip:]:
+        results.append({**result, 'relevance_score': -key})
+    timings = {kind: duration for kind, (_, duration) in fetched.items()}
+    has_more = any(value >= 0 for value in values[::2])
+    return results, values if has_more else None, timings
@@ -0,0 +1,124 @@
+"""
+Cache des résultats de recherche (global_search, search_users).
+
+Une entrée est indexée par la recherche, ses paramètres normalisés (requête,
+curseur ou page, limite), la classe de confidentialité du lecteur et la
+version de chaque type de contenu interrogé. Toute écriture d'un utilisateur,
+post ou story incrémente la version de son type après commit : les entrées
+antérieures ne sont plus lues et expirent d'elles-mêmes (durées courtes,
+SEARCH_CACHE_TIMEOUT et SEARCH_USERS_CACHE_TIMEOUT).
+
+Succès et échecs sont comptés par recherche dans le cache partagé, pour
+régler ces durées (stats()).
+
+Le cache est une optimisation : si le cache partagé est indisponible, les
+écritures ne sont pas invalidées et les recherches sont calculées sans cache.
+"""
+import hashlib
+import logging
+import time
+
+from django.core.cache import cache
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Type de contenu -> champs dont la modification change les résultats visibles,
+# en plus des champs indexés (social.search.SOURCES)
+VISIBILITY_FIELDS = {
+    'users': {'is_active'},
+    'posts': {'is_private'},
+    'stories': {'expires_at'},
+}
+
+
+def _version_key(kind):
+    return f'search:version:{kind}'
+
+
+def _versions(kinds):
+    """Version courante de chaque type ; une version perdue repart d'une valeur jamais servie"""
+    keys = {kind: _version_key(kind) for kind in kinds}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for kind, key in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        versions[kind] = found[key]
+    return versions
+
+
+def bump(kind):
+    """Invalider les résultats en cache qui portent sur le type `kind`"""
+    # Appelé après commit : une panne du cache ne doit pas faire échouer l'écriture
+    try:
+        try:
+            cache.incr(_version_key(kind))
+        except ValueError:
+            cache.add(_version_key(kind), time.time_ns(), None)
+    except Exception:
+        logger.warning("Impossible d'invalider les recherches en cache sur %s", kind, exc_info=True)
+
+
+def _incr(key):
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, None)
+            cache.incr(key)
+    except Exception:
+        logger.warning("Impossible de compter %s", key, exc_info=True)
+
+
+def _privacy_class(viewer_id, posts_version):
+    """
+    'public', ou le lecteur lui-même s'il a des posts privés : ceux-ci ne
+    figurent que dans ses propres résultats. Mémorisé jusqu'à la prochaine
+    écriture de post.
+    """
+    key = f'search:private:{viewer_id}:{posts_version}'
+    has_private = cache.get(key)
+    if has_private is None:
+        has_private = Post.objects.filter(author_id=viewer_id, is_private=True).exists()
+        cache.set(key, has_private)
+    return f'user:{viewer_id}' if has_private else 'public'
+
+
+def get_or_compute(name, kinds, params, compute, timeout, viewer_id=None):
+    """
+    Résultat de la recherche `name` pour `params` (tuple normalisé), calculé
+    par compute() en cas d'échec. `kinds` liste les types de contenu dont
+    dépend le résultat ; `viewer_id` le rend propre au lecteur s'il a des
+    posts privés.
+    """
+    try:
+        versions = _versions(sorted({*kinds, 'posts'} if viewer_id is not None else kinds))
+    except Exception:
+        logger.warning("Cache de recherche indisponible, %s calculée sans cache", name, exc_info=True)
+        return compute()
+    privacy = _privacy_class(viewer_id, versions['posts']) if viewer_id is not None else 'public'
+    digest = hashlib.sha1(repr((params, privacy, sorted(versions.items()))).encode()).hexdigest()
+    key = f'search:result:{name}:{digest}'
+
+    value = cache.get(key)
+    if value is not None:
+        _incr(f'search:stats:{name}:hits')
+        return value
+    _incr(f'search:stats:{name}:misses')
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def stats(names=('global', 'users')):
+    """Succès, échecs et taux de succès par recherche"""
+    counts = cache.get_many([f'search:stats:{name}:{outcome}' for name in names for outcome in ('hits', 'misses')])
+    result = {}
+    for name in names:
+        hits = counts.get(f'search:stats:{name}:hits', 0)
+        misses = counts.get(f'search:stats:{name}:misses', 0)
+        result[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+    return result
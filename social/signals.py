@@ -0,0 +1,178 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from . import autocomplete, counters, feed, hashtags, search, search_cache, trending
+from .models import Comment, Post, Story
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch_fan_out(post_id):
+    """Diffuser un post via Celery, ou en ligne si le broker est indisponible"""
+    if settings.FEED_FANOUT_ASYNC:
+        from yoursocial.celery import fan_out_post
+        try:
+            fan_out_post.apply_async((post_id,), retry=False)
+            return
+        except Exception:
+            logger.warning("Broker indisponible, diffusion du post %s en ligne", post_id, exc_info=True)
+    try:
+        feed.fan_out(post_id)
+    except Exception:
+        # Les timelines manquantes seront reconstruites depuis la base
+        logger.exception("Échec de la diffusion du post %s", post_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Pousser les nouveaux posts dans les timelines une fois la transaction validée"""
+    if created:
+        post_id = instance.pk
+        transaction.on_commit(lambda: dispatch_fan_out(post_id))
+
+
+@receiver(post_delete, sender=Post)
+def remove_deleted_post(sender, instance, **kwargs):
+    """
+    Retirer un post supprimé du flux public et des timelines de son auteur (celles
+    des abonnés sont filtrées à la lecture)
+    """
+    post_id, author_id = instance.pk, instance.author_id
+
+    def remove():
+        try:
+            store = feed.get_store()
+            for key in (feed.PUBLIC_KEY, feed.timeline_key(author_id), feed.author_key(author_id)):
+                store.remove(key, post_id)
+        except Exception:
+            logger.warning("Impossible de retirer le post %s du flux public", post_id, exc_info=True)
+
+    transaction.on_commit(remove)
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def invalidate_follower_timeline(sender, instance, action, reverse, pk_set, **kwargs):
+    """Un abonnement modifié invalide la timeline de l'abonné"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Côté inverse (followers.add()), les abonnés sont dans pk_set
+    user_ids = list(pk_set or []) if reverse else [instance.pk]
+
+    def invalidate():
+        try:
+            feed.invalidate_timelines(user_ids)
+        except Exception:
+            logger.warning("Impossible d'invalider les timelines de %s", user_ids, exc_info=True)
+
+    transaction.on_commit(invalidate)
+
+
+# Les likes sont comptés par social.likes : sans receiver sur Like, leurs
+# suppressions restent un simple DELETE
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.incr_on_commit('post', instance.post_id, 'comments_count', 1)
+        trending.record_on_commit('posts', [instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.incr_on_commit('post', instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Story)
+def count_new_publication(sender, instance, created, **kwargs):
+    """Statistiques de l'auteur (users/stats.py), appliquées au vidage des compteurs"""
+    if created:
+        field = 'posts_count' if sender is Post else 'stories_count'
+        counters.incr_on_commit('userstats', instance.author_id, field, 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Story)
+def count_deleted_publication(sender, instance, **kwargs):
+    author_id = instance.author_id
+    if sender is Story:
+        counters.incr_on_commit('userstats', author_id, 'stories_count', -1)
+        return
+    counters.incr_on_commit('userstats', author_id, 'posts_count', -1)
+    # Likes et commentaires du post partent en cascade sans passer par le tampon
+    if instance.likes_count:
+        counters.incr_on_commit('userstats', author_id, 'likes_received', -instance.likes_count)
+    if instance.comments_count:
+        counters.incr_on_commit('userstats', author_id, 'comments_received', -instance.comments_count)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Story)
+def sync_hashtags(sender, instance, created, **kwargs):
+    """Répercuter la liste de hashtags dans l'index normalisé"""
+    if created and not instance.hashtags:
+        return
+    hashtags.sync(instance)
+    if created and sender is Post:
+        trending.record_on_commit('hashtags', hashtags.normalize_all(instance.hashtags))
+
+    def refresh_autocomplete():
+        # L'index d'autocomplétion de ce processus voit ses propres écritures sans délai
+        try:
+            autocomplete.refresh()
+        except Exception:
+            logger.warning("Impossible de rafraîchir l'index des hashtags", exc_info=True)
+
+    transaction.on_commit(refresh_autocomplete)
+
+
+@receiver(pre_delete, sender=Post)
+@receiver(pre_delete, sender=Story)
+def detach_hashtags(sender, instance, **kwargs):
+    # Avant la suppression en cascade des liens, pour savoir quoi décompter
+    hashtags.detach(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Story)
+def index_for_search(sender, instance, update_fields=None, **kwargs):
+    """Tenir l'index plein texte à jour, dans la transaction de l'écriture"""
+    kind = search.kind_of(sender)
+    _, fields, _ = search.SOURCES[kind]
+    # Sauvegardes partielles hors champs indexés (last_login…) : rien à réindexer
+    if update_fields is not None and not fields & set(update_fields):
+        return
+    search.index(kind, [instance])
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Story)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(search.kind_of(sender), [instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Story)
+def invalidate_search_cache(sender, instance, update_fields=None, **kwargs):
+    """Périmer les résultats de recherche en cache qui portent sur ce type"""
+    kind = search.kind_of(sender)
+    _, fields, _ = search.SOURCES[kind]
+    if update_fields is not None and not (fields | search_cache.VISIBILITY_FIELDS[kind]) & set(update_fields):
+        return
+    transaction.on_commit(lambda: search_cache.bump(kind))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Story)
+def invalidate_search_cache_on_delete(sender, instance, **kwargs):
+    kind = search.kind_of(sender)
+    transaction.on_commit(lambda: search_cache.bump(kind))
@@ -0,0 +1,74 @@
+"""
+Statistiques globales de la plateforme.
+
+La tâche Celery generate_statistics enregistre un StatisticsSnapshot toutes
+les STATISTICS_SNAPSHOT_INTERVAL secondes ; GET /statistics sert le dernier,
+gardé dans le cache partagé, avec son âge. Aucun comptage n'a lieu pendant la
+requête, sauf pour le tout premier instantané : une seule requête le calcule
+(verrou cache.add), les autres répondent 503 en attendant.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from messaging.models import Conversation, Message
+from notifications.models import Notification
+from users.models import User
+
+from . import metrics
+from .models import Comment, Hashtag, Like, Post, StatisticsSnapshot, Story
+
+LATEST_KEY = 'statistics:latest'
+FIRST_SNAPSHOT_LOCK = 'statistics:first-snapshot'
+
+
+def take_snapshot():
+    """Compter et enregistrer un nouvel instantané"""
+    now = timezone.now()
+    yesterday = now - timedelta(days=1)
+    recent = metrics.window(['posts', 'stories', 'likes', 'comments', 'messages'], now=now)
+    snapshot = StatisticsSnapshot.objects.create(
+        created_at=now,
+        total_users=User.objects.count(),
+        total_posts=Post.objects.count(),
+        total_stories=Story.objects.count(),
+        total_likes=Like.objects.count(),
+        total_comments=Comment.objects.count(),
+        total_messages=Message.objects.count(),
+        total_conversations=Conversation.objects.count(),
+        total_notifications=Notification.objects.count(),
+        new_users_24h=User.objects.filter(date_joined__gte=yesterday).count(),
+        # Tranches horaires (social/metrics.py)
+        **{f'new_{metric}_24h': value for metric, value in recent.items()},
+        active_users_24h=User.objects.filter(last_login__gte=yesterday).count(),
+        # Hashtags populaires (index normalisé, compteurs dénormalisés)
+        popular_hashtags=[
+            {'tag': tag, 'count': count}
+            for tag, count in Hashtag.objects.filter(
+                posts_count__gt=0
+            ).order_by('-posts_count', 'tag').values_list('tag', 'posts_count')[:10]
+        ],
+    )
+    cache.set(LATEST_KEY, snapshot, None)
+    return snapshot
+
+
+def latest():
+    """
+    Dernier instantané : cache partagé, puis base, puis calcul s'il n'y en a
+    aucun. Retourne None si un autre processus calcule déjà le premier.
+    """
+    snapshot = cache.get(LATEST_KEY)
+    if snapshot is None:
+        snapshot = StatisticsSnapshot.objects.order_by('-created_at').first()
+        if snapshot is None:
+            # Au déploiement, une seule requête lance le comptage complet
+            if not cache.add(FIRST_SNAPSHOT_LOCK, True, 300):
+                return None
+            try:
+                return take_snapshot()
+            finally:
+                cache.delete(FIRST_SNAPSHOT_LOCK)
+        cache.set(LATEST_KEY, snapshot, None)
+    return snapshot
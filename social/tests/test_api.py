@@ -2,7 +2,6 @@ import pytest
 from django.urls import reverse
 from rest_framework import status
 from social.models import Post, Comment, Like, Story, StoryView
-from users.tests.conftest import authenticated_client, test_user, test_user2
 
 @pytest.mark.django_db
 class TestPostAPI:
@@ -0,0 +1,117 @@
+import random
+import threading
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from social import autocomplete
+from social.autocomplete import HashtagIndex
+from social.models import Hashtag, Post
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(local_cache):
+    autocomplete.reset()
+    yield
+    autocomplete.reset()
+
+
+def brute_force(weights, prefix, limit):
+    matches = sorted((-weight, tag) for tag, weight in weights.items() if weight > 0 and tag.startswith(prefix))
+    return [(tag, -weight) for weight, tag in matches[:limit]]
+
+
+class TestHashtagIndex:
+    def test_matches_brute_force_through_updates(self):
+        rng = random.Random(42)
+        alphabet = 'abc'
+        weights = {
+            ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))): rng.randint(1, 50)
+            for _ in range(300)
+        }
+        index = HashtagIndex(weights, scan_limit=5, top_size=8)
+        assert index.top  # Des préfixes larges sont précalculés
+
+        prefixes = sorted({tag[:n] for tag in weights for n in range(1, 4)})
+        for step in range(400):
+            tag = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+            weight = rng.choice([0, rng.randint(1, 60)])
+            index.update(tag, weight)
+            weights[tag] = weight
+            if step % 20 == 0:
+                for prefix in prefixes:
+                    assert index.complete(prefix, 8) == brute_force(weights, prefix, 8), prefix
+
+    def test_complete_during_concurrent_updates(self):
+        tags = [f'tag{n:03d}' for n in range(200)]
+        index = HashtagIndex(dict.fromkeys(tags, 1), scan_limit=50, top_size=10)
+        errors = []
+        done = threading.Event()
+
+        def write():
+            rng = random.Random(7)
+            while not done.is_set():
+                index.update(rng.choice(tags), rng.choice([0, rng.randint(1, 20)]))
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(2000):
+                try:
+                    assert all(tag.startswith('tag1') for tag, _ in index.complete('tag1', 10))
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            done.set()
+            writer.join()
+        assert not errors
+
+    def test_snapshot_round_trip(self):
+        index = HashtagIndex({'django': 5, 'djangocon': 2, 'python': 9}, scan_limit=1, top_size=5)
+        restored = HashtagIndex.restore(index.dump())
+        assert restored.complete('dj') == [('django', 5), ('djangocon', 2)]
+
+
+@pytest.mark.django_db
+class TestAutocompleteEndpoint:
+    def test_suggestions_by_usage(self, client, test_user):
+        for tags in (['django'], ['django', 'djangocon'], ['dj'], ['python']):
+            Post.objects.create(author=test_user, content='p', hashtags=tags)
+
+        response = client.get('/api/social/hashtags/autocomplete', {'q': '#DJ'})
+        assert response.status_code == 200
+        assert response.json() == [
+            {'tag': 'django', 'count': 2}, {'tag': 'dj', 'count': 1}, {'tag': 'djangocon', 'count': 1},
+        ]
+        assert client.get('/api/social/hashtags/autocomplete', {'q': 'py', 'limit': 1}).json() == [
+            {'tag': 'python', 'count': 1}
+        ]
+
+    def test_own_writes_are_visible_immediately(self, client, test_user, django_capture_on_commit_callbacks):
+        Post.objects.create(author=test_user, content='p', hashtags=['rust'])
+        assert [s['tag'] for s in client.get('/api/social/hashtags/autocomplete', {'q': 'r'}).json()] == ['rust']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post = Post.objects.create(author=test_user, content='q', hashtags=['ruby', 'ruby2'])
+            Post.objects.create(author=test_user, content='r', hashtags=['ruby'])
+        assert [s['tag'] for s in client.get('/api/social/hashtags/autocomplete', {'q': 'ru'}).json()] == [
+            'ruby', 'ruby2', 'rust',
+        ]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post.hashtags = ['ruby']
+            post.save()
+        assert 'ruby2' not in [s['tag'] for s in client.get('/api/social/hashtags/autocomplete', {'q': 'ru'}).json()]
+
+    def test_new_worker_loads_snapshot(self, test_user):
+        Post.objects.create(author=test_user, content='p', hashtags=['django'])
+        assert autocomplete.snapshot() == 1
+
+        # Nouveau processus : l'instantané évite de relire toute la table
+        autocomplete.reset()
+        Hashtag.objects.create(tag='djangocon', posts_count=3)
+        with CaptureQueriesContext(connection) as queries:
+            assert autocomplete.complete('dj') == [('djangocon', 3), ('django', 1)]
+        assert len(queries) == 1
+        assert 'updated_at' in queries[0]['sql'].split('WHERE')[1]
@@ -0,0 +1,140 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from redis.exceptions import ResponseError
+
+from social import counters, likes
+from social.models import Comment, Like, Post
+
+
+pytestmark = pytest.mark.usefixtures('local_buffer')
+
+
+@pytest.fixture
+def post(test_user2):
+    return Post.objects.create(author=test_user2, content='viral')
+
+
+def refresh(obj):
+    obj.refresh_from_db()
+    return obj
+
+
+class FakeRedis:
+    """Hashes Redis en mémoire ; `before_rename` s'exécute juste avant le prochain renommage"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.before_rename = None
+
+    def hincrby(self, key, field, delta):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + delta
+
+    def renamenx(self, src, dst):
+        hook, self.before_rename = self.before_rename, None
+        if hook:
+            hook()
+        if src not in self.hashes:
+            raise ResponseError('no such key')
+        if dst in self.hashes:
+            return False
+        self.hashes[dst] = self.hashes.pop(src)
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def hgetall(self, key):
+        self.commands.append(lambda: dict(self.client.hashes.get(key, {})))
+
+    def delete(self, key):
+        self.commands.append(lambda: int(self.client.hashes.pop(key, None) is not None))
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+@pytest.mark.django_db
+class TestWriteBehindCounters:
+    def test_like_is_buffered_until_flush(self, client, post, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(f'/api/users/posts/{post.id}/like')
+        assert response.status_code == 200
+        assert not [q for q in queries if q['sql'].startswith('UPDATE')]
+        assert refresh(post).likes_count == 0
+
+        assert counters.flush() == 1
+        assert refresh(post).likes_count == 1
+
+    def test_unlike_and_comments_update_counters(self, client, post, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(f'/api/users/posts/{post.id}/like')
+            client.post(f'/api/users/posts/{post.id}/like')
+            client.post(f'/api/users/posts/{post.id}/comments', {'content': 'a'}, content_type='application/json')
+            response = client.post(f'/api/users/posts/{post.id}/comments', {'content': 'b'},
+                                   content_type='application/json')
+            client.post(f"/api/users/comments/{response.json()['id']}/like")
+        counters.flush()
+
+        post = refresh(post)
+        assert (post.likes_count, post.comments_count) == (0, 2)
+        assert Comment.objects.get(id=response.json()['id']).likes_count == 1
+
+    def test_flush_groups_updates_by_delta(self, test_user, test_user2, django_capture_on_commit_callbacks):
+        posts = [Post.objects.create(author=test_user2, content=f'p{i}') for i in range(5)]
+        with django_capture_on_commit_callbacks(execute=True):
+            likes.insert_likes(test_user.id, 'post', [post.id for post in posts])
+            likes.insert_likes(test_user2.id, 'post', [posts[0].id])
+
+        with CaptureQueriesContext(connection) as queries:
+            counters.flush()
+        # Un UPDATE pour les posts à +1, un pour celui à +2, un pour les scores de
+        # popularité, un pour les likes reçus par l'auteur
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        assert len([sql for sql in updates if 'social_post' in sql and 'hot_score' not in sql]) == 2
+        assert len([sql for sql in updates if 'hot_score' in sql]) == 1
+        assert len([sql for sql in updates if 'users_userstats' in sql]) == 1
+        assert [refresh(post).likes_count for post in posts] == [2, 1, 1, 1, 1]
+
+    def test_counters_never_go_negative(self, post):
+        counters.incr('post', post.id, 'likes_count', -3)
+        counters.flush()
+        assert refresh(post).likes_count == 0
+
+    def test_buffer_flushes_itself_without_redis(self, settings, test_user, post,
+                                                 django_capture_on_commit_callbacks):
+        settings.COUNTERS_FLUSH_INTERVAL = 0
+        with django_capture_on_commit_callbacks(execute=True):
+            likes.insert_likes(test_user.id, 'post', [post.id])
+        assert refresh(post).likes_count == 1
+
+    def test_reconcile_repairs_drift(self, test_user, post):
+        Like.objects.create(user=test_user, post=post)
+        Comment.objects.create(post=post, author=test_user, content='c')
+        Post.objects.filter(id=post.id).update(likes_count=42, comments_count=0)
+
+        assert counters.reconcile() == 2
+        post = refresh(post)
+        assert (post.likes_count, post.comments_count) == (1, 1)
+        assert counters.reconcile() == 0
+
+
+def test_concurrent_drains_keep_every_delta(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(counters, 'get_redis', lambda: fake)
+    counters.incr('post', 1, 'likes_count')
+    counters.incr('post', 1, 'likes_count')
+    drained = []
+    # Un second vidage emporte le tampon entre la lecture et le renommage du premier
+    fake.before_rename = lambda: drained.append(counters._drain())
+    drained.append(counters._drain())
+    assert drained == [{'post:1:likes_count': 2}, {}]
+    assert not fake.hashes
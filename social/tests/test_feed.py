@@ -0,0 +1,155 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from social import feed
+from social.models import Post
+from users.models import User
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+@pytest.fixture
+def third_user(db):
+    return User.objects.create_user(email='third@example.com', username='third', password='testpass123')
+
+
+def create_post(django_capture_on_commit_callbacks, **kwargs):
+    with django_capture_on_commit_callbacks(execute=True):
+        return Post.objects.create(**kwargs)
+
+
+@pytest.mark.django_db
+class TestFeed:
+    def test_feed_contains_own_followed_and_public_posts(
+        self, test_user, test_user2, third_user, django_capture_on_commit_callbacks
+    ):
+        test_user.follow(test_user2)
+        own = create_post(django_capture_on_commit_callbacks, author=test_user, content='own')
+        followed_private = create_post(
+            django_capture_on_commit_callbacks, author=test_user2, content='followed', is_private=True
+        )
+        public = create_post(django_capture_on_commit_callbacks, author=third_user, content='public')
+        create_post(django_capture_on_commit_callbacks, author=third_user, content='hidden', is_private=True)
+
+        posts = feed.get_feed(test_user.id)
+        assert {post.id for post in posts} == {own.id, followed_private.id, public.id}
+        assert posts == sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)
+
+    def test_fan_out_pushes_into_existing_timelines(self, test_user, test_user2, django_capture_on_commit_callbacks):
+        test_user.follow(test_user2)
+        feed.rebuild_timeline(test_user.id)
+
+        post = create_post(django_capture_on_commit_callbacks, author=test_user2, content='new', is_private=True)
+
+        entries = feed.get_store().range(feed.timeline_key(test_user.id), 10)
+        assert [post_id for _, post_id in entries] == [post.id]
+
+    def test_warm_feed_hydrates_in_one_query(self, test_user, test_user2, django_capture_on_commit_callbacks):
+        test_user.follow(test_user2)
+        for i in range(30):
+            create_post(django_capture_on_commit_callbacks, author=test_user2, content=f'post {i}')
+        feed.get_feed(test_user.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            posts = feed.get_feed(test_user.id, 0, 20)
+        assert len(posts) == 20
+        assert len(queries) == 1
+        assert all(post.author.username == test_user2.username for post in posts)
+
+    def test_cold_timeline_is_rebuilt_from_database(self, test_user, test_user2):
+        test_user.follow(test_user2)
+        post = Post.objects.create(author=test_user2, content='before cache', is_private=True)
+        cache.clear()
+
+        assert [p.id for p in feed.get_feed(test_user.id)] == [post.id]
+        assert feed.get_store().range(feed.timeline_key(test_user.id), 10) is not None
+
+    def test_unfollow_drops_private_posts(self, test_user, test_user2, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            test_user.follow(test_user2)
+        create_post(django_capture_on_commit_callbacks, author=test_user2, content='private', is_private=True)
+        assert len(feed.get_feed(test_user.id)) == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            test_user.unfollow(test_user2)
+        assert feed.get_store().range(feed.timeline_key(test_user.id), 10) is None
+        assert feed.get_feed(test_user.id) == []
+
+    def test_deleted_posts_disappear(self, test_user, django_capture_on_commit_callbacks):
+        post = create_post(django_capture_on_commit_callbacks, author=test_user, content='gone')
+        assert len(feed.get_feed(test_user.id)) == 1
+        with django_capture_on_commit_callbacks(execute=True):
+            post.delete()
+        assert feed.get_feed(test_user.id) == []
+
+    def test_pages_beyond_the_cap_fall_back_to_sql(self, settings, test_user, django_capture_on_commit_callbacks):
+        settings.FEED_MAX_LENGTH = 5
+        posts = [create_post(django_capture_on_commit_callbacks, author=test_user, content=f'p{i}') for i in range(8)]
+        expected = [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+
+        assert [post.id for post in feed.get_feed(test_user.id, 0, 5)] == expected[:5]
+        assert [post.id for post in feed.get_feed(test_user.id, 5, 5)] == expected[5:]
+
+
+@pytest.mark.django_db
+class TestHybridFeed:
+    @pytest.fixture(autouse=True)
+    def threshold(self, settings):
+        settings.FEED_FANOUT_THRESHOLD = 3
+
+    @pytest.fixture
+    def celebrity(self, db):
+        celebrity = User.objects.create_user(email='star@example.com', username='star', password='testpass123')
+        for follower in make_followers(3):
+            follower.follow(celebrity)
+        return celebrity
+
+    def test_celebrity_posts_are_not_fanned_out(self, test_user, celebrity, django_capture_on_commit_callbacks):
+        test_user.follow(celebrity)
+        feed.rebuild_timeline(test_user.id)
+        feed.rebuild_author_timeline(celebrity.id)
+
+        post = create_post(django_capture_on_commit_callbacks, author=celebrity, content='star', is_private=True)
+
+        timeline = feed.get_store().range(feed.timeline_key(test_user.id), 10)
+        assert post.id not in [post_id for _, post_id in timeline]
+        assert [post_id for _, post_id in feed.get_store().range(feed.author_key(celebrity.id), 10)] == [post.id]
+
+    def test_celebrity_posts_are_merged_at_read_time(
+        self, test_user, test_user2, celebrity, django_capture_on_commit_callbacks
+    ):
+        test_user.follow(celebrity)
+        test_user.follow(test_user2)
+        feed.get_feed(test_user.id)
+
+        posts = []
+        for i in range(6):
+            author = celebrity if i % 2 else test_user2
+            posts.append(create_post(django_capture_on_commit_callbacks, author=author, content=f'p{i}', is_private=True))
+
+        expected = [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+        assert [post.id for post in feed.get_feed(test_user.id, 0, 10)] == expected
+        assert [post.id for post in feed.get_feed(test_user.id, 2, 2)] == expected[2:4]
+
+    def test_celebrity_posts_hidden_from_non_followers(self, test_user, celebrity, django_capture_on_commit_callbacks):
+        create_post(django_capture_on_commit_callbacks, author=celebrity, content='star', is_private=True)
+        assert feed.get_feed(test_user.id) == []
+
+    def test_warm_hybrid_feed_is_one_query(self, test_user, celebrity, django_capture_on_commit_callbacks):
+        test_user.follow(celebrity)
+        create_post(django_capture_on_commit_callbacks, author=celebrity, content='star')
+        feed.get_feed(test_user.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert len(feed.get_feed(test_user.id)) == 1
+        assert len(queries) == 1
+
+
+def make_followers(count):
+    return [
+        User.objects.create_user(email=f'fan{i}@example.com', username=f'fan{i}', password='testpass123')
+        for i in range(count)
+    ]
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from social.models import Hashtag, Post, PostHashtag, Story
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+def counts():
+    return {tag.tag: (tag.posts_count, tag.stories_count) for tag in Hashtag.objects.all()}
+
+
+def create_story(author, hashtags):
+    return Story.objects.create(
+        author=author, content='stories/s.jpg', content_type='image', hashtags=hashtags,
+        expires_at=timezone.now() + timedelta(hours=1),
+    )
+
+
+@pytest.mark.django_db
+class TestHashtagIndex:
+    def test_post_hashtags_are_normalized_and_counted(self, test_user):
+        post = Post.objects.create(author=test_user, content='p', hashtags=['#Django', 'python', 'django', ''])
+
+        assert counts() == {'django': (1, 0), 'python': (1, 0)}
+        assert set(PostHashtag.objects.filter(post=post).values_list('hashtag__tag', flat=True)) == {'django', 'python'}
+        assert Hashtag.objects.get(tag='django').last_used == post.created_at
+
+    def test_edit_and_delete_keep_counts_in_sync(self, test_user):
+        post = Post.objects.create(author=test_user, content='p', hashtags=['django', 'python'])
+        Post.objects.create(author=test_user, content='q', hashtags=['django'])
+
+        post.hashtags = ['python', 'rust']
+        post.save()
+        assert counts() == {'django': (1, 0), 'python': (1, 0), 'rust': (1, 0)}
+
+        post.delete()
+        assert counts() == {'django': (1, 0), 'python': (0, 0), 'rust': (0, 0)}
+
+    def test_stories_are_counted_separately(self, test_user):
+        Post.objects.create(author=test_user, content='p', hashtags=['django'])
+        story = create_story(test_user, ['django', 'paris'])
+        assert counts() == {'django': (1, 1), 'paris': (0, 1)}
+
+        story.delete()
+        assert counts() == {'django': (1, 0), 'paris': (0, 0)}
+
+    def test_backfill_processes_existing_rows_in_chunks(self, test_user):
+        # bulk_create n'envoie pas post_save : rien n'est indexé
+        Post.objects.bulk_create(
+            [Post(author=test_user, content=f'p{i}', hashtags=['django'] if i % 2 else ['Python']) for i in range(7)]
+        )
+        create_story(test_user, ['django'])
+        Hashtag.objects.all().delete()
+
+        call_command('backfill_hashtags', chunk_size=2, stdout=StringIO())
+        assert counts() == {'django': (3, 1), 'python': (4, 0)}
+        assert Hashtag.objects.get(tag='django').last_used is not None
+
+        # Relancer la commande ne double pas les liens
+        call_command('backfill_hashtags', chunk_size=3, stdout=StringIO())
+        assert counts() == {'django': (3, 1), 'python': (4, 0)}
+
+
+@pytest.mark.django_db
+class TestHashtagEndpoints:
+    @pytest.fixture
+    def tagged(self, test_user, test_user2):
+        for i in range(3):
+            Post.objects.create(author=test_user2, content=f'd{i}', hashtags=['django'])
+        Post.objects.create(author=test_user2, content='p', hashtags=['python', 'Django'])
+        create_story(test_user2, ['python'])
+        Post.objects.create(author=test_user, content='old', hashtags=['gone']).delete()
+
+    def test_list_hashtags_orders_by_usage(self, client, tagged):
+        data = client.get('/api/social/hashtags').json()
+        assert [(item['tag'], item['posts_count'], item['stories_count']) for item in data] == [
+            ('django', 4, 0), ('python', 1, 1),
+        ]
+        assert all(item['last_used'] for item in data)
+        assert [item['tag'] for item in client.get('/api/social/hashtags', {'query': '#PYT'}).json()] == ['python']
+        assert client.get('/api/social/hashtags', {'query': 'thon'}).json() == []
+
+    def test_hashtag_posts_and_stories(self, client, tagged):
+        assert len(client.get('/api/social/hashtags/Django').json()) == 4
+        assert len(client.get('/api/social/hashtags/python/stories').json()) == 1
+
+    def test_statistics_popular_hashtags(self, client, tagged):
+        data = client.get('/api/statistics').json()
+        assert data['popular_hashtags'][0] == {'tag': 'django', 'count': 4}
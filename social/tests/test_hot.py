@@ -0,0 +1,132 @@
+import io
+import math
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from social import counters, hot
+from social.likes import toggle_like
+from social.models import Comment, Like, Post
+
+
+pytestmark = pytest.mark.usefixtures('local_buffer')
+
+
+def reference(created_at, events):
+    """Score attendu : log10 de la somme des poids, publication comprise"""
+    exponents = [hot.exponent(at, weight) for at, weight in [(created_at, 1)] + events]
+    peak = max(exponents)
+    return peak + math.log10(sum(10 ** (x - peak) for x in exponents))
+
+
+class TestShift:
+    def test_add_and_remove(self):
+        now = hot.EPOCH + 86400
+        floor = hot.exponent(now - 3600)
+        score = hot.shift(floor, 3, now, floor)
+        assert score == pytest.approx(reference(now - 3600, [(now, 3)]))
+        assert hot.shift(score, -1, now, floor) == pytest.approx(reference(now - 3600, [(now, 2)]))
+        # Un retrait ne descend jamais sous le score de publication
+        assert hot.shift(score, -5, now, floor) == floor
+
+    def test_no_overflow_on_old_posts(self):
+        floor = hot.exponent(hot.EPOCH)
+        assert hot.shift(floor, 1, hot.EPOCH + 100 * 365 * 86400, floor) > floor
+
+
+@pytest.mark.django_db
+class TestHotScore:
+    def test_new_post_ranks_by_recency(self, test_user2):
+        older = Post.objects.create(author=test_user2, content='a')
+        newer = Post.objects.create(author=test_user2, content='b')
+        assert newer.hot_score >= older.hot_score
+
+    def test_flush_applies_engagement(self, test_user, test_user2, django_capture_on_commit_callbacks):
+        quiet = Post.objects.create(author=test_user2, content='quiet')
+        busy = Post.objects.create(author=test_user2, content='busy')
+        initial = busy.hot_score
+
+        with django_capture_on_commit_callbacks(execute=True):
+            toggle_like(test_user.id, 'post', busy.id)
+            Comment.objects.create(post=busy, author=test_user2, content='c')
+        counters.flush()
+
+        busy.refresh_from_db()
+        assert busy.hot_score > initial
+        assert list(Post.objects.order_by(*hot.ORDERING)) == [busy, quiet]
+        # Un like et un commentaire (poids 2) reçus au moment du vidage
+        expected = reference(busy.created_at.timestamp(), [(timezone.now().timestamp(), 3)])
+        assert busy.hot_score == pytest.approx(expected, abs=1e-3)
+
+    def test_recent_engagement_beats_stale_engagement(self, test_user2):
+        now = timezone.now().timestamp()
+        stale = Post.objects.create(author=test_user2, content='stale')
+        fresh = Post.objects.create(author=test_user2, content='fresh')
+        with counters.transaction.atomic():
+            hot.apply_deltas({stale.id: 20}, now - 2 * 86400)
+            hot.apply_deltas({fresh.id: 2}, now)
+        assert list(Post.objects.order_by(*hot.ORDERING)) == [fresh, stale]
+
+    def test_recompute_matches_sources(self, test_user, test_user2):
+        now = timezone.now()
+        post = Post.objects.create(author=test_user2, content='p')
+        other = Post.objects.create(author=test_user2, content='o')
+        old = Post.objects.create(author=test_user2, content='old')
+        Post.objects.filter(pk=old.pk).update(created_at=now - timedelta(days=30), hot_score=-1)
+        Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(hours=5), hot_score=0)
+        like = Like.objects.create(user=test_user, post=post)
+        comment = Comment.objects.create(post=post, author=test_user, content='c')
+        Like.objects.filter(pk=like.pk).update(created_at=now - timedelta(hours=3))
+
+        assert hot.recompute() == 2
+        post.refresh_from_db()
+        other.refresh_from_db()
+        assert post.hot_score == pytest.approx(reference(
+            (now - timedelta(hours=5)).timestamp(),
+            [((now - timedelta(hours=3)).timestamp(), 1), (comment.created_at.timestamp(), 2)],
+        ))
+        assert other.hot_score == pytest.approx(hot.exponent(other.created_at.timestamp()))
+        # Hors fenêtre : inchangé
+        assert Post.objects.get(pk=old.pk).hot_score == -1
+        assert hot.recompute() == 0
+
+    def test_backfill_rescores_every_post(self, test_user, test_user2):
+        now = timezone.now()
+        posts = [Post.objects.create(author=test_user2, content=f'p{i}') for i in range(3)]
+        # Posts antérieurs à la colonne : même score par défaut, quel que soit leur âge
+        for days, post in enumerate(posts):
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(days=30 + days), hot_score=0)
+        comment = Comment.objects.create(post=posts[1], author=test_user, content='c')
+
+        output = io.StringIO()
+        call_command('backfill_hot_scores', chunk_size=2, stdout=output)
+        assert output.getvalue().startswith('3 scores')
+        scores = {post.pk: post.hot_score for post in Post.objects.all()}
+        assert scores[posts[1].pk] == pytest.approx(reference(
+            (now - timedelta(days=31)).timestamp(), [(comment.created_at.timestamp(), 2)],
+        ))
+        assert scores[posts[0].pk] == pytest.approx(hot.exponent((now - timedelta(days=30)).timestamp()))
+        assert hot.backfill() == 0
+
+
+@pytest.mark.django_db
+class TestHotOrdering:
+    def test_feed_and_hashtag_pages(self, client, test_user2):
+        posts = [Post.objects.create(author=test_user2, content=f'p{i}', hashtags=['django']) for i in range(5)]
+        for boost, post in zip([3, 0, 5, 1, 2], posts):
+            Post.objects.filter(pk=post.pk).update(hot_score=post.hot_score + boost)
+        hottest = [posts[i].id for i in (2, 0, 4, 3, 1)]
+        newest = [post.id for post in reversed(posts)]
+
+        for url in ('/api/users/posts', '/api/social/hashtags/django'):
+            first = client.get(url, {'order': 'hot', 'limit': 3})
+            assert [item['id'] for item in first.json()] == hottest[:3]
+            second = client.get(url, {'order': 'hot', 'limit': 3, 'cursor': first['X-Next-Cursor']})
+            assert [item['id'] for item in second.json()] == hottest[3:]
+            # Le tri par défaut reste chronologique
+            assert [item['id'] for item in client.get(url).json()] == newest
+
+    def test_unknown_order_is_rejected(self, client):
+        assert client.get('/api/users/posts', {'order': 'top'}).status_code == 422
@@ -0,0 +1,137 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from social import counters, likes
+from social.models import Comment, Like, Post
+
+
+pytestmark = pytest.mark.usefixtures('local_buffer')
+
+
+@pytest.fixture(params=[True, False], ids=['returning', 'sans-returning'])
+def returning(request, monkeypatch):
+    # Les deux chemins d'écriture : RETURNING et lecture préalable
+    monkeypatch.setattr(likes, '_supports_returning', lambda: request.param)
+    return request.param
+
+
+@pytest.fixture
+def posts(test_user2):
+    return [Post.objects.create(author=test_user2, content=f'p{i}') for i in range(5)]
+
+
+def batch(client, operations):
+    return client.post('/api/users/likes/batch', {'operations': operations}, content_type='application/json')
+
+
+@pytest.mark.django_db
+class TestLikeToggle:
+    def test_toggle_is_one_statement_per_step(self, test_user, posts, returning):
+        post = posts[0]
+        with CaptureQueriesContext(connection) as queries:
+            assert likes.toggle_like(test_user.id, 'post', post.id) is True
+        if returning:
+            assert len(queries) == 1
+        with CaptureQueriesContext(connection) as queries:
+            assert likes.toggle_like(test_user.id, 'post', post.id) is False
+        if returning:
+            assert len(queries) == 2
+        assert not Like.objects.exists()
+
+    def test_concurrent_double_tap_does_not_raise(self, test_user, posts, returning):
+        Like.objects.create(user=test_user, post=posts[0])
+        # Le second appui voit déjà la ligne : aucun IntegrityError, rien d'inséré
+        assert likes.insert_likes(test_user.id, 'post', [posts[0].id]) == set()
+        assert Like.objects.count() == 1
+
+    def test_endpoints_toggle_and_count(self, client, test_user, posts, django_capture_on_commit_callbacks):
+        post = posts[0]
+        comment = Comment.objects.create(post=post, author=test_user, content='c')
+        with django_capture_on_commit_callbacks(execute=True):
+            assert client.post(f'/api/users/posts/{post.id}/like').json()['action'] == 'liked'
+            assert client.post(f'/api/users/comments/{comment.id}/like').json()['action'] == 'liked'
+            assert client.post(f'/api/users/posts/{post.id}/like').json()['action'] == 'unliked'
+        counters.flush()
+
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        assert (post.likes_count, comment.likes_count) == (0, 1)
+        assert client.post('/api/users/posts/999999/like').status_code == 404
+
+
+@pytest.mark.django_db
+class TestLikeBatch:
+    def test_batch_applies_last_operation_per_target(self, client, test_user, posts, returning,
+                                                     django_capture_on_commit_callbacks):
+        Like.objects.create(user=test_user, post=posts[1])
+        Post.objects.filter(id=posts[1].id).update(likes_count=1)
+        comment = Comment.objects.create(post=posts[0], author=test_user, content='c')
+
+        operations = [
+            {'target': 'post', 'id': posts[0].id, 'action': 'like'},
+            {'target': 'post', 'id': posts[1].id, 'action': 'unlike'},
+            {'target': 'post', 'id': posts[2].id, 'action': 'like'},
+            {'target': 'post', 'id': posts[2].id, 'action': 'unlike'},
+            {'target': 'post', 'id': posts[3].id, 'action': 'unlike'},
+            {'target': 'post', 'id': 999999, 'action': 'like'},
+            {'target': 'comment', 'id': comment.id, 'action': 'like'},
+        ]
+        with django_capture_on_commit_callbacks(execute=True):
+            response = batch(client, operations)
+        assert response.status_code == 200
+        assert response.json() == {'liked': 2, 'unliked': 1, 'skipped': 4}
+
+        assert set(Like.objects.filter(user=test_user, post__isnull=False).values_list('post_id', flat=True)) == {
+            posts[0].id
+        }
+        assert Like.objects.filter(user=test_user, comment=comment).exists()
+
+        counters.flush()
+        assert [Post.objects.get(id=post.id).likes_count for post in posts[:3]] == [1, 0, 0]
+
+    def test_batch_query_count_does_not_grow(self, client, test_user, test_user2):
+        many = Post.objects.bulk_create([Post(author=test_user2, content=f'p{i}') for i in range(100)])
+
+        def statements(ids):
+            operations = [{'target': 'post', 'id': post_id, 'action': 'like'} for post_id in ids]
+            with CaptureQueriesContext(connection) as queries:
+                assert batch(client, operations).status_code == 200
+            return len(queries)
+
+        batch(client, [])  # Utilisateur authentifié mis en cache
+        assert statements([post.id for post in many[:2]]) == statements([post.id for post in many[2:]])
+
+    def test_batch_size_is_capped(self, settings, client, posts):
+        settings.LIKES_BATCH_MAX_SIZE = 3
+        operations = [{'target': 'post', 'id': post.id, 'action': 'like'} for post in posts]
+        assert batch(client, operations).status_code == 400
+        assert not Like.objects.exists()
+
+
+@pytest.mark.django_db
+class TestViewerFlags:
+    def test_feed_page_flags_liked_and_commented_posts(self, client, test_user, posts):
+        Like.objects.create(user=test_user, post=posts[0])
+        Comment.objects.create(post=posts[1], author=test_user, content='c')
+        Comment.objects.create(post=posts[1], author=test_user, content='c2')
+
+        flags = {item['id']: (item['has_liked'], item['has_commented']) for item in client.get('/api/users/posts').json()}
+        assert flags[posts[0].id] == (True, False)
+        assert flags[posts[1].id] == (False, True)
+        assert flags[posts[2].id] == (False, False)
+
+        assert client.get(f'/api/users/posts/{posts[0].id}').json()['has_liked'] is True
+
+    def test_feed_page_costs_constant_queries(self, client, test_user, test_user2):
+        many = Post.objects.bulk_create([Post(author=test_user2, content=f'p{i}') for i in range(60)])
+        Like.objects.bulk_create([Like(user=test_user, post=post) for post in many[::2]])
+
+        def queries_for(limit):
+            client.get('/api/users/posts', {'limit': limit})  # Timeline et authentification en cache
+            with CaptureQueriesContext(connection) as queries:
+                page = client.get('/api/users/posts', {'limit': limit}).json()
+            assert len(page) == limit
+            return len(queries)
+
+        assert queries_for(50) == queries_for(5)
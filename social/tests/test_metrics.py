@@ -0,0 +1,103 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.test import Client
+from django.utils import timezone
+
+from messaging.models import Conversation, Message
+from social import metrics
+from social.models import Comment, Like, MetricBucket, MetricRollup, Post, Story, StoryView
+from users.api import generate_access_token
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+def activity(author, reader, at=None):
+    """Un post, un like, un commentaire, une story vue et un message ; datés de `at`"""
+    post = Post.objects.create(author=author, content='p')
+    like = Like.objects.create(user=reader, post=post)
+    comment = Comment.objects.create(post=post, author=reader, content='c')
+    story = Story.objects.create(author=author, content='s.jpg', content_type='image')
+    view = StoryView.objects.create(story=story, viewer=reader)
+    conversation = Conversation.objects.create()
+    conversation.participants.add(author, reader)
+    message = Message.objects.create(conversation=conversation, sender=reader, content='m')
+    if at is not None:
+        for model, obj in [(Post, post), (Like, like), (Comment, comment), (Story, story), (Message, message)]:
+            model.objects.filter(pk=obj.pk).update(created_at=at)
+        StoryView.objects.filter(pk=view.pk).update(viewed_at=at)
+
+
+def buckets(hour):
+    return {(b.metric, b.scope): b.value for b in MetricBucket.objects.filter(hour=hour)}
+
+
+@pytest.mark.django_db
+class TestRollup:
+    def test_hour_buckets(self, test_user, test_user2):
+        hour = metrics.floor_hour(timezone.now()) - timedelta(hours=2)
+        activity(test_user2, test_user, at=hour + timedelta(minutes=30))
+        activity(test_user2, test_user)
+
+        assert metrics.rollup(hour - timedelta(hours=1)) == 3
+        author, reader = metrics.user_scope(test_user2.id), metrics.user_scope(test_user.id)
+        assert buckets(hour) == {
+            ('posts', 'global'): 1, ('posts', author): 1,
+            ('stories', 'global'): 1, ('stories', author): 1,
+            ('likes', 'global'): 1, ('likes', author): 1,
+            ('comments', 'global'): 1, ('comments', author): 1,
+            ('story_views', 'global'): 1, ('story_views', author): 1,
+            ('messages', 'global'): 1, ('messages', author): 1, ('messages', reader): 1,
+        }
+        # L'heure en cours n'est pas close
+        assert not MetricBucket.objects.filter(hour__gt=hour + timedelta(hours=1)).exists()
+
+    def test_idempotent_and_resumable(self, test_user, test_user2):
+        hour = metrics.floor_hour(timezone.now()) - timedelta(hours=5)
+        activity(test_user2, test_user, at=hour)
+        call_command('backfill_metrics', days=1, stdout=io.StringIO())
+        expected = buckets(hour)
+
+        output = io.StringIO()
+        call_command('backfill_metrics', days=1, stdout=output)
+        assert output.getvalue().startswith('0 heures')
+        metrics.rollup_hour(hour)
+        call_command('backfill_metrics', days=1, force=True, stdout=io.StringIO())
+        assert buckets(hour) == expected
+        assert MetricRollup.objects.filter(hour=hour).count() == 1
+
+
+@pytest.mark.django_db
+class TestWindow:
+    def test_buckets_plus_live_tail(self, test_user, test_user2):
+        now = timezone.now()
+        activity(test_user2, test_user, at=now - timedelta(hours=3))
+        activity(test_user2, test_user, at=now - timedelta(hours=30))
+        metrics.rollup(now - timedelta(days=2))
+        activity(test_user2, test_user)
+        # Les heures agrégées ne sont plus relues à la source
+        Post.objects.filter(created_at__lt=now - timedelta(hours=1)).delete()
+
+        assert metrics.window(['posts', 'messages', 'logins']) == {'posts': 2, 'messages': 2, 'logins': 0}
+        scope = metrics.user_scope(test_user.id)
+        assert metrics.window(['messages', 'posts'], scope) == {'messages': 2, 'posts': 0}
+        assert metrics.window(['likes'], metrics.user_scope(test_user2.id), hours=168) == {'likes': 3}
+
+    def test_unrolled_hours_are_counted_live(self, test_user, test_user2):
+        activity(test_user2, test_user, at=timezone.now() - timedelta(hours=3))
+        activity(test_user2, test_user)
+        assert metrics.window(['stories', 'story_views'], metrics.user_scope(test_user2.id)) == {
+            'stories': 2, 'story_views': 2,
+        }
+
+    def test_endpoints(self, test_user, test_user2):
+        activity(test_user2, test_user, at=timezone.now() - timedelta(hours=3))
+        metrics.rollup(timezone.now() - timedelta(hours=6))
+        activity(test_user2, test_user)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {generate_access_token(test_user2)}')
+        assert client.get('/api/social/stories/statistics').json()['views_24h'] == 2
+        assert client.get('/api/messaging/statistics').json()['messages_24h'] == 2
+        assert client.get('/api/users/me/statistics').json()['posts_24h'] == 2
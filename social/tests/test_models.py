@@ -2,7 +2,6 @@ import pytest
 from django.utils import timezone
 from datetime import timedelta
 from social.models import Post, Comment, Like, Story, StoryView
-from users.tests.conftest import test_user, test_user2
 
 @pytest.mark.django_db
 class TestPostModel:
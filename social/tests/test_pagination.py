@@ -0,0 +1,93 @@
+import pytest
+from ninja.errors import HttpError
+
+from social.models import Comment, Post
+from users.models import User
+from yoursocial.pagination import decode_cursor, encode_cursor, paginate_keyset
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+def walk(client, url, limit):
+    """Parcourir toutes les pages d'un endpoint en suivant X-Next-Cursor"""
+    ids = []
+    params = {'limit': limit}
+    while True:
+        response = client.get(url, params)
+        assert response.status_code == 200
+        ids.extend(item['id'] for item in response.json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+        params = {'limit': limit, 'cursor': cursor}
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_cursor_round_trip(self, test_user):
+        post = Post.objects.create(author=test_user, content='post')
+        assert decode_cursor(encode_cursor([post.created_at, post.id]), 2) == [post.created_at, post.id]
+
+    @pytest.mark.parametrize('cursor', ['???', encode_cursor([1]), encode_cursor(['x', 1])])
+    def test_invalid_cursor_is_rejected(self, test_user, cursor):
+        with pytest.raises(HttpError):
+            paginate_keyset(Post.objects.all(), cursor=cursor)
+
+    def test_pages_are_stable_while_rows_arrive(self, test_user):
+        posts = [Post.objects.create(author=test_user, content=f'p{i}') for i in range(7)]
+        expected = [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+
+        response = {}
+        first = paginate_keyset(Post.objects.all(), response, limit=3)
+        # Un nouveau post ne décale pas les pages suivantes
+        Post.objects.create(author=test_user, content='new')
+        second = paginate_keyset(Post.objects.all(), response, cursor=response['X-Next-Cursor'], limit=3)
+
+        assert [post.id for post in first + second] == expected[:6]
+
+    def test_last_page_has_no_cursor(self, test_user):
+        Post.objects.create(author=test_user, content='only')
+        response = {}
+        assert len(paginate_keyset(Post.objects.all(), response, limit=1)) == 1
+        assert 'X-Next-Cursor' not in response
+
+
+@pytest.mark.django_db
+class TestCursorEndpoints:
+    def test_user_posts(self, client, test_user):
+        posts = [Post.objects.create(author=test_user, content=f'p{i}') for i in range(5)]
+        assert sorted(walk(client, f'/api/users/users/{test_user.id}/posts', 2)) == sorted(p.id for p in posts)
+
+    def test_comments(self, client, test_user):
+        post = Post.objects.create(author=test_user, content='post')
+        comments = [Comment.objects.create(post=post, author=test_user, content=f'c{i}') for i in range(5)]
+        ids = walk(client, f'/api/users/posts/{post.id}/comments', 2)
+        assert sorted(ids) == sorted(c.id for c in comments)
+
+    def test_followers(self, client, test_user):
+        followers = [
+            User.objects.create_user(email=f'f{i}@example.com', username=f'f{i}', password='testpass123')
+            for i in range(5)
+        ]
+        for follower in followers:
+            follower.follow(test_user)
+        ids = walk(client, f'/api/users/users/{test_user.id}/followers', 2)
+        assert ids == [f.id for f in reversed(followers)]
+
+    def test_feed(self, client, test_user, test_user2, django_capture_on_commit_callbacks):
+        test_user.follow(test_user2)
+        posts = []
+        for i in range(7):
+            with django_capture_on_commit_callbacks(execute=True):
+                posts.append(Post.objects.create(author=test_user2, content=f'p{i}', is_private=True))
+        expected = [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+
+        assert walk(client, '/api/users/posts', 3) == expected
+
+    def test_feed_beyond_the_cap_uses_sql(self, settings, client, test_user):
+        settings.FEED_MAX_LENGTH = 4
+        posts = [Post.objects.create(author=test_user, content=f'p{i}') for i in range(7)]
+        expected = [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+
+        assert walk(client, '/api/users/posts', 3) == expected
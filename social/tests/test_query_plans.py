@@ -0,0 +1,98 @@
+import re
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from messaging.models import Conversation, Message
+from notifications.models import Notification
+from social.models import Comment, Post, Story, StoryView
+
+
+def hot_queries(user):
+    """Requêtes fréquentes dont le plan doit rester adossé à un index"""
+    now = timezone.now()
+    post = Post.objects.filter(author=user).first()
+    story = Story.objects.filter(author=user).first()
+    conversation = Conversation.objects.filter(participants=user).first()
+    return {
+        'posts_utilisateur': Post.objects.filter(author=user).order_by('-created_at', '-id')[:20],
+        'posts_publics': Post.objects.filter(is_private=False).order_by('-created_at')[:20],
+        'posts_populaires': Post.objects.order_by('-hot_score', '-id')[:20],
+        'stories_actives': Story.objects.filter(author=user, expires_at__gt=now).order_by('expires_at'),
+        'vues_story': StoryView.objects.filter(story=story).order_by('-viewed_at')[:20],
+        'commentaires_post': Comment.objects.filter(post=post).order_by('-created_at', '-id')[:20],
+        'messages_conversation': Message.objects.filter(
+            conversation=conversation
+        ).order_by('-created_at', '-id')[:50],
+        'messages_non_lus': Message.objects.filter(
+            conversation=conversation, is_read=False
+        ).exclude(sender=user).order_by(),
+        'notifications': Notification.objects.filter(recipient=user).order_by('-created_at', '-id')[:20],
+        'notifications_non_lues': Notification.objects.filter(
+            recipient=user, is_read=False
+        ).order_by('-created_at')[:20],
+    }
+
+
+def plan_problems(plan):
+    """Lignes du plan qui trahissent un parcours complet ou un tri temporaire"""
+    if connection.vendor == 'postgresql':
+        pattern = r'Seq Scan|\bSort\b'
+    else:
+        # SQLite : « SCAN table » sans index, ou « USE TEMP B-TREE FOR ORDER BY »
+        pattern = r'SCAN (?!.*\bINDEX\b)|TEMP B-TREE'
+    return [line for line in plan.splitlines() if re.search(pattern, line)]
+
+
+@pytest.fixture
+def dataset(test_user, test_user2):
+    now = timezone.now()
+    for user, other in ((test_user, test_user2), (test_user2, test_user)):
+        posts = Post.objects.bulk_create(
+            [Post(author=user, content=f'post {i}', is_private=bool(i % 3)) for i in range(50)]
+        )
+        Comment.objects.bulk_create([Comment(post=posts[0], author=other, content=f'c {i}') for i in range(20)])
+        stories = Story.objects.bulk_create(
+            [
+                Story(author=user, content=f'stories/{i}.jpg', content_type='image',
+                      expires_at=now + timedelta(hours=i - 10))
+                for i in range(20)
+            ]
+        )
+        StoryView.objects.create(story=stories[0], viewer=other)
+        Notification.objects.bulk_create([
+            Notification(recipient=user, sender=other, notification_type='like', content='like', is_read=bool(i % 2))
+            for i in range(30)
+        ])
+
+    for _ in range(10):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(test_user, test_user2)
+        Message.objects.bulk_create([
+            Message(conversation=conversation, sender=test_user2 if i % 2 else test_user, content=f'm {i}')
+            for i in range(40)
+        ])
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        if connection.vendor == 'postgresql':
+            # Les petites tables de test favorisent le parcours séquentiel
+            cursor.execute('SET enable_seqscan = off')
+    yield test_user
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    @pytest.mark.parametrize('name', [
+        'posts_utilisateur', 'posts_publics', 'posts_populaires', 'stories_actives', 'vues_story', 'commentaires_post',
+        'messages_conversation', 'messages_non_lus', 'notifications', 'notifications_non_lues',
+    ])
+    def test_hot_query_uses_index(self, dataset, name):
+        queryset = hot_queries(dataset)[name]
+        plan = queryset.explain()
+        assert not plan_problems(plan), f"{name} :\n{plan}"
@@ -0,0 +1,176 @@
+import io
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from social import search
+from social.models import Post, Story
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+def ids(kind, query):
+    return [pk for pk, _ in search.search(kind, query)]
+
+
+def test_terms():
+    assert search.terms('  Django, ORM!  #python ') == ['django', 'orm', 'python']
+    assert search.terms('"*) OR NEAR(') == ['or', 'near']
+
+
+@pytest.mark.django_db
+class TestSearchIndex:
+    def test_index_follows_writes(self, test_user, test_user2):
+        post = Post.objects.create(author=test_user2, content='Bonjour depuis Lisbonne', hashtags=['voyage'])
+        assert ids('posts', 'lisbonne') == [post.id]
+        assert ids('posts', 'voyage') == [post.id]
+
+        post.content = 'Bonjour depuis Porto'
+        post.save()
+        assert ids('posts', 'lisbonne') == []
+        assert ids('posts', 'porto') == [post.id]
+
+        post.delete()
+        assert ids('posts', 'porto') == []
+        assert ids('users', 'testuser2') == [test_user2.id]
+
+    def test_partial_saves_are_not_reindexed(self, test_user):
+        test_user.last_login = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            test_user.save(update_fields=['last_login'])
+        assert not [q for q in queries if 'search_users' in q['sql']]
+
+    def test_all_terms_last_one_as_prefix(self, test_user):
+        match = Post.objects.create(author=test_user, content='Une randonnée dans les Pyrénées')
+        Post.objects.create(author=test_user, content='Une randonnée en forêt')
+        assert ids('posts', 'randonnée pyr') == [match.id]
+        assert ids('posts', '"pyr*" OR foret') == []
+
+    def test_relevance(self, test_user):
+        passing = Post.objects.create(author=test_user, content='Un mot sur le jardin, puis beaucoup d\'autres '
+                                                                  'sujets sans rapport avec la question posée')
+        focused = Post.objects.create(author=test_user, content='Jardin, jardin et encore jardin')
+        tagged = Post.objects.create(author=test_user, content='Photos du week-end', hashtags=['jardin'])
+        results = search.search('posts', 'jardin')
+        assert [pk for pk, _ in results][-1] == passing.id
+        assert {pk for pk, _ in results[:2]} == {focused.id, tagged.id}
+        assert results[0][1] > results[-1][1] > 0
+
+    def test_rebuild(self, test_user):
+        Post.objects.bulk_create([Post(author=test_user, content=f'importé {i}') for i in range(3)])
+        assert ids('posts', 'importé') == []
+        call_command('rebuild_search_index', kind=['posts'], chunk_size=2, stdout=io.StringIO())
+        assert len(ids('posts', 'importé')) == 3
+
+
+@pytest.mark.django_db
+class TestGlobalSearch:
+    def test_mixed_results(self, client, test_user, test_user2):
+        test_user2.bio = 'Photographe de montagne'
+        test_user2.save()
+        post = Post.objects.create(author=test_user2, content='Lever de soleil en montagne')
+        Post.objects.create(author=test_user2, content='Montagne privée', is_private=True)
+        own = Post.objects.create(author=test_user, content='Ma montagne', is_private=True)
+        story = Story.objects.create(author=test_user2, content='s.jpg', content_type='image', caption='montagne')
+        Story.objects.create(author=test_user2, content='t.jpg', content_type='image', caption='montagne',
+                             expires_at=timezone.now() - timedelta(hours=1))
+
+        response = client.get('/api/search', {'query': 'montagne'})
+        assert response.status_code == 200
+        results = {(item['type'], item['id']) for item in response.json()}
+        assert results == {('user', test_user2.id), ('post', post.id), ('post', own.id), ('story', story.id)}
+        scores = [item['relevance_score'] for item in response.json()]
+        assert scores == sorted(scores, reverse=True)
+
+        page = client.get('/api/search', {'query': 'montagne', 'limit': 3, 'page': 2}).json()
+        assert len(page) == 1
+
+    def test_empty_query(self, client):
+        assert client.get('/api/search', {'query': '?!'}).json() == []
+
+    def test_cursor_pages_cover_every_source(self, client, test_user, test_user2):
+        expected = set()
+        for i in range(6):
+            user = test_user.__class__.objects.create_user(
+                email=f'u{i}@example.com', username=f'user{i}', password='x', bio='soleil ' * (i + 1)
+            )
+            expected.add(('user', user.id))
+        for i in range(7):
+            expected.add(('post', Post.objects.create(author=test_user2, content=f'soleil {i}').id))
+        for i in range(3):
+            Post.objects.create(author=test_user2, content='soleil soleil soleil', is_private=True)
+        for i in range(4):
+            story = Story.objects.create(author=test_user2, content=f'{i}.jpg', content_type='image', caption='soleil')
+            expected.add(('story', story.id))
+
+        seen, scores, pages, cursor = [], [], [], None
+        while True:
+            params = {'query': 'soleil', 'limit': 4, **({'cursor': cursor} if cursor else {})}
+            response = client.get('/api/search', params)
+            assert response.status_code == 200
+            pages.append(response.json())
+            seen += [(item['type'], item['id']) for item in response.json()]
+            scores += [item['relevance_score'] for item in response.json()]
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                break
+
+        assert len(seen) == len(set(seen)) and set(seen) == expected
+        assert scores == sorted(scores, reverse=True) and scores[0] == 1.0
+        assert len(pages) == 5
+        # La pagination par numéro de page donne les mêmes pages
+        assert client.get('/api/search', {'query': 'soleil', 'limit': 4, 'page': 2}).json() == pages[1]
+
+    def test_debug_timings(self, client, test_user):
+        response = client.get('/api/search', {'query': 'test', 'debug': True})
+        assert [part.split(';')[0] for part in response['Server-Timing'].split(', ')] == ['users', 'posts', 'stories']
+        assert 'Server-Timing' not in client.get('/api/search', {'query': 'test'})
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sources_queried_in_parallel(settings, test_user, test_user2):
+    settings.SEARCH_PARALLEL = True
+    post = Post.objects.create(author=test_user2, content='testuser en vacances')
+    threads = set()
+
+    def hydrate(ids):
+        threads.add(threading.get_ident())
+        return {pk: {'id': pk} for pk in ids}
+
+    results, cursor, timings = search.federated_search('testuser', {'users': hydrate, 'posts': hydrate})
+    assert sorted(result['id'] for result in results) == sorted([test_user.id, test_user2.id, post.id])
+    assert cursor is None and set(timings) == {'users', 'posts'}
+    assert threading.get_ident() not in threads
+
+
+@pytest.mark.django_db(transaction=True)
+def test_pool_threads_keep_their_connection(settings, monkeypatch, test_user, test_user2):
+    settings.SEARCH_PARALLEL = True
+    # Connexions persistantes ; un pool neuf pour que ses threads se connectent avec ce réglage
+    monkeypatch.setitem(connections.settings['default'], 'CONN_MAX_AGE', None)
+    monkeypatch.setattr(search, '_executor', None)
+    wrapper = type(connections['default'])
+    real_close = wrapper.close
+    closed = []
+    monkeypatch.setattr(wrapper, 'close', lambda self: closed.append(threading.get_ident()) or real_close(self))
+    connected = {}
+
+    def hydrate(ids):
+        connected.setdefault(threading.get_ident(), set()).add(id(connection.connection))
+        return {pk: {'id': pk} for pk in ids}
+
+    try:
+        for _ in range(5):
+            results, _, _ = search.federated_search('testuser', {'users': hydrate, 'posts': hydrate})
+            assert {test_user.id, test_user2.id} <= {result['id'] for result in results}
+    finally:
+        search._get_executor().shutdown()
+    assert threading.get_ident() not in connected
+    assert all(len(raw) == 1 for raw in connected.values())
+    assert not set(closed) & set(connected)
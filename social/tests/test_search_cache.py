@@ -0,0 +1,119 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from social.models import Post
+from users.api import generate_access_token
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+def client_for(user):
+    return Client(HTTP_AUTHORIZATION=f'Bearer {generate_access_token(user)}')
+
+
+def search_ids(client, query, url='/api/search'):
+    response = client.get(url, {'query': query})
+    assert response.status_code == 200
+    return [item['id'] for item in response.json()]
+
+
+@pytest.mark.django_db
+class TestGlobalSearchCache:
+    def test_repeated_search_is_served_from_cache(self, client, test_user2):
+        post = Post.objects.create(author=test_user2, content='Concert ce soir')
+        assert search_ids(client, 'concert') == [post.id]
+        with CaptureQueriesContext(connection) as queries:
+            # Même requête une fois normalisée
+            assert search_ids(client, '  CONCERT! ') == [post.id]
+        assert not [q for q in queries if 'social_post' in q['sql'] or 'search_' in q['sql']]
+
+    def test_writes_invalidate(self, client, test_user2, django_capture_on_commit_callbacks):
+        first = Post.objects.create(author=test_user2, content='Concert ce soir')
+        assert search_ids(client, 'concert') == [first.id]
+        with django_capture_on_commit_callbacks(execute=True):
+            second = Post.objects.create(author=test_user2, content='Concert demain')
+        assert search_ids(client, 'concert') == [second.id, first.id]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            first.is_private = True
+            first.save(update_fields=['is_private'])
+        assert search_ids(client, 'concert') == [second.id]
+
+    def test_private_posts_stay_with_their_author(self, client, test_user, test_user2,
+                                                  django_capture_on_commit_callbacks):
+        public = Post.objects.create(author=test_user2, content='Concert ce soir')
+        with django_capture_on_commit_callbacks(execute=True):
+            own = Post.objects.create(author=test_user, content='Concert privé', is_private=True)
+        assert sorted(search_ids(client, 'concert')) == sorted([public.id, own.id])
+        assert search_ids(client_for(test_user2), 'concert') == [public.id]
+
+    def test_partial_saves_keep_the_cache(self, client, test_user, django_capture_on_commit_callbacks):
+        assert search_ids(client, 'testuser') == [test_user.id]
+        with django_capture_on_commit_callbacks(execute=True):
+            test_user.last_login = timezone.now()
+            test_user.save(update_fields=['last_login'])
+        client.get('/api/search', {'query': 'testuser'})
+        assert cache.get('search:stats:global:hits') == 1
+
+
+@pytest.mark.django_db
+class TestUserSearchCache:
+    def test_shared_between_viewers(self, client, test_user, test_user2):
+        url = '/api/users/users/search'
+        assert search_ids(client, 'testuser', url) == [test_user2.id]
+        with CaptureQueriesContext(connection) as queries:
+            assert search_ids(client_for(test_user2), 'TestUser', url) == [test_user.id]
+        assert not [q for q in queries if 'LIKE' in q['sql']]
+
+    def test_surrounding_spaces_share_the_normalised_results(self, client, test_user, test_user2):
+        url = '/api/users/users/search'
+        test_user2.bio = 'Fan de jazz'
+        test_user2.save()
+        # Brut, « Jazz » ne trouverait rien (l'espace final n'est pas dans la bio) et resterait en cache pour « jazz »
+        assert search_ids(client, 'Jazz ', url) == [test_user2.id]
+        assert search_ids(client, 'jazz', url) == [test_user2.id]
+        assert search_ids(client, ' jazz', url) == [test_user2.id]
+
+
+@pytest.mark.django_db
+def test_stats_endpoint(client, admin_user):
+    search_ids(client, 'concert')
+    search_ids(client, 'concert')
+    assert client.get('/api/search/cache-stats').status_code == 403
+
+    stats = client_for(admin_user).get('/api/search/cache-stats').json()
+    assert stats['global'] == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'timeout': 30}
+    assert stats['users']['hits'] == 0
+
+    # Droits relus sur l'utilisateur, pas sur le claim du token
+    admin = client_for(admin_user)
+    admin_user.is_superuser = False
+    admin_user.save()
+    assert admin.get('/api/search/cache-stats').status_code == 403
+
+
+@pytest.mark.django_db
+class TestCacheUnavailable:
+    @pytest.fixture
+    def redis_down(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/0',
+        }}):
+            yield
+
+    def test_writes_still_commit(self, redis_down, test_user, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            test_user.bio = 'Fan de jazz'
+            test_user.save()
+        test_user.refresh_from_db()
+        assert test_user.bio == 'Fan de jazz'
+
+    def test_search_is_computed_without_cache(self, client, test_user2, redis_down):
+        post = Post.objects.create(author=test_user2, content='Concert ce soir')
+        assert search_ids(client, 'concert') == [post.id]
+        assert search_ids(client_for(test_user2), 'concert') == [post.id]
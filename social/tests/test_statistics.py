@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from social import statistics
+from social.models import Post, StatisticsSnapshot, Story, StoryView
+from yoursocial.celery import generate_statistics
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+@pytest.mark.django_db
+class TestStatistics:
+    def test_task_records_snapshots(self, test_user, test_user2):
+        Post.objects.create(author=test_user, content='#django', hashtags=['django'])
+        first = StatisticsSnapshot.objects.get(pk=generate_statistics())
+        assert (first.total_users, first.total_posts, first.new_posts_24h) == (2, 1, 1)
+        assert first.popular_hashtags == [{'tag': 'django', 'count': 1}]
+
+        Post.objects.create(author=test_user2, content='encore')
+        generate_statistics()
+        # L'historique est conservé
+        assert list(StatisticsSnapshot.objects.values_list('total_posts', flat=True)) == [2, 1]
+
+    def test_endpoint_serves_latest_snapshot(self, client, test_user):
+        StatisticsSnapshot.objects.create(created_at=timezone.now() - timedelta(minutes=10), total_users=7)
+        response = client.get('/api/statistics').json()
+        assert response['total_users'] == 7
+        assert 595 < response['age_seconds'] < 700
+
+        statistics.take_snapshot()
+        client.get('/api/statistics')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/statistics').json()
+        assert response['total_users'] == 1 and response['age_seconds'] < 60
+        assert not [q for q in queries if 'COUNT' in q['sql']]
+
+    def test_first_request_takes_a_snapshot(self, client):
+        assert client.get('/api/statistics').json()['total_users'] == 1
+        assert StatisticsSnapshot.objects.count() == 1
+
+    def test_first_snapshot_is_taken_once(self, client):
+        # Premier instantané en cours de calcul par une autre requête
+        cache.add(statistics.FIRST_SNAPSHOT_LOCK, True)
+        assert client.get('/api/statistics').status_code == 503
+        assert not StatisticsSnapshot.objects.exists()
+
+
+@pytest.mark.django_db
+class TestStoryStatistics:
+    def test_single_aggregate_then_cache(self, client, test_user, test_user2):
+        active = Story.objects.create(author=test_user, content='a.jpg', content_type='image')
+        expired = Story.objects.create(author=test_user, content='b.jpg', content_type='image')
+        Story.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(hours=1))
+        StoryView.objects.create(story=active, viewer=test_user2)
+        old = StoryView.objects.create(story=expired, viewer=test_user2)
+        StoryView.objects.filter(pk=old.pk).update(viewed_at=timezone.now() - timedelta(days=2))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/social/stories/statistics')
+        assert response.json() == {'active_stories': 1, 'expired_stories': 1, 'total_views': 2, 'views_24h': 1}
+        assert len([q for q in queries if 'social_story' in q['sql']]) == 1
+
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/social/stories/statistics')
+        assert not [q for q in queries if 'social_story' in q['sql']]
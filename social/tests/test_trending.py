@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from social import trending
+from social.models import Comment, Post
+
+
+pytestmark = pytest.mark.usefixtures('local_cache')
+
+
+class TestTrendingEngine:
+    def test_window_keys_cover_the_window(self):
+        now = 1_700_000_123
+        keys = trending.window_keys('posts', '1h', now)
+        assert len(keys) == 12
+        assert keys[-1] == trending.bucket_key('posts', 300, now - now % 300)
+        assert len(trending.window_keys('posts', '7d', now)) == 168
+
+    def test_windows_only_count_recent_events(self):
+        now = int(time.time())
+        trending.record('hashtags', ['old'], 5, at=now - 3 * 3600)
+        trending.record('hashtags', ['new'], 2, at=now)
+        trending.record('hashtags', ['ancient'], 9, at=now - 8 * 86400)
+        trending.refresh(now)
+
+        assert trending.leaderboard('hashtags', '1h') == [('new', 2.0)]
+        assert trending.leaderboard('hashtags', '24h') == [('old', 5.0), ('new', 2.0)]
+        assert [tag for tag, _ in trending.leaderboard('hashtags', '7d')] == ['old', 'new']
+
+    def test_closed_buckets_keep_heavy_hitters(self, settings):
+        settings.TRENDING_BUCKET_CAPACITY = 2
+        now = int(time.time())
+        for weight, tag in enumerate(['a', 'b', 'c', 'd'], start=1):
+            trending.record('hashtags', [tag], weight, at=now - 7200)
+            trending.record('hashtags', [tag], weight, at=now)
+        trending.refresh(now)
+
+        closed = trending.window_keys('hashtags', '24h', now - 7200)[-1]
+        current = trending.window_keys('hashtags', '24h', now)[-1]
+        assert set(cache.get(closed)) == {'c', 'd'}
+        assert set(cache.get(current)) == {'a', 'b', 'c', 'd'}
+
+
+@pytest.mark.django_db
+class TestTrendingEndpoint:
+    def test_engagement_and_hashtags(self, client, test_user, test_user2, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            quiet = Post.objects.create(author=test_user2, content='quiet', hashtags=['django'])
+            hot = Post.objects.create(author=test_user2, content='hot', hashtags=['django', 'python'])
+            hidden = Post.objects.create(author=test_user2, content='hidden', is_private=True)
+            client.post(f'/api/users/posts/{hot.id}/like')
+            client.post(f'/api/users/posts/{hidden.id}/like')
+            Comment.objects.create(post=hot, author=test_user2, content='c')
+            Comment.objects.create(post=quiet, author=test_user2, content='c')
+        trending.refresh()
+
+        data = client.get('/api/social/trending').json()
+        assert data['window'] == '24h'
+        assert [(item['id'], item['engagement']) for item in data['trending_posts']] == [(hot.id, 2), (quiet.id, 1)]
+        assert data['trending_hashtags'] == [{'tag': 'django', 'count': 2}, {'tag': 'python', 'count': 1}]
+
+        # Un like retiré ne compte plus
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(f'/api/users/posts/{hot.id}/like')
+        trending.refresh()
+        assert client.get('/api/social/trending', {'window': '1h'}).json()['trending_posts'][0]['engagement'] == 1
+
+    def test_reading_trending_is_one_query(self, client, test_user, test_user2, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            for i in range(5):
+                post = Post.objects.create(author=test_user2, content=f'p{i}')
+                Comment.objects.create(post=post, author=test_user2, content='c')
+        trending.refresh()
+        client.get('/api/social/trending')
+
+        with CaptureQueriesContext(connection) as queries:
+            assert len(client.get('/api/social/trending').json()['trending_posts']) == 5
+        assert len(queries) == 1
+
+    def test_unknown_window_is_rejected(self, client):
+        assert client.get('/api/social/trending', {'window': '3d'}).status_code == 422
@@ -0,0 +1,189 @@
+"""
+Tendances calculées en flux.
+
+Les événements d'engagement (like, retrait de like, commentaire) et les
+hashtags des nouveaux posts incrémentent des compteurs par tranche de temps :
+tranches de 5 minutes pour la fenêtre d'une heure, d'une heure pour 24h et
+7 jours. La tâche refresh_trending additionne chaque minute les tranches d'une
+fenêtre, garde les TRENDING_BOARD_SIZE premiers dans un classement en cache, et
+réduit les tranches closes à leurs TRENDING_BUCKET_CAPACITY plus gros
+compteurs : seuls les éléments fréquents (heavy hitters) sont conservés, ce
+qui borne la mémoire au prix d'une légère sous-estimation de la traîne.
+/social/trending ne fait plus que lire ce classement.
+"""
+import logging
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from yoursocial.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Fenêtre : (durée, taille des tranches), en secondes
+WINDOWS = {
+    '1h': (3600, 300),
+    '24h': (86400, 3600),
+    '7d': (7 * 86400, 3600),
+}
+KINDS = ('posts', 'hashtags')
+
+
+def bucket_sizes():
+    return sorted({size for _, size in WINDOWS.values()})
+
+
+def _longest(size):
+    """Durée de la plus longue fenêtre découpée en tranches de `size` secondes"""
+    return max(duration for duration, bucket in WINDOWS.values() if bucket == size)
+
+
+def _retention(size):
+    return _longest(size) + size
+
+
+def bucket_key(kind, size, start):
+    return f'trending:{kind}:{size}:{start}'
+
+
+def board_key(kind, window):
+    return f'trending:board:{kind}:{window}'
+
+
+def _keys(kind, size, duration, now=None):
+    now = int(now if now is not None else time.time())
+    current = now - now % size
+    return [bucket_key(kind, size, start) for start in range(current - duration + size, current + 1, size)]
+
+
+def window_keys(kind, window, now=None):
+    """Clés des tranches couvrant la fenêtre, la tranche en cours comprise"""
+    duration, size = WINDOWS[window]
+    return _keys(kind, size, duration, now)
+
+
+class RedisTrendingStore:
+    """
+    Tranches dans des sorted sets Redis (ZINCRBY), additionnées par ZUNIONSTORE
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def incr(self, entries):
+        """Appliquer des incréments [(clé, membre, poids, ttl)] en un aller-retour"""
+        pipe = self.client.pipeline(transaction=False)
+        for key, member, weight, ttl in entries:
+            pipe.zincrby(key, weight, member)
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def top(self, keys, count):
+        """Les `count` membres de plus fort total sur l'ensemble des tranches"""
+        union = f'trending:union:{uuid.uuid4().hex}'
+        pipe = self.client.pipeline()
+        pipe.zunionstore(union, keys)
+        pipe.zrevrange(union, 0, count - 1, withscores=True)
+        pipe.delete(union)
+        _, items, _ = pipe.execute()
+        return [(member.decode() if isinstance(member, bytes) else member, score) for member, score in items]
+
+    def trim(self, keys, capacity):
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zremrangebyrank(key, 0, -(capacity + 1))
+        pipe.execute()
+
+
+class CacheTrendingStore:
+    """
+    Équivalent via le cache Django (tests, développement) ; les incréments ne
+    sont pas atomiques entre processus
+    """
+
+    def incr(self, entries):
+        grouped = defaultdict(list)
+        for key, member, weight, ttl in entries:
+            grouped[key, ttl].append((str(member), weight))
+        buckets = cache.get_many([key for key, _ in grouped])
+        for (key, ttl), increments in grouped.items():
+            counts = buckets.get(key) or Counter()
+            for member, weight in increments:
+                counts[member] += weight
+            cache.set(key, counts, ttl)
+
+    def top(self, keys, count):
+        total = Counter()
+        for counts in cache.get_many(keys).values():
+            total.update(counts)
+        return [(member, float(score)) for member, score in total.most_common(count)]
+
+    def trim(self, keys, capacity):
+        for key, counts in cache.get_many(keys).items():
+            if len(counts) > capacity:
+                size = int(key.split(':')[2])
+                cache.set(key, Counter(dict(counts.most_common(capacity))), _retention(size))
+
+
+def get_store():
+    """Retourner le stockage des tranches : Redis si disponible, sinon le cache Django"""
+    client = get_redis()
+    if client is not None:
+        return RedisTrendingStore(client)
+    return CacheTrendingStore()
+
+
+def record(kind, members, weight=1, at=None, store=None):
+    """Compter un événement de poids `weight` pour chaque membre, à l'instant `at`"""
+    members = list(members)
+    if not members:
+        return
+    at = int(at if at is not None else time.time())
+    entries = [
+        (bucket_key(kind, size, at - at % size), member, weight, _retention(size))
+        for size in bucket_sizes()
+        for member in members
+    ]
+    (store or get_store()).incr(entries)
+
+
+def record_on_commit(kind, members, weight=1):
+    """Compter un événement une fois la transaction validée, sans jamais faire échouer l'écriture"""
+    members = list(members)
+
+    def apply():
+        try:
+            record(kind, members, weight)
+        except Exception:
+            logger.warning("Impossible de compter %s pour les tendances", kind, exc_info=True)
+
+    if members:
+        transaction.on_commit(apply)
+
+
+def refresh(now=None, store=None):
+    """Recalculer les classements de toutes les fenêtres et réduire les tranches closes"""
+    store = store or get_store()
+    now = int(now if now is not None else time.time())
+    for kind in KINDS:
+        for window in WINDOWS:
+            board = store.top(window_keys(kind, window, now), settings.TRENDING_BOARD_SIZE)
+            cache.set(board_key(kind, window), board, settings.TRENDING_REFRESH_INTERVAL * 3)
+
+        # La tranche en cours reste exacte ; les tranches closes ne gardent
+        # que leurs éléments fréquents
+        for size in bucket_sizes():
+            store.trim(_keys(kind, size, _longest(size), now)[:-1], settings.TRENDING_BUCKET_CAPACITY)
+
+
+def leaderboard(kind, window):
+    """Classement [(membre, score)] d'une fenêtre, calculé à la demande si la tâche n'est pas passée"""
+    board = cache.get(board_key(kind, window))
+    if board is None:
+        board = get_store().top(window_keys(kind, window), settings.TRENDING_BOARD_SIZE)
+        cache.set(board_key(kind, window), board, settings.TRENDING_REFRESH_INTERVAL)
+    return board
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import User, UserSettings
+from .models import User, UserSettings, UserStats
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -37,3 +37,9 @@ class UserSettingsAdmin(admin.ModelAdmin):
     list_filter = ('email_notifications', 'push_notifications', 'language', 'theme')
     search_fields = ('user__username',)
     date_hierarchy = 'updated_at'
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'posts_count', 'stories_count', 'likes_received', 'comments_received')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
@@ -1,31 +1,42 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from ninja import Router, Schema, File
 from ninja.files import UploadedFile
 from django.contrib.auth import get_user_model, authenticate
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from ninja.errors import HttpError
 from ninja.security import HttpBearer
 from datetime import datetime, timedelta
 import jwt
 from django.conf import settings
-from django.db import models
+from django.http import HttpResponse
 from django.db.models import Q
 from django.utils import timezone
 import pyotp
 import qrcode
 import io
 import base64
+import hashlib
+import json
+import logging
 from django_ratelimit.decorators import ratelimit
 from django.core.cache import cache
 
 from .models import User, UserSettings, User2FA
-from social.models import Post, Comment, Like
+from .cache import decode_token, get_authenticated_user, token_state
+from . import stats as user_stats, typeahead
+from social.models import Post, Comment
+from social import hot, metrics, search_cache
+from social.feed import feed_queryset, get_feed
+from social.likes import apply_like_operations, set_viewer_flags, toggle_like
+from yoursocial.pagination import decode_cursor, paginate_keyset, set_next_cursor
 
 # Création du routeur avec un préfixe unique
 # router = Router(prefix="users")
 router = Router()
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 # Schémas de validation
 class UserCreateSchema(Schema):
@@ -60,33 +71,82 @@ class UserResponseSchema(Schema):
     posts_count: int
     created_at: datetime
 
+class UserSuggestionSchema(Schema):
+    id: int
+    username: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    avatar: Optional[str]
+    followers_count: int
+    is_following: bool
+
 class TokenSchema(Schema):
     access_token: str
     refresh_token: str
 
+class ClaimsUser:
+    """
+    Utilisateur léger construit à partir des claims signés du token, sans
+    requête SQL. Les claims reflètent l'état de l'utilisateur à l'émission
+    du token : à réserver aux routes qui n'ont besoin que de
+    id/username/is_superuser/role.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload):
+        self.id = self.pk = payload['user_id']
+        self.username = payload['username']
+        self.is_superuser = payload.get('is_superuser', False)
+        self.role = payload.get('role')
+
+    def __str__(self):
+        return self.username
+
 class AuthBearer(HttpBearer):
+    def __init__(self, claims_only=False):
+        super().__init__()
+        # Mode opt-in : request.user est un ClaimsUser au lieu d'un User
+        self.claims_only = claims_only
+
     def authenticate(self, request, token):
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             user_id = payload.get('user_id')
             if not user_id:
-                print(f"DEBUG: Token sans user_id: {payload}")
+                logger.debug("Token sans user_id")
                 return None
             
-            user = User.objects.get(id=user_id)
-            print(f"DEBUG: Utilisateur authentifié: {user.username} (ID: {user.id})")
+            # Les tokens émis avant l'ajout des claims passent par le chemin complet
+            if self.claims_only and 'username' in payload:
+                # Version révoquée, compte supprimé ou désactivé : un GET sur le cache partagé
+                version, _ = token_state(user_id)
+                if version != payload.get('token_version', 0):
+                    logger.info("Token révoqué", extra={'user_id': user_id})
+                    return None
+                request.user = ClaimsUser(payload)
+                return request.user
+            
+            user = get_authenticated_user(user_id, payload.get('token_version', 0))
+            if user is None:
+                logger.info("Token révoqué", extra={'user_id': user_id})
+                return None
+            
+            # Ninja ne renseigne que request.auth : les vues lisent request.user
+            request.user = user
+            logger.debug("Utilisateur authentifié", extra={'user_id': user.id})
             return user
         except jwt.ExpiredSignatureError:
-            print("DEBUG: Token expiré")
+            logger.debug("Token expiré")
             return None
         except jwt.InvalidTokenError as e:
-            print(f"DEBUG: Token invalide: {e}")
+            logger.debug("Token invalide: %s", e)
             return None
         except User.DoesNotExist:
-            print(f"DEBUG: Utilisateur avec ID {payload.get('user_id')} n'existe pas")
+            logger.info("Token pour un utilisateur inexistant", extra={'user_id': payload.get('user_id')})
             return None
-        except Exception as e:
-            print(f"DEBUG: Erreur d'authentification: {e}")
+        except Exception:
+            logger.exception("Erreur d'authentification")
             return None
 
 # Schémas pour les posts et commentaires
@@ -124,6 +184,9 @@ class PostResponseSchema(Schema):
     is_private: bool
     likes_count: int
     comments_count: int
+    # État propre au lecteur, calculé pour toute la page (social.likes.set_viewer_flags)
+    has_liked: bool = False
+    has_commented: bool = False
     created_at: datetime
     updated_at: datetime
 
@@ -141,6 +204,19 @@ class CommentResponseSchema(Schema):
     created_at: datetime
     updated_at: datetime
 
+class LikeOperationSchema(Schema):
+    target: Literal['post', 'comment']
+    id: int
+    action: Literal['like', 'unlike']
+
+class LikeBatchSchema(Schema):
+    operations: List[LikeOperationSchema]
+
+class LikeBatchResponseSchema(Schema):
+    liked: int
+    unliked: int
+    skipped: int
+
 class TwoFAActivateResponseSchema(Schema):
     otpauth_url: str
     qr_code_base64: str
@@ -196,7 +272,7 @@ def register(request, payload: UserCreateSchema):
         return {"access_token": access_token, "refresh_token": refresh_token}
     except ValidationError as e:
         return {"error": str(e)}
-    except Exception as e:
+    except Exception:
         return {"error": "Erreur lors de la création du compte"}
 
 @router.post("/login", response=LoginResponseSchema)
@@ -226,6 +302,8 @@ def refresh_token(request, refresh_token: str):
     try:
         payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=['HS256'])
         user = User.objects.get(id=payload['user_id'])
+        if payload.get('token_version', 0) != user.token_version:
+            return {"error": "Token révoqué"}
         access_token = generate_access_token(user)
         new_refresh_token = generate_refresh_token(user)
         return {"access_token": access_token, "refresh_token": new_refresh_token}
@@ -239,26 +317,66 @@ def get_me(request):
 
 @router.put("/me", response=UserResponseSchema, auth=AuthBearer())
 def update_me(request, payload: UserUpdateSchema):
+    # request.user vient du cache d'authentification : seuls les champs modifiés
+    # sont écrits, pour ne pas écraser compteurs, version des tokens ou mot de passe
     user = request.user
-    for field, value in payload.dict(exclude_unset=True).items():
+    changes = payload.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(user, field, value)
-    user.save()
+    user.save(update_fields=[*changes, 'updated_at'])
     return user
 
 @router.post("/me/avatar", response=UserResponseSchema, auth=AuthBearer())
 def upload_avatar(request, file: UploadedFile = File(...)):
     user = request.user
-    user.avatar.save(file.name, file)
-    user.save()
+    user.avatar.save(file.name, file, save=False)
+    user.save(update_fields=['avatar', 'updated_at'])
     return user
 
 @router.post("/me/banner", response=UserResponseSchema, auth=AuthBearer())
 def upload_banner(request, file: UploadedFile = File(...)):
     user = request.user
-    user.banner.save(file.name, file)
-    user.save()
+    user.banner.save(file.name, file, save=False)
+    user.save(update_fields=['banner', 'updated_at'])
     return user
 
+# Routes pour la recherche d'utilisateurs (avant /users/{user_id}, qui capterait leurs chemins)
+@router.get("/users/search", response=List[UserResponseSchema], auth=AuthBearer())
+def search_users(request, query: str, page: int = 1, limit: int = 20):
+    start = (page - 1) * limit
+    end = start + limit
+    
+    # En cache pour tous les lecteurs (social/search_cache.py) : une place de
+    # plus, celle du lecteur, retiré ensuite. La recherche porte sur le terme
+    # normalisé de la clé, insensible à la casse comme icontains
+    term = query.strip().lower()
+    users = search_cache.get_or_compute(
+        'users', ['users'], (term, end), lambda: list(User.objects.filter(
+            Q(username__icontains=term) |
+            Q(first_name__icontains=term) |
+            Q(last_name__icontains=term) |
+            Q(bio__icontains=term)
+        )[:end + 1]),
+        settings.SEARCH_USERS_CACHE_TIMEOUT,
+    )
+    
+    return [user for user in users if user.id != request.user.id][start:end]
+
+@router.get("/users/typeahead", response=List[UserSuggestionSchema], auth=AuthBearer(claims_only=True))
+def typeahead_users(request, q: str, limit: int = 10):
+    # Index de trigrammes (users/typeahead.py) : préfixe, puis similarité, puis abonnés
+    limit = max(1, min(limit, settings.TYPEAHEAD_MAX_RESULTS))
+    followed = set(User.following.through.objects.filter(
+        from_user_id=request.user.id
+    ).values_list('to_user_id', flat=True))
+    ids = [pk for pk in typeahead.suggest(q, followed, limit + 1) if pk != request.user.id][:limit]
+    users = User.objects.only(
+        'id', 'username', 'first_name', 'last_name', 'avatar', 'followers_count'
+    ).in_bulk(ids)
+    for user in users.values():
+        user.is_following = user.id in followed
+    return [users[pk] for pk in ids if pk in users]
+
 @router.get("/users/{user_id}", response=UserResponseSchema, auth=AuthBearer())
 def get_user(request, user_id: int):
     return get_object_or_404(User, id=user_id)
@@ -271,47 +389,38 @@ def follow_user(request, user_id: int):
     
     user_to_follow = get_object_or_404(User, id=user_id)
     
-    if request.user in user_to_follow.followers.all():
+    # Recherche indexée sur la table d'abonnements, sans charger les followers
+    if request.user.is_following(user_to_follow):
         # Se désabonner
-        request.user.following.remove(user_to_follow)
+        request.user.unfollow(user_to_follow)
         return {"action": "unfollowed", "message": f"Vous ne suivez plus {user_to_follow.username}"}
     else:
         # S'abonner
-        request.user.following.add(user_to_follow)
+        request.user.follow(user_to_follow)
         return {"action": "followed", "message": f"Vous suivez maintenant {user_to_follow.username}"}
 
 @router.get("/users/{user_id}/followers", response=List[UserResponseSchema], auth=AuthBearer())
-def list_followers(request, user_id: int, page: int = 1, limit: int = 20):
+def list_followers(request, response: HttpResponse, user_id: int, page: int = 1, limit: int = 20,
+                   cursor: Optional[str] = None):
     user = get_object_or_404(User, id=user_id)
-    start = (page - 1) * limit
-    end = start + limit
     
-    followers = user.followers.all()[start:end]
-    return followers
+    # Pagination sur la table d'abonnements : abonnés les plus récents d'abord
+    follows = paginate_keyset(
+        User.following.through.objects.filter(to_user_id=user.id).select_related('from_user'),
+        response, cursor, page, limit, ordering=('-id',), types=(int,),
+    )
+    return [follow.from_user for follow in follows]
 
 @router.get("/users/{user_id}/following", response=List[UserResponseSchema], auth=AuthBearer())
-def list_following(request, user_id: int, page: int = 1, limit: int = 20):
+def list_following(request, response: HttpResponse, user_id: int, page: int = 1, limit: int = 20,
+                   cursor: Optional[str] = None):
     user = get_object_or_404(User, id=user_id)
-    start = (page - 1) * limit
-    end = start + limit
-    
-    following = user.following.all()[start:end]
-    return following
-
-# Routes pour la recherche d'utilisateurs
-@router.get("/users/search", response=List[UserResponseSchema], auth=AuthBearer())
-def search_users(request, query: str, page: int = 1, limit: int = 20):
-    start = (page - 1) * limit
-    end = start + limit
     
-    users = User.objects.filter(
-        Q(username__icontains=query) |
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(bio__icontains=query)
-    ).exclude(id=request.user.id)[start:end]
-    
-    return users
+    follows = paginate_keyset(
+        User.following.through.objects.filter(from_user_id=user.id).select_related('to_user'),
+        response, cursor, page, limit, ordering=('-id',), types=(int,),
+    )
+    return [follow.to_user for follow in follows]
 
 # Routes pour les suggestions d'utilisateurs
 @router.get("/users/suggestions", response=List[UserResponseSchema], auth=AuthBearer())
@@ -355,38 +464,44 @@ def update_user_settings(request, payload: dict):
 
 # Routes pour les statistiques utilisateur
 @router.get("/me/statistics", auth=AuthBearer())
-def get_user_statistics(request):
+def get_user_statistics(request, response: HttpResponse):
     user = request.user
-    
-    # Statistiques de base
+    counts = user_stats.get(user.id)
+
+    # Compteurs matérialisés (UserStats) ; abonnés tenus sur User
     stats = {
-        'posts_count': user.posts.count(),
-        'followers_count': user.followers.count(),
-        'following_count': user.following.count(),
-        'likes_received': Like.objects.filter(
-            models.Q(post__author=user) | models.Q(comment__author=user)
-        ).count(),
-        'comments_received': Comment.objects.filter(post__author=user).count(),
-        'stories_count': user.stories.count(),
+        'posts_count': counts.posts_count,
+        'followers_count': user.followers_count,
+        'following_count': user.following_count,
+        'likes_received': counts.likes_received,
+        'comments_received': counts.comments_received,
+        'stories_count': counts.stories_count,
         'account_age_days': (timezone.now() - user.date_joined).days
     }
     
-    # Statistiques des dernières 24h
+    # Statistiques des dernières 24h (tranches horaires, social/metrics.py)
     yesterday = timezone.now() - timedelta(days=1)
+    recent = metrics.window(['posts', 'stories'], metrics.user_scope(user.id))
     stats.update({
-        'posts_24h': user.posts.filter(created_at__gte=yesterday).count(),
-        'stories_24h': user.stories.filter(created_at__gte=yesterday).count(),
+        'posts_24h': recent['posts'],
+        'stories_24h': recent['stories'],
         'new_followers_24h': user.followers.filter(date_joined__gte=yesterday).count()
     })
-    
+
+    # Réponse conditionnelle : le client revalide avec If-None-Match
+    etag = '"%s"' % hashlib.md5(json.dumps(stats, sort_keys=True).encode()).hexdigest()
+    if request.headers.get('If-None-Match') == etag:
+        not_modified = HttpResponse(status=304)
+        not_modified['ETag'] = etag
+        return not_modified
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return stats
 
 # Routes pour la gestion des posts
 @router.post("/posts", response=PostResponseSchema, auth=AuthBearer())
 def create_post(request, payload: PostCreateSchema):
-    print(f"DEBUG: Création de post - Utilisateur authentifié: {request.user.username} (ID: {request.user.id})")
-    print(f"DEBUG: Contenu du post: {payload.content}")
-    print(f"DEBUG: Author ID demandé: {payload.author_id}")
+    logger.debug("Création de post", extra={'user_id': request.user.id, 'author_id': payload.author_id})
     
     post_data = payload.dict(exclude_unset=True)
     author_id = post_data.pop('author_id', None)
@@ -402,20 +517,18 @@ def create_post(request, payload: PostCreateSchema):
         
         try:
             author = User.objects.get(id=author_id)
-            print(f"DEBUG: Utilisation de l'auteur spécifié: {author.username} (ID: {author.id})")
         except User.DoesNotExist:
             return {"error": f"Utilisateur avec l'ID {author_id} n'existe pas"}
     else:
         # Utiliser l'utilisateur connecté comme auteur par défaut
         author = request.user
-        print(f"DEBUG: Utilisation de l'utilisateur connecté comme auteur: {author.username} (ID: {author.id})")
     
     post = Post.objects.create(
         author=author,
         **post_data
     )
     
-    print(f"DEBUG: Post créé avec succès - ID: {post.id}, Auteur: {post.author.username} (ID: {post.author.id})")
+    logger.info("Post créé", extra={'post_id': post.id, 'author_id': author.id})
     
     if media:
         post.media.save(media.name, media)
@@ -430,7 +543,7 @@ def create_post_for_user(request, user_id: int, payload: PostCreateForUserSchema
     """
     Créer un post au nom d'un utilisateur spécifique (nécessite des permissions admin)
     """
-    print(f"DEBUG: Création de post pour utilisateur {user_id} - Utilisateur authentifié: {request.user.username} (ID: {request.user.id})")
+    logger.debug("Création de post pour un autre utilisateur", extra={'user_id': request.user.id, 'author_id': user_id})
     
     # Vérifier les permissions
     if not request.user.is_superuser:
@@ -450,7 +563,7 @@ def create_post_for_user(request, user_id: int, payload: PostCreateForUserSchema
         **post_data
     )
     
-    print(f"DEBUG: Post créé avec succès pour {author.username} - ID: {post.id}")
+    logger.info("Post créé", extra={'post_id': post.id, 'author_id': author.id})
     
     if media:
         post.media.save(media.name, media)
@@ -461,7 +574,8 @@ def create_post_for_user(request, user_id: int, payload: PostCreateForUserSchema
     return post
 
 @router.get("/users/{user_id}/posts", response=List[PostResponseSchema], auth=AuthBearer())
-def list_user_posts(request, user_id: int, page: int = 1, limit: int = 20):
+def list_user_posts(request, response: HttpResponse, user_id: int, page: int = 1, limit: int = 20,
+                    cursor: Optional[str] = None):
     """
     Lister les posts d'un utilisateur spécifique
     """
@@ -470,34 +584,47 @@ def list_user_posts(request, user_id: int, page: int = 1, limit: int = 20):
     except User.DoesNotExist:
         return {"error": f"Utilisateur avec l'ID {user_id} n'existe pas"}
     
-    start = (page - 1) * limit
-    end = start + limit
-    
     # Vérifier les permissions de visibilité
     if user.is_private and request.user != user and not request.user.is_superuser:
         # Vérifier si l'utilisateur connecté suit l'utilisateur privé
         if not request.user.is_following(user):
             return {"error": "Vous n'avez pas accès aux posts de cet utilisateur privé"}
     
-    posts = Post.objects.filter(author=user).select_related('author').order_by('-created_at')[start:end]
-    return posts
+    posts = paginate_keyset(
+        Post.objects.filter(author=user).select_related('author'),
+        response, cursor, page, limit,
+    )
+    return set_viewer_flags(posts, request.user.id)
 
 @router.get("/posts", response=List[PostResponseSchema], auth=AuthBearer())
-def list_posts(request, page: int = 1, limit: int = 20):
-    start = (page - 1) * limit
-    end = start + limit
-    
-    posts = Post.objects.filter(
-        models.Q(author=request.user) |
-        models.Q(author__in=request.user.following.all()) |
-        models.Q(is_private=False)
-    ).select_related('author').order_by('-created_at')[start:end]
+def list_posts(request, response: HttpResponse, page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+               order: Literal['recent', 'hot'] = 'recent'):
+    if order == 'hot':
+        # Les timelines sont triées par date : le tri par popularité passe par l'index hot_score
+        posts = paginate_keyset(
+            feed_queryset(request.user.id), response, cursor, page, limit,
+            ordering=hot.ORDERING, types=hot.CURSOR_TYPES,
+        )
+        return set_viewer_flags(posts, request.user.id)
+
+    # Timelines matérialisées (social/feed.py), hydratées en une requête.
+    # Le curseur du fil porte aussi le nombre de posts déjà servis.
+    if cursor:
+        created_at, post_id, offset = decode_cursor(cursor, 3, (datetime, int, int))
+        posts = get_feed(request.user.id, offset, limit + 1, after=(created_at, post_id))
+    else:
+        offset = (page - 1) * limit
+        posts = get_feed(request.user.id, offset, limit + 1)
     
-    return posts
+    if len(posts) > limit:
+        posts = posts[:limit]
+        set_next_cursor(response, [posts[-1].created_at, posts[-1].id, offset + limit])
+    return set_viewer_flags(posts, request.user.id)
 
 @router.get("/posts/{post_id}", response=PostResponseSchema, auth=AuthBearer())
 def get_post(request, post_id: int):
-    return get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
+    return set_viewer_flags([post], request.user.id)[0]
 
 @router.delete("/posts/{post_id}", auth=AuthBearer())
 def delete_post(request, post_id: int):
@@ -526,49 +653,46 @@ def create_comment(request, post_id: int, payload: CommentCreateSchema):
     return comment
 
 @router.get("/posts/{post_id}/comments", response=List[CommentResponseSchema], auth=AuthBearer())
-def list_comments(request, post_id: int, page: int = 1, limit: int = 20):
+def list_comments(request, response: HttpResponse, post_id: int, page: int = 1, limit: int = 20,
+                  cursor: Optional[str] = None):
     post = get_object_or_404(Post, id=post_id)
-    start = (page - 1) * limit
-    end = start + limit
-    
-    comments = Comment.objects.filter(
-        post=post,
-        parent=None
-    ).select_related('author').order_by('-created_at')[start:end]
     
-    return comments
+    return paginate_keyset(
+        Comment.objects.filter(post=post, parent=None).select_related('author'),
+        response, cursor, page, limit,
+    )
 
 # Routes pour les likes
 @router.post("/posts/{post_id}/like", auth=AuthBearer())
 def like_post(request, post_id: int):
-    post = get_object_or_404(Post, id=post_id)
-    
-    like, created = Like.objects.get_or_create(
-        user=request.user,
-        post=post
-    )
+    get_object_or_404(Post.objects.only('id'), id=post_id)
     
-    if not created:
-        like.delete()
+    if not toggle_like(request.user.id, 'post', post_id):
         return {"action": "unliked", "message": "Like supprimé"}
     
     return {"action": "liked", "message": "Post liké"}
 
 @router.post("/comments/{comment_id}/like", auth=AuthBearer())
 def like_comment(request, comment_id: int):
-    comment = get_object_or_404(Comment, id=comment_id)
-    
-    like, created = Like.objects.get_or_create(
-        user=request.user,
-        comment=comment
-    )
+    get_object_or_404(Comment.objects.only('id'), id=comment_id)
     
-    if not created:
-        like.delete()
+    if not toggle_like(request.user.id, 'comment', comment_id):
         return {"action": "unliked", "message": "Like supprimé"}
     
     return {"action": "liked", "message": "Commentaire liké"}
 
+@router.post("/likes/batch", response=LikeBatchResponseSchema, auth=AuthBearer())
+def batch_likes(request, payload: LikeBatchSchema):
+    """Appliquer en une fois les likes mis en file hors ligne par un client"""
+    if len(payload.operations) > settings.LIKES_BATCH_MAX_SIZE:
+        raise HttpError(400, f"Au plus {settings.LIKES_BATCH_MAX_SIZE} opérations par lot")
+    
+    liked, unliked, skipped = apply_like_operations(
+        request.user.id,
+        [(op.target, op.id, op.action == 'like') for op in payload.operations]
+    )
+    return {"liked": liked, "unliked": unliked, "skipped": skipped}
+
 # Routes pour le 2FA
 @router.post("/me/2fa/activate", response=TwoFAActivateResponseSchema, auth=AuthBearer())
 def activate_2fa(request):
@@ -622,6 +746,10 @@ def deactivate_2fa(request, payload: TwoFADeactivateSchema):
 def generate_access_token(user):
     payload = {
         'user_id': user.id,
+        'username': user.username,
+        'is_superuser': user.is_superuser,
+        'role': user.role,
+        'token_version': user.token_version,
         'exp': datetime.utcnow() + timedelta(minutes=60),
         'iat': datetime.utcnow()
     }
@@ -630,6 +758,7 @@ def generate_access_token(user):
 def generate_refresh_token(user):
     payload = {
         'user_id': user.id,
+        'token_version': user.token_version,
         'exp': datetime.utcnow() + timedelta(days=7),
         'iat': datetime.utcnow()
     }
@@ -0,0 +1,209 @@
+"""
+Caches du chemin d'authentification utilisé par AuthBearer.
+
+Les tokens vérifiés sont mémorisés en mémoire jusqu'à leur expiration. Les
+utilisateurs passent par deux niveaux : un LRU en mémoire par worker (TTL
+court) devant le cache Django partagé (Redis). Ces entrées sont indexées par
+l'ID utilisateur et la version des tokens, et invalidées par les signaux
+post_save/post_delete sur User.
+
+Chaque utilisateur a aussi dans le cache partagé un état des tokens : version
+valide (None pour un compte supprimé ou désactivé) et tampon, renouvelé à
+chaque invalidation. Chaque authentification le lit (un GET) : le chemin
+claims_only compare la version du token sans requête SQL, et une entrée du LRU
+local n'est servie que si son tampon est toujours le courant, ce qui propage
+une invalidation à tous les workers.
+"""
+import copy
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Cache LRU borné en mémoire avec expiration par entrée, sûr entre threads
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        if timeout <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Supprimer toutes les entrées dont la clé vérifie le prédicat"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_verified_tokens = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE, 0)
+_local_users = LRUCache(
+    settings.AUTH_USER_LOCAL_CACHE_SIZE,
+    settings.AUTH_USER_LOCAL_CACHE_TIMEOUT,
+)
+
+
+def decode_token(token):
+    """
+    Vérifier et décoder un JWT, en mémorisant le résultat jusqu'à son expiration.
+
+    La clé est une empreinte du token : les tokens eux-mêmes ne sont pas gardés
+    en mémoire. Les erreurs de jwt.decode (token expiré, invalide) remontent
+    telles quelles et ne sont jamais mises en cache.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _verified_tokens.get(key)
+    if payload is None:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        if 'exp' in payload:
+            _verified_tokens.set(key, payload, payload['exp'] - time.time())
+    return payload
+
+
+def _shared_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _get_shared(user_id):
+    # Le cache partagé est une optimisation : une panne Redis ne doit pas
+    # empêcher l'authentification, on retombe alors sur la base.
+    try:
+        return cache.get(_shared_key(user_id))
+    except Exception:
+        logger.warning("Cache partagé indisponible pour l'utilisateur %s", user_id, exc_info=True)
+        return None
+
+
+def _set_shared(user):
+    try:
+        cache.set(_shared_key(user.id), user, settings.AUTH_USER_CACHE_TIMEOUT)
+    except Exception:
+        logger.warning("Cache partagé indisponible pour l'utilisateur %s", user.id, exc_info=True)
+
+
+def _state_key(user_id):
+    return f'auth:state:{user_id}'
+
+
+def _get_state(user_id):
+    try:
+        return cache.get(_state_key(user_id))
+    except Exception:
+        logger.warning("Cache partagé indisponible pour l'utilisateur %s", user_id, exc_info=True)
+        return None
+
+
+def _publish_state(user_id, user=None):
+    """Calculer l'état des tokens depuis la base (ou `user` déjà lu) et le publier"""
+    if user is None:
+        row = User.objects.filter(id=user_id).values_list('token_version', 'is_active').first()
+    else:
+        row = (user.token_version, user.is_active)
+    state = (row[0] if row and row[1] else None, time.time_ns())
+    try:
+        # Premier arrivé gagne : les workers concurrents partagent le même tampon
+        if not cache.add(_state_key(user_id), state, settings.AUTH_USER_CACHE_TIMEOUT):
+            state = cache.get(_state_key(user_id)) or state
+    except Exception:
+        logger.warning("Cache partagé indisponible pour l'utilisateur %s", user_id, exc_info=True)
+    return state
+
+
+def token_state(user_id):
+    """(version valide des tokens ou None, tampon) de l'utilisateur"""
+    return _get_state(user_id) or _publish_state(user_id)
+
+
+def get_authenticated_user(user_id, token_version=0):
+    """
+    Retourner l'utilisateur d'un token sans requête SQL dans le cas courant.
+
+    Lève User.DoesNotExist si l'utilisateur n'existe plus et retourne None si
+    le token porte une version révoquée ou si le compte est désactivé. Chaque
+    appel reçoit sa propre copie de l'instance pour que les vues puissent la
+    modifier sans polluer le cache.
+    """
+    user = None
+    state = _get_state(user_id)
+    if state is None:
+        user = User.objects.get(id=user_id)
+        _set_shared(user)
+        state = _publish_state(user_id, user)
+    version, stamp = state
+    if version != token_version:
+        return None
+
+    local_key = (user_id, token_version)
+    item = _local_users.get(local_key)
+    if item is not None and item[1] == stamp:
+        return copy.copy(item[0])
+    if user is None:
+        user = _get_shared(user_id)
+        if user is None or user.token_version != token_version:
+            user = User.objects.get(id=user_id)
+            _set_shared(user)
+        if user.token_version != token_version:
+            return None
+    _local_users.set(local_key, (user, stamp))
+    return copy.copy(user)
+
+
+def invalidate_user(user_id):
+    """Retirer un utilisateur des caches ; les autres workers le voient au tampon renouvelé"""
+    _local_users.delete_matching(lambda key: key[0] == user_id)
+    try:
+        cache.delete_many([_shared_key(user_id), _state_key(user_id)])
+    except Exception:
+        logger.warning("Cache partagé indisponible pour l'utilisateur %s", user_id, exc_info=True)
+
+
+def clear_local_cache():
+    """Vider les caches en mémoire du worker courant"""
+    _verified_tokens.clear()
+    _local_users.clear()
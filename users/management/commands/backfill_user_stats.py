@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import stats
+
+
+class Command(BaseCommand):
+    help = "Crée et recompte les statistiques UserStats de tous les utilisateurs existants."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Utilisateurs traités par transaction")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        # reconcile() vide d'abord le tampon des compteurs
+        repaired = stats.reconcile(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{repaired} lignes créées ou corrigées en {time.perf_counter() - start:.1f}s"
+        ))
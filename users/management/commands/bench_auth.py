@@ -0,0 +1,76 @@
+import contextlib
+import os
+import time
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
+
+from users.api import AuthBearer, generate_access_token
+from users.cache import clear_local_cache, invalidate_user
+
+User = get_user_model()
+
+
+def legacy_authenticate(request, token):
+    """Chemin d'authentification d'origine : une requête SQL par appel"""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    return User.objects.get(id=payload['user_id'])
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = "Mesure les requêtes SQL par appel et la latence p99 d'AuthBearer, avant et après le cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Nombre d'utilisateurs distincts")
+        parser.add_argument('--requests', type=int, default=5000, help="Nombre d'authentifications mesurées")
+
+    def handle(self, *args, **options):
+        # Les données de test sont créées dans une transaction annulée à la fin
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(email=f'bench-auth-{i}@example.com', username=f'bench-auth-{i}')
+                for i in range(options['users'])
+            ])
+            tokens = [generate_access_token(user) for user in users]
+            requests = [tokens[i % len(tokens)] for i in range(options['requests'])]
+
+            bearer = AuthBearer()
+            self.report('Avant (User.objects.get)', legacy_authenticate, requests)
+
+            for user in users:
+                invalidate_user(user.id)
+            clear_local_cache()
+            self.report('Après (cache froid puis chaud)', bearer.authenticate, requests)
+            self.report('Après (cache chaud)', bearer.authenticate, requests)
+            self.report('Claims seuls (cache chaud)', AuthBearer(claims_only=True).authenticate, requests)
+
+            for user in users:
+                invalidate_user(user.id)
+            transaction.set_rollback(True)
+
+    def report(self, label, authenticate, tokens):
+        latencies = []
+        # Les traces de debug éventuelles ne doivent pas polluer le rapport
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                CaptureQueriesContext(connection) as queries:
+            for token in tokens:
+                request = HttpRequest()
+                start = time.perf_counter()
+                authenticate(request, token)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        self.stdout.write(
+            f"{label:<32} requêtes/appel={len(queries) / len(tokens):.3f} "
+            f"p50={percentile(latencies, 50):.3f}ms p99={percentile(latencies, 99):.3f}ms"
+        )
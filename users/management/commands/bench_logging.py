@@ -0,0 +1,86 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from users.api import generate_access_token
+from yoursocial.log import BackgroundQueueHandler, SamplingFilter, StructuredFormatter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit des requêtes API avec les traces de debug désactivées puis activées."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Nombre de requêtes par scénario")
+
+    def handle(self, *args, **options):
+        # Les données de test sont créées dans une transaction annulée à la fin
+        with transaction.atomic(), tempfile.TemporaryDirectory() as tmpdir:
+            user = User.objects.create(email='bench-logging@example.com', username='bench-logging')
+            client = Client(
+                HTTP_HOST='localhost',
+                HTTP_AUTHORIZATION=f'Bearer {generate_access_token(user)}',
+                REMOTE_ADDR='10.0.0.1',
+            )
+            path = os.path.join(tmpdir, 'bench.log')
+
+            def sync_handler():
+                # Équivalent des anciens print() : écriture synchrone à chaque trace
+                handler = logging.FileHandler(path)
+                handler.setFormatter(StructuredFormatter('{levelname} {asctime} {name} {message}', style='{'))
+                return handler
+
+            def queued_handler():
+                handler = BackgroundQueueHandler([sync_handler()], maxsize=settings.LOG_QUEUE_SIZE)
+                handler.addFilter(SamplingFilter(rate=settings.LOG_DEBUG_RATE, sample=settings.LOG_DEBUG_SAMPLE))
+                return handler
+
+            self.report('Debug désactivé (INFO)', client, options['requests'], logging.INFO, queued_handler)
+            self.report('Debug synchrone', client, options['requests'], logging.DEBUG, sync_handler)
+            self.report('Debug en file + échantillonné', client, options['requests'], logging.DEBUG, queued_handler)
+
+            transaction.set_rollback(True)
+
+    def report(self, label, client, count, level, make_handler):
+        handler = make_handler()
+        saved = {}
+        for name in settings.LOG_APP_LOGGERS:
+            logger = logging.getLogger(name)
+            saved[name] = (logger.handlers, logger.level, logger.propagate)
+            logger.handlers, logger.propagate = [handler], False
+            logger.setLevel(level)
+
+        try:
+            # Tour de chauffe non mesuré
+            self.run_requests(client, min(count, 100))
+            start = time.perf_counter()
+            self.run_requests(client, count)
+            elapsed = time.perf_counter() - start
+        finally:
+            for name, (handlers, logger_level, propagate) in saved.items():
+                logger = logging.getLogger(name)
+                logger.handlers, logger.propagate = handlers, propagate
+                logger.setLevel(logger_level)
+            handler.close()
+
+        dropped = getattr(handler, 'dropped', 0)
+        self.stdout.write(
+            f"{label:<32} {count / elapsed:8.0f} req/s  "
+            f"{elapsed / count * 1000:.3f}ms/req  traces abandonnées={dropped}"
+        )
+
+    def run_requests(self, client, count):
+        # Alternance lecture / écriture sur les vues instrumentées
+        for i in range(count):
+            if i % 2:
+                client.get('/api/users/me')
+            else:
+                client.post('/api/users/posts', {'content': f'bench {i}'}, content_type='application/json')
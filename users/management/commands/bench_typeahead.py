@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.typeahead import TrigramIndex
+
+FIRST = ['jean', 'marie', 'pierre', 'sophie', 'lucas', 'emma', 'hugo', 'lea', 'louis', 'chloe', 'nathan', 'camille',
+         'thomas', 'julie', 'antoine', 'sarah', 'nicolas', 'manon', 'paul', 'ines', 'kevin', 'laura', 'maxime', 'zoe']
+SYLLABLES = ['ba', 'be', 'da', 'de', 'di', 'fa', 'ga', 'la', 'le', 'li', 'lo', 'ma', 'mo', 'na', 'ne', 'ni', 'pa',
+             'pe', 'ra', 're', 'ri', 'ro', 'sa', 'se', 'ta', 'te', 'to', 'va', 'vi', 'za']
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def typo(rng, word):
+    """Une faute : lettre supprimée, doublée ou deux lettres inversées"""
+    i = rng.randrange(len(word) - 1)
+    return rng.choice([
+        word[:i] + word[i + 1:],
+        word[:i] + word[i] + word[i:],
+        word[:i] + word[i + 1] + word[i] + word[i + 2:],
+    ])
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence de l'index de suggestions de comptes sur des noms d'utilisateur synthétiques."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000, help="Nombre de comptes indexés")
+        parser.add_argument('--queries', type=int, default=2000, help="Requêtes mesurées par type")
+        parser.add_argument('--follows', type=int, default=200, help="Comptes suivis par l'utilisateur")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = []
+        for pk in range(1, options['users'] + 1):
+            last = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            names.append(f'{rng.choice(FIRST)}{rng.choice(["", "_", "."])}{last}{rng.randint(0, 999)}')
+        rows = [(pk, name, int(rng.paretovariate(1.2))) for pk, name in enumerate(names, start=1)]
+
+        start = time.perf_counter()
+        index = TrigramIndex(rows)
+        self.stdout.write(f"{len(rows)} comptes : index construit en {time.perf_counter() - start:.1f}s")
+
+        followed = rng.sample(range(1, len(rows) + 1), options['follows'])
+        count = options['queries']
+        workloads = {
+            'Préfixe court': [rng.choice(names)[:rng.randint(1, 3)] for _ in range(count)],
+            'Préfixe long': [rng.choice(names)[:rng.randint(5, 9)] for _ in range(count)],
+            'Nom complet': [rng.choice(names) for _ in range(count)],
+            'Faute de frappe': [typo(rng, rng.choice(names)[:rng.randint(5, 9)]) for _ in range(count)],
+        }
+        for label, queries in workloads.items():
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.suggest(query, followed, 10)
+                latencies.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"{label:<18} p50={percentile(latencies, 50):.2f}ms p99={percentile(latencies, 99):.2f}ms"
+            )
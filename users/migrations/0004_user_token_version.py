@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-17 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_create_google_social_app"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="token_version",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="version des tokens"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Index des suggestions de comptes (users/typeahead.py), PostgreSQL uniquement :
+# sous SQLite, l'index de trigrammes est tenu en mémoire.
+
+from django.db import migrations
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS users_user_username_trgm "
+        "ON users_user USING gist (lower(username) gist_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS users_user_username_prefix "
+        "ON users_user (lower(username) text_pattern_ops) INCLUDE (followers_count)"
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS users_user_username_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS users_user_username_prefix")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_user_token_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
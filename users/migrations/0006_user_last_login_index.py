@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_username_trigram_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["last_login"], name="users_user_last_login_idx"),
+        ),
+    ]
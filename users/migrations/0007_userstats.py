@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-17 23:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_user_last_login_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="utilisateur",
+                    ),
+                ),
+                ("posts_count", models.PositiveIntegerField(default=0, verbose_name="nombre de publications")),
+                ("stories_count", models.PositiveIntegerField(default=0, verbose_name="nombre de stories")),
+                ("likes_received", models.PositiveIntegerField(default=0, verbose_name="likes reçus")),
+                ("comments_received", models.PositiveIntegerField(default=0, verbose_name="commentaires reçus")),
+            ],
+            options={
+                "verbose_name": "statistiques utilisateur",
+                "verbose_name_plural": "statistiques utilisateurs",
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+from django.db.models.functions import Greatest
 from django.utils.translation import gettext_lazy as _
 
 class User(AbstractUser):
@@ -43,10 +46,17 @@ class User(AbstractUser):
     ]
     role = models.CharField(_('rôle'), max_length=20, choices=ROLE_CHOICES, default="UTILISATEUR")
 
+    # Version des tokens JWT : l'incrémenter révoque tous les tokens émis
+    token_version = models.PositiveIntegerField(_('version des tokens'), default=0)
+
     class Meta:
         verbose_name = _('utilisateur')
         verbose_name_plural = _('utilisateurs')
         ordering = ['-date_joined']
+        # Connexions par heure (social/metrics.py)
+        indexes = [
+            models.Index(fields=['last_login'], name='users_user_last_login_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -55,30 +65,71 @@ class User(AbstractUser):
         return f"{self.first_name} {self.last_name}".strip() or self.username
 
     def follow(self, user):
-        """Suivre un utilisateur"""
-        if self != user:
-            self.following.add(user)
-            self.following_count = self.following.count()
-            user.followers_count = user.followers.count()
-            self.save(update_fields=['following_count'])
-            user.save(update_fields=['followers_count'])
+        """
+        Suivre un utilisateur. Retourne True si l'abonnement a été créé, False
+        s'il existait déjà (la contrainte d'unicité tranche les courses).
+        """
+        if self.pk == user.pk:
+            return False
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    User.following.through.objects.create(from_user_id=self.pk, to_user_id=user.pk)
+            except IntegrityError:
+                return False
+            self._adjust_follow_counts(user, 1)
+            self._send_follow_changed('post_add', user)
+        return True
 
     def unfollow(self, user):
-        """Ne plus suivre un utilisateur"""
-        if self != user:
-            self.following.remove(user)
-            self.following_count = self.following.count()
-            user.followers_count = user.followers.count()
-            self.save(update_fields=['following_count'])
-            user.save(update_fields=['followers_count'])
+        """
+        Ne plus suivre un utilisateur. Retourne True si un abonnement a été supprimé.
+        """
+        if self.pk == user.pk:
+            return False
+        with transaction.atomic():
+            deleted, _ = User.following.through.objects.filter(
+                from_user_id=self.pk, to_user_id=user.pk
+            ).delete()
+            if not deleted:
+                return False
+            self._adjust_follow_counts(user, -1)
+            self._send_follow_changed('post_remove', user)
+        return True
+
+    def _send_follow_changed(self, action, user):
+        # La table d'abonnements est écrite directement : on émet le signal que
+        # following.add()/remove() auraient envoyé
+        m2m_changed.send(
+            sender=User.following.through, instance=self, action=action,
+            reverse=False, model=User, pk_set={user.pk}, using=self._state.db,
+        )
+
+    def _adjust_follow_counts(self, user, delta):
+        """Ajuster les compteurs des deux utilisateurs en base, sans recomptage"""
+        from .cache import invalidate_user
+
+        # Lignes verrouillées par ordre d'ID pour éviter les interblocages
+        # entre deux abonnements croisés
+        updates = sorted([(self.pk, 'following_count'), (user.pk, 'followers_count')])
+        for pk, field in updates:
+            User.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+        self.following_count = max(self.following_count + delta, 0)
+        user.followers_count = max(user.followers_count + delta, 0)
+
+        # update() ne déclenche pas post_save : le cache d'authentification
+        # est invalidé explicitement une fois la transaction validée
+        user_ids = [self.pk, user.pk]
+        transaction.on_commit(lambda: [invalidate_user(user_id) for user_id in user_ids])
 
     def is_following(self, user):
         """Vérifier si l'utilisateur suit un autre utilisateur"""
-        return self.following.filter(id=user.id).exists()
+        return User.following.through.objects.filter(from_user_id=self.pk, to_user_id=user.pk).exists()
 
     def is_followed_by(self, user):
         """Vérifier si l'utilisateur est suivi par un autre utilisateur"""
-        return self.followers.filter(id=user.id).exists()
+        return User.following.through.objects.filter(from_user_id=user.pk, to_user_id=self.pk).exists()
 
     def get_mutual_followers(self):
         """Obtenir les utilisateurs qui suivent mutuellement"""
@@ -89,6 +140,30 @@ class User(AbstractUser):
         self.posts_count = self.posts.count()
         self.save(update_fields=['posts_count'])
 
+class UserStats(models.Model):
+    """
+    Compteurs d'activité d'un utilisateur, tenus à jour par événements
+    (users/stats.py) et recomptés périodiquement
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name=_('utilisateur')
+    )
+    posts_count = models.PositiveIntegerField(_('nombre de publications'), default=0)
+    stories_count = models.PositiveIntegerField(_('nombre de stories'), default=0)
+    likes_received = models.PositiveIntegerField(_('likes reçus'), default=0)
+    comments_received = models.PositiveIntegerField(_('commentaires reçus'), default=0)
+
+    class Meta:
+        verbose_name = _('statistiques utilisateur')
+        verbose_name_plural = _('statistiques utilisateurs')
+
+    def __str__(self):
+        return f"Statistiques de {self.user_id}"
+
 class UserSettings(models.Model):
     """
     Paramètres utilisateur
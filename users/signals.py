@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import typeahead
+from .cache import invalidate_user
+from .models import User, UserStats
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Invalider le cache d'authentification quand un utilisateur change"""
+    invalidate_user(instance.pk)
+    # Une requête concurrente a pu remettre en cache l'ancienne version
+    # avant la fin de la transaction : on invalide à nouveau après le commit.
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def update_typeahead(sender, instance, update_fields=None, **kwargs):
+    """Répercuter un compte créé ou modifié dans l'index de suggestions du processus"""
+    if update_fields is not None and not {'username', 'is_active', 'followers_count'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: typeahead.user_changed(instance))
+
+
+@receiver(post_delete, sender=User)
+def remove_from_typeahead(sender, instance, **kwargs):
+    transaction.on_commit(lambda: typeahead.user_deleted(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Une ligne de statistiques par compte, tenue à jour ensuite par événements"""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
@@ -0,0 +1,173 @@
+"""
+Statistiques d'activité par utilisateur (UserStats).
+
+Une ligne par utilisateur, créée avec le compte et lue en une requête par
+GET /me/statistics. Les compteurs suivent les événements : publications et
+stories via les signaux de social, likes et commentaires reçus déduits des
+deltas des posts et commentaires au vidage du tampon de compteurs
+(social/counters.py). Les abonnés restent sur User (followers_count), déjà
+tenu à jour par follow()/unfollow().
+
+reconcile() recompte par tranches d'utilisateurs et corrige les lignes qui
+ont dérivé (suppressions en cascade, tampon perdu) ; la tâche Celery
+reconcile_user_stats l'exécute chaque nuit, et la commande backfill_user_stats
+crée les lignes des comptes existants au déploiement.
+
+reconcile_user_counts() fait de même pour les compteurs portés par User
+(publications, abonnés, abonnements) : une requête par tranche d'IDs
+sélectionne les lignes fausses, seules celles-ci sont verrouillées, recomptées
+et corrigées. La tâche Celery update_user_statistics l'exécute chaque nuit.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef
+
+from .models import User, UserStats
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['posts_count', 'stories_count', 'likes_received', 'comments_received']
+
+
+def _actual(user_ids):
+    """Comptes réels des utilisateurs : {user_id: {champ: total}}, une requête groupée par source"""
+    from social.models import Comment, Like, Post, Story
+
+    sources = [
+        ('posts_count', Post.objects.filter(author_id__in=user_ids), 'author_id'),
+        ('stories_count', Story.objects.filter(author_id__in=user_ids), 'author_id'),
+        ('likes_received', Like.objects.filter(post__author_id__in=user_ids), 'post__author_id'),
+        ('likes_received', Like.objects.filter(comment__author_id__in=user_ids), 'comment__author_id'),
+        ('comments_received', Comment.objects.filter(post__author_id__in=user_ids), 'post__author_id'),
+    ]
+    counts = {user_id: dict.fromkeys(FIELDS, 0) for user_id in user_ids}
+    for field, events, owner in sources:
+        for owner_id, total in events.order_by().values_list(owner).annotate(total=Count('pk')):
+            counts[owner_id][field] += total
+    return counts
+
+
+def _reconcile_chunk(user_ids):
+    """Recompter une tranche d'utilisateurs ; retourne le nombre de lignes créées ou corrigées"""
+    with transaction.atomic():
+        # Lignes verrouillées avant le comptage : un vidage concurrent attend
+        rows = {row.pk: row for row in UserStats.objects.select_for_update().filter(pk__in=user_ids)}
+        actual = _actual(user_ids)
+        missing = [UserStats(user_id=user_id, **actual[user_id]) for user_id in user_ids if user_id not in rows]
+        drifted = []
+        for user_id, row in rows.items():
+            if any(getattr(row, field) != actual[user_id][field] for field in FIELDS):
+                for field in FIELDS:
+                    setattr(row, field, actual[user_id][field])
+                drifted.append(row)
+        UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+        UserStats.objects.bulk_update(drifted, FIELDS)
+    return len(missing) + len(drifted)
+
+
+def get(user_id):
+    """Statistiques d'un utilisateur, calculées à la volée si sa ligne manque encore"""
+    from social import counters
+
+    stats = UserStats.objects.filter(pk=user_id).first()
+    if stats is None:
+        # Les deltas en attente visent une ligne absente : appliqués avant le
+        # comptage, ils ne seront pas ajoutés une seconde fois au prochain vidage
+        counters.flush()
+        _reconcile_chunk([user_id])
+        stats = UserStats.objects.get(pk=user_id)
+    return stats
+
+
+def reconcile(chunk_size=1000):
+    """
+    Recompter les statistiques de tous les utilisateurs par tranches d'IDs
+    croissants ; retourne le nombre de lignes créées ou corrigées
+    """
+    from social import counters
+
+    # Les deltas en attente sont appliqués avant de comparer
+    counters.flush()
+    repaired = 0
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not user_ids:
+            break
+        repaired += _reconcile_chunk(user_ids)
+        last_id = user_ids[-1]
+    if repaired:
+        logger.warning('%s statistiques utilisateur corrigées', repaired)
+    return repaired
+
+
+USER_FIELDS = ['posts_count', 'followers_count', 'following_count']
+
+
+def _user_counts():
+    """Sous-requêtes corrélées des compteurs de User : {champ: expression}"""
+    from social.counters import _count
+    from social.models import Post
+
+    follows = User.following.through
+    return {
+        'posts_count': _count(Post, author=OuterRef('pk')),
+        'followers_count': _count(follows, to_user=OuterRef('pk')),
+        'following_count': _count(follows, from_user=OuterRef('pk')),
+    }
+
+
+def _fix_users(user_ids):
+    """Verrouiller, recompter et corriger des utilisateurs ; retourne le nombre de lignes corrigées"""
+    from .cache import invalidate_user
+
+    actual = {f'actual_{field}': expression for field, expression in _user_counts().items()}
+    with transaction.atomic():
+        # Verrous pris par ordre d'ID, comme follow()/unfollow()
+        users = list(
+            User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk')
+            .only('pk', *USER_FIELDS).annotate(**actual)
+        )
+        fixed = []
+        for user in users:
+            if any(getattr(user, field) != getattr(user, f'actual_{field}') for field in USER_FIELDS):
+                for field in USER_FIELDS:
+                    setattr(user, field, getattr(user, f'actual_{field}'))
+                fixed.append(user)
+        User.objects.bulk_update(fixed, USER_FIELDS)
+        # bulk_update() ne déclenche pas post_save
+        fixed_ids = [user.pk for user in fixed]
+        transaction.on_commit(lambda: [invalidate_user(user_id) for user_id in fixed_ids])
+    return len(fixed)
+
+
+def reconcile_user_counts(chunk_size=5000):
+    """
+    Recompter posts_count, followers_count et following_count de tous les
+    utilisateurs par tranches d'IDs croissants, sans verrou pendant le
+    parcours ; retourne {'scanned', 'fixed', 'seconds'}
+    """
+    started = time.monotonic()
+    actual = {f'actual_{field}': expression for field, expression in _user_counts().items()}
+    scanned = fixed = 0
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not user_ids:
+            break
+        scanned += len(user_ids)
+        # Comptages groupés de la tranche en une requête, seules les lignes fausses reviennent
+        drifted = list(
+            User.objects.filter(pk__gt=last_id, pk__lte=user_ids[-1]).order_by().alias(**actual)
+            .exclude(**{field: F(f'actual_{field}') for field in USER_FIELDS})
+            .values_list('pk', flat=True)
+        )
+        if drifted:
+            fixed += _fix_users(drifted)
+        last_id = user_ids[-1]
+    report = {'scanned': scanned, 'fixed': fixed, 'seconds': round(time.monotonic() - started, 3)}
+    if fixed:
+        logger.warning('%s compteurs utilisateur corrigés', fixed)
+    return report
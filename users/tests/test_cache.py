@@ -0,0 +1,181 @@
+import time
+
+import pytest
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.test import Client
+
+from users.api import AuthBearer, generate_access_token
+from users.cache import LRUCache, clear_local_cache
+from users.models import User
+
+@pytest.fixture(autouse=True)
+def clear_auth_cache(local_cache):
+    clear_local_cache()
+    yield
+    clear_local_cache()
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        assert lru.get('a') == 1
+        lru.set('c', 3)
+        assert lru.get('b') is None
+        assert lru.get('a') == 1
+        assert lru.get('c') == 3
+
+    def test_entries_expire(self):
+        lru = LRUCache(maxsize=10, timeout=60)
+        lru.set('a', 1, timeout=0.01)
+        time.sleep(0.02)
+        assert lru.get('a') is None
+        assert len(lru) == 0
+
+    def test_delete_matching(self):
+        lru = LRUCache(maxsize=10, timeout=60)
+        lru.set((1, 0), 'a')
+        lru.set((1, 1), 'b')
+        lru.set((2, 0), 'c')
+        lru.delete_matching(lambda key: key[0] == 1)
+        assert lru.get((1, 0)) is None
+        assert lru.get((1, 1)) is None
+        assert lru.get((2, 0)) == 'c'
+
+@pytest.mark.django_db
+class TestAuthBearerCache:
+    def test_authenticate_sets_request_user(self, test_user):
+        request = HttpRequest()
+        user = AuthBearer().authenticate(request, generate_access_token(test_user))
+        assert user.id == test_user.id
+        assert request.user.id == test_user.id
+
+    def test_warm_cache_does_no_query(self, test_user, django_assert_num_queries):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        with django_assert_num_queries(1):
+            bearer.authenticate(HttpRequest(), token)
+        with django_assert_num_queries(0):
+            user = bearer.authenticate(HttpRequest(), token)
+        assert user.username == test_user.username
+
+    def test_shared_cache_survives_local_eviction(self, test_user, django_assert_num_queries):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        bearer.authenticate(HttpRequest(), token)
+        clear_local_cache()
+        with django_assert_num_queries(0):
+            assert bearer.authenticate(HttpRequest(), token).id == test_user.id
+
+    def test_save_invalidates_cache(self, test_user):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        bearer.authenticate(HttpRequest(), token)
+        test_user.bio = 'Nouvelle bio'
+        test_user.save()
+        assert bearer.authenticate(HttpRequest(), token).bio == 'Nouvelle bio'
+
+    def test_delete_invalidates_cache(self, test_user):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        bearer.authenticate(HttpRequest(), token)
+        test_user.delete()
+        assert bearer.authenticate(HttpRequest(), token) is None
+
+    def test_returns_independent_copies(self, test_user):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        first = bearer.authenticate(HttpRequest(), token)
+        first.bio = 'Modifiée en mémoire'
+        assert bearer.authenticate(HttpRequest(), token).bio == test_user.bio
+
+    def test_revoked_token_is_rejected(self, test_user):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        bearer.authenticate(HttpRequest(), token)
+        test_user.token_version += 1
+        test_user.save()
+        assert bearer.authenticate(HttpRequest(), token) is None
+        assert bearer.authenticate(HttpRequest(), generate_access_token(test_user)).id == test_user.id
+
+    def test_invalidation_reaches_other_workers(self, test_user):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        bearer.authenticate(HttpRequest(), token)
+        # Écriture sur un autre worker : son LRU et le cache partagé sont invalidés, pas le nôtre
+        User.objects.filter(id=test_user.id).update(bio='Ailleurs', token_version=1)
+        cache.clear()
+        assert bearer.authenticate(HttpRequest(), token) is None
+
+    def test_profile_update_keeps_counters(self, test_user, test_user2):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {generate_access_token(test_user)}')
+        client.get('/api/users/me')
+        # Abonnement pendant que le profil est en cache
+        test_user2.follow(test_user)
+        response = client.put('/api/users/me', {'bio': 'Nouvelle bio'}, content_type='application/json')
+        assert response.status_code == 200
+        test_user.refresh_from_db()
+        assert (test_user.bio, test_user.followers_count) == ('Nouvelle bio', 1)
+
+@pytest.mark.django_db
+class TestTokenVerificationCache:
+    def test_token_is_decoded_once(self, test_user, monkeypatch):
+        import users.cache
+        calls = []
+        real_decode = users.cache.jwt.decode
+        monkeypatch.setattr(users.cache.jwt, 'decode', lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+        token = generate_access_token(test_user)
+        bearer = AuthBearer()
+        bearer.authenticate(HttpRequest(), token)
+        bearer.authenticate(HttpRequest(), token)
+        assert len(calls) == 1
+
+    def test_invalid_token_is_not_cached(self, test_user):
+        token = generate_access_token(test_user) + 'x'
+        assert AuthBearer().authenticate(HttpRequest(), token) is None
+        assert AuthBearer().authenticate(HttpRequest(), token) is None
+
+    def test_claims_only_does_no_query(self, test_user, django_assert_num_queries):
+        token = generate_access_token(test_user)
+        AuthBearer(claims_only=True).authenticate(HttpRequest(), token)
+        request = HttpRequest()
+        with django_assert_num_queries(0):
+            user = AuthBearer(claims_only=True).authenticate(request, token)
+        assert user.id == test_user.id
+        assert user.username == test_user.username
+        assert user.role == test_user.role
+        assert not user.is_superuser
+        assert request.user is user
+
+    def test_claims_only_falls_back_for_old_tokens(self, test_user):
+        import jwt
+        from datetime import datetime, timedelta
+        from django.conf import settings
+        token = jwt.encode(
+            {'user_id': test_user.id, 'exp': datetime.utcnow() + timedelta(minutes=5)},
+            settings.SECRET_KEY, algorithm='HS256'
+        )
+        user = AuthBearer(claims_only=True).authenticate(HttpRequest(), token)
+        assert user.email == test_user.email
+
+    def test_claims_only_rejects_revoked_tokens(self, test_user):
+        token = generate_access_token(test_user)
+        bearer = AuthBearer(claims_only=True)
+        assert bearer.authenticate(HttpRequest(), token).id == test_user.id
+        test_user.token_version += 1
+        test_user.save()
+        assert bearer.authenticate(HttpRequest(), token) is None
+
+    def test_claims_only_rejects_inactive_and_deleted_users(self, test_user, test_user2):
+        bearer = AuthBearer(claims_only=True)
+        token = generate_access_token(test_user)
+        bearer.authenticate(HttpRequest(), token)
+        test_user.is_active = False
+        test_user.save()
+        assert bearer.authenticate(HttpRequest(), token) is None
+
+        token = generate_access_token(test_user2)
+        bearer.authenticate(HttpRequest(), token)
+        test_user2.delete()
+        assert bearer.authenticate(HttpRequest(), token) is None
@@ -0,0 +1,103 @@
+import random
+import threading
+
+import pytest
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+
+from users.api import follow_user
+from users.models import User
+
+
+def make_users(count):
+    return [
+        User.objects.create_user(email=f'follow{i}@example.com', username=f'follow{i}', password='testpass123')
+        for i in range(count)
+    ]
+
+
+def assert_counters_exact(users):
+    Follow = User.following.through
+    for user in User.objects.filter(id__in=[u.id for u in users]):
+        assert user.following_count == Follow.objects.filter(from_user_id=user.id).count()
+        assert user.followers_count == Follow.objects.filter(to_user_id=user.id).count()
+
+
+@pytest.mark.django_db
+class TestFollow:
+    def test_follow_and_unfollow_update_counters(self, test_user, test_user2):
+        assert test_user.follow(test_user2)
+        assert not test_user.follow(test_user2)
+        test_user.refresh_from_db()
+        test_user2.refresh_from_db()
+        assert test_user.following_count == 1
+        assert test_user2.followers_count == 1
+        assert test_user.is_following(test_user2)
+        assert test_user2.is_followed_by(test_user)
+
+        assert test_user.unfollow(test_user2)
+        assert not test_user.unfollow(test_user2)
+        test_user.refresh_from_db()
+        test_user2.refresh_from_db()
+        assert test_user.following_count == 0
+        assert test_user2.followers_count == 0
+
+    def test_cannot_follow_self(self, test_user):
+        assert not test_user.follow(test_user)
+        test_user.refresh_from_db()
+        assert test_user.following_count == 0
+
+    def test_toggle_does_not_load_followers(self, test_user, test_user2, rf):
+        # Beaucoup d'abonnés : la bascule ne doit pas dépendre de leur nombre
+        for follower in make_users(50):
+            follower.follow(test_user2)
+
+        request = rf.post(f'/api/users/users/{test_user2.id}/follow')
+        request.user = test_user
+        with CaptureQueriesContext(connection) as queries:
+            response = follow_user(request, test_user2.id)
+        assert response['action'] == 'followed'
+        # Ni jointure sur les abonnés, ni recomptage
+        assert not any('JOIN "users_user_following"' in q['sql'] for q in queries)
+        assert not any('COUNT(' in q['sql'] for q in queries)
+
+        response = follow_user(request, test_user2.id)
+        assert response['action'] == 'unfollowed'
+        test_user2.refresh_from_db()
+        assert test_user2.followers_count == 50
+
+
+@pytest.mark.django_db(transaction=True)
+class TestFollowConcurrency:
+    def test_counters_stay_exact_under_concurrent_toggles(self):
+        users = make_users(6)
+        errors = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(40):
+                    follower, followed = rng.sample(users, 2)
+                    action = follower.follow if rng.random() < 0.5 else follower.unfollow
+                    # SQLite sérialise les écritures : on rejoue une opération
+                    # refusée pour verrou, elle a été annulée en bloc
+                    for _ in range(50):
+                        try:
+                            action(followed)
+                            break
+                        except OperationalError:
+                            continue
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert_counters_exact(users)
@@ -0,0 +1,79 @@
+import pytest
+
+from users import typeahead
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(local_cache):
+    typeahead.reset()
+    yield
+    typeahead.reset()
+
+
+def make_users(*specs):
+    """Comptes (nom, abonnés)"""
+    users = [
+        User.objects.create_user(email=f'{name}@example.com', username=name, password='x')
+        for name, _ in specs
+    ]
+    for user, (_, followers) in zip(users, specs):
+        User.objects.filter(pk=user.pk).update(followers_count=followers)
+    return users
+
+
+def usernames(client, q, **params):
+    response = client.get('/api/users/users/typeahead', {'q': q, **params})
+    assert response.status_code == 200
+    return [item['username'] for item in response.json()]
+
+
+def test_trigrams():
+    assert typeahead.trigrams('Cat') == {'  c', ' ca', 'cat', 'at '}
+    assert typeahead.trigrams('a_b') == {'  a', ' a ', '  b', ' b '}
+
+
+@pytest.mark.django_db
+class TestTypeahead:
+    def test_prefix_before_similarity_then_followers(self, client):
+        make_users(('martin', 5), ('martine', 50), ('marin', 500), ('paul', 1000))
+        # marin, le plus suivi, ne commence pas par la saisie
+        assert usernames(client, 'mart') == ['martin', 'martine', 'marin']
+        # Faute de frappe : plus de préfixe, la similarité classe
+        assert usernames(client, 'martni') == ['martin', 'martine', 'marin']
+        assert usernames(client, 'MARTIN') == ['martin', 'martine', 'marin']
+
+    def test_followed_accounts_are_boosted(self, client, test_user):
+        jean_dupont, jean_durand = make_users(('jean_dupont', 10), ('jean_durand', 1000))
+        assert usernames(client, 'jean') == ['jean_durand', 'jean_dupont']
+        test_user.follow(jean_dupont)
+        response = client.get('/api/users/users/typeahead', {'q': '@jean'}).json()
+        assert [item['username'] for item in response] == ['jean_dupont', 'jean_durand']
+        assert [item['is_following'] for item in response] == [True, False]
+
+    def test_viewer_and_inactive_accounts_are_hidden(self, client, test_user2):
+        test_user2.is_active = False
+        test_user2.save()
+        assert usernames(client, 'testuser') == []
+
+    def test_limit(self, client, settings):
+        settings.TYPEAHEAD_MAX_RESULTS = 3
+        make_users(*[(f'lea{i}', i) for i in range(6)])
+        assert usernames(client, 'lea', limit=2) == ['lea5', 'lea4']
+        assert len(usernames(client, 'lea', limit=50)) == 3
+
+    def test_writes_reach_loaded_index(self, client, test_user2, django_capture_on_commit_callbacks):
+        assert usernames(client, 'testuser') == ['testuser2']
+        with django_capture_on_commit_callbacks(execute=True):
+            make_users(('testuser3', 0))
+            test_user2.username = 'renamed'
+            test_user2.save()
+        assert usernames(client, 'testuser') == ['testuser3']
+        assert usernames(client, 'renamed') == ['renamed']
+
+    def test_new_accounts_are_read_back(self, client, settings):
+        settings.TYPEAHEAD_REFRESH_INTERVAL = 0
+        assert usernames(client, 'zoe') == []
+        # Créé par un autre processus : pas de signal ici
+        User.objects.bulk_create([User(email='zoe@example.com', username='zoe')])
+        assert usernames(client, 'zoe') == ['zoe']
@@ -0,0 +1,132 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from social import counters, likes
+from social.models import Comment, Like, Post, Story
+from users import stats
+from users.api import generate_access_token
+from users.models import User, UserStats
+from yoursocial.celery import update_user_statistics
+
+
+pytestmark = pytest.mark.usefixtures('local_buffer')
+
+
+def counts(user):
+    row = UserStats.objects.get(pk=user.pk)
+    return {field: getattr(row, field) for field in stats.FIELDS}
+
+
+@pytest.mark.django_db
+class TestUserStats:
+    def test_row_created_with_account(self, test_user):
+        assert counts(test_user) == dict.fromkeys(stats.FIELDS, 0)
+
+    def test_events_update_counts_on_flush(self, test_user, test_user2, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            post = Post.objects.create(author=test_user2, content='p')
+            Story.objects.create(author=test_user2, content='s.jpg', content_type='image')
+            comment = Comment.objects.create(post=post, author=test_user, content='c')
+            likes.insert_likes(test_user.id, 'post', [post.id])
+            likes.insert_likes(test_user2.id, 'comment', [comment.id])
+        counters.flush()
+        assert counts(test_user2) == {
+            'posts_count': 1, 'stories_count': 1, 'likes_received': 1, 'comments_received': 1,
+        }
+        assert counts(test_user)['likes_received'] == 1
+
+        # Suppression d'un post relu en base, comme le fait l'API
+        with django_capture_on_commit_callbacks(execute=True):
+            Post.objects.get(pk=post.pk).delete()
+        counters.flush()
+        assert counts(test_user2) == {
+            'posts_count': 0, 'stories_count': 1, 'likes_received': 0, 'comments_received': 0,
+        }
+
+    def test_reconcile_repairs_drift_and_missing_rows(self, test_user, test_user2):
+        post = Post.objects.create(author=test_user2, content='p')
+        Like.objects.create(user=test_user, post=post)
+        Comment.objects.create(post=post, author=test_user, content='c')
+        UserStats.objects.filter(pk=test_user2.pk).update(likes_received=7)
+        UserStats.objects.filter(pk=test_user.pk).delete()
+
+        assert stats.reconcile(chunk_size=1) == 2
+        assert counts(test_user2) == {
+            'posts_count': 1, 'stories_count': 0, 'likes_received': 1, 'comments_received': 1,
+        }
+        assert counts(test_user) == dict.fromkeys(stats.FIELDS, 0)
+        assert stats.reconcile() == 0
+
+    def test_missing_row_is_not_counted_twice(self, test_user2, django_capture_on_commit_callbacks):
+        UserStats.objects.filter(pk=test_user2.pk).delete()
+        with django_capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=test_user2, content='p')
+        assert stats.get(test_user2.id).posts_count == 1
+        counters.flush()
+        assert counts(test_user2)['posts_count'] == 1
+
+    def test_backfill_command(self, test_user, test_user2):
+        Post.objects.create(author=test_user2, content='p')
+        UserStats.objects.all().delete()
+        output = io.StringIO()
+        call_command('backfill_user_stats', stdout=output)
+        assert output.getvalue().startswith('2 lignes')
+        assert counts(test_user2)['posts_count'] == 1
+
+
+@pytest.mark.django_db
+class TestUserCounts:
+    def test_task_fixes_drifted_users_in_chunks(self, test_user, test_user2):
+        Post.objects.create(author=test_user, content='p')
+        test_user.follow(test_user2)
+        User.objects.filter(pk=test_user.pk).update(posts_count=5, following_count=0)
+        User.objects.filter(pk=test_user2.pk).update(followers_count=3)
+
+        report = stats.reconcile_user_counts(chunk_size=1)
+        assert (report['scanned'], report['fixed']) == (2, 2)
+        assert User.objects.filter(pk=test_user.pk).values_list(*stats.USER_FIELDS).get() == (1, 0, 1)
+        assert User.objects.filter(pk=test_user2.pk).values_list(*stats.USER_FIELDS).get() == (0, 1, 0)
+
+    def test_consistent_chunks_are_only_read(self, test_user, test_user2):
+        Post.objects.create(author=test_user, content='p')
+        User.objects.filter(pk=test_user.pk).update(posts_count=1)
+        with CaptureQueriesContext(connection) as queries:
+            report = update_user_statistics()
+        assert (report['scanned'], report['fixed']) == (2, 0)
+        # Une requête d'IDs et une requête de comptage par tranche, plus la tranche vide
+        assert len(queries) == 3
+        assert not [q for q in queries if q['sql'].startswith('UPDATE') or 'FOR UPDATE' in q['sql']]
+
+
+@pytest.mark.django_db
+class TestStatisticsEndpoint:
+    url = '/api/users/me/statistics'
+
+    def test_reads_materialised_counts_with_etag(self, test_user, test_user2):
+        post = Post.objects.create(author=test_user, content='p')
+        Like.objects.create(user=test_user2, post=post)
+        stats.reconcile()
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {generate_access_token(test_user)}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        assert response.status_code == 200
+        assert response.json()['likes_received'] == 1
+        assert response.json()['posts_count'] == 1
+        assert response['Cache-Control'] == 'private, no-cache'
+        assert not [q for q in queries if 'social_like' in q['sql']]
+
+        etag = response['ETag']
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+
+        UserStats.objects.filter(pk=test_user.pk).update(comments_received=3)
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
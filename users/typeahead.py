@@ -0,0 +1,264 @@
+"""
+Suggestions de comptes pendant la saisie d'un nom d'utilisateur.
+
+Classement : les noms qui commencent par la saisie d'abord, puis par
+similarité de trigrammes (fautes de frappe, mots dans le désordre), puis par
+nombre d'abonnés. Les comptes déjà suivis par l'utilisateur reçoivent
+TYPEAHEAD_FOLLOW_BOOST de similarité en plus.
+
+Les trigrammes suivent pg_trgm : chaque mot (lettres et chiffres) est
+complété de deux espaces devant et d'un derrière. Sous PostgreSQL, la
+recherche utilise pg_trgm (index GiST sur lower(username), migration 0005) ;
+sous SQLite, un index inversé de trigrammes tenu en mémoire par chaque
+processus. Ce dernier est reconstruit toutes les TYPEAHEAD_REBUILD_INTERVAL
+secondes, complété entre-temps des comptes créés depuis (relus toutes les
+TYPEAHEAD_REFRESH_INTERVAL secondes) et des écritures du processus.
+"""
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .models import User
+
+
+def trigrams(text):
+    """Trigrammes d'un texte, à la manière de pg_trgm"""
+    grams = set()
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _upper_bound(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _rank_key(is_prefix, similarity, followed, followers):
+    """Clé de tri croissante : préfixe, puis similarité (bonus si suivi), puis abonnés"""
+    return (not is_prefix, -(similarity + settings.TYPEAHEAD_FOLLOW_BOOST * followed), -followers)
+
+
+class TrigramIndex:
+    """
+    Noms d'utilisateur triés et listes de positions par trigramme (tableaux
+    NumPy). Les comptes créés ou renommés depuis la construction sont gardés
+    à part dans `recent` et parcourus un par un.
+    """
+
+    def __init__(self, rows):
+        rows = sorted((username.lower(), pk, followers) for pk, username, followers in rows)
+        self.names = [name for name, _, _ in rows]
+        self.ids = np.array([pk for _, pk, _ in rows], dtype=np.int64)
+        self.followers = np.array([followers for _, _, followers in rows], dtype=np.int64)
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.by_id = np.argsort(self.ids, kind='stable')
+        self.watermark = int(self.ids.max()) if len(rows) else 0
+
+        postings = defaultdict(list)
+        self.sizes = np.empty(len(rows), dtype=np.int32)
+        for position, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.sizes[position] = len(grams)
+            for gram in grams:
+                postings[gram].append(position)
+        self.postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+        # id -> (nom en minuscules, abonnés)
+        self.recent = {}
+        self._lock = threading.Lock()
+
+    def _position(self, user_id):
+        i = np.searchsorted(self.ids, user_id, sorter=self.by_id)
+        if i < len(self.ids) and self.ids[self.by_id[i]] == user_id:
+            return self.by_id[i]
+        return None
+
+    def _positions(self, user_ids):
+        """Positions triées des comptes `user_ids` présents dans les tableaux"""
+        if not len(self.ids):
+            return np.empty(0, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.ids, user_ids, sorter=self.by_id), len(self.ids) - 1)
+        positions = self.by_id[found]
+        return np.sort(positions[self.ids[positions] == user_ids])
+
+    def update(self, user_id, username, followers):
+        """Ajouter ou modifier un compte"""
+        with self._lock:
+            position = self._position(user_id)
+            if position is not None:
+                self.alive[position] = False
+            self.recent[user_id] = (username.lower(), followers)
+            self.watermark = max(self.watermark, user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            position = self._position(user_id)
+            if position is not None:
+                self.alive[position] = False
+            self.recent.pop(user_id, None)
+
+    def _rank(self, candidates, common, size, followed, is_prefix, limit, min_similarity=0.0):
+        """[(clé de tri, id)] des `limit` meilleurs candidats, `common` trigrammes partagés avec la saisie"""
+        similarity = common / np.maximum(size + self.sizes[candidates] - common, 1)
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        # `followed` : positions triées des comptes suivis
+        found = np.minimum(np.searchsorted(followed, candidates), max(len(followed) - 1, 0))
+        is_followed = followed[found] == candidates if len(followed) else np.zeros(len(candidates), dtype=bool)
+        followers = self.followers[candidates]
+        # Clé numérique équivalente à _rank_key ; les abonnés ne départagent
+        # que des similarités égales (écarts d'au moins 1e-4 entre noms courts)
+        score = similarity + settings.TYPEAHEAD_FOLLOW_BOOST * is_followed
+        key = -(score + followers / (float(followers.max(initial=0)) + 1) * 1e-6)
+        if len(key) > limit:
+            top = np.argpartition(key, limit)[:limit]
+            top = top[np.argsort(key[top], kind='stable')]
+        else:
+            top = np.argsort(key, kind='stable')
+        return [
+            (_rank_key(is_prefix, similarity[i], is_followed[i], followers[i]), int(self.ids[candidates[i]]))
+            for i in top
+        ]
+
+    def suggest(self, term, followed=(), limit=10):
+        """IDs des comptes les mieux classés pour la saisie `term`"""
+        term = term.lower()
+        grams = trigrams(term)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        min_similarity = settings.TYPEAHEAD_MIN_SIMILARITY
+        followed_ids = np.fromiter(followed, dtype=np.int64)
+        followed = self._positions(followed_ids)
+
+        # Préfixe : tranche contiguë de la liste triée. Les listes de positions
+        # étant triées, les trigrammes communs s'y comptent sur la tranche seule.
+        lo = bisect_left(self.names, term)
+        hi = bisect_left(self.names, _upper_bound(term), lo)
+        counts = np.zeros(hi - lo, dtype=np.int64)
+        for positions in lists:
+            inside = positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)]
+            counts[inside - lo] += 1
+        candidates = np.arange(lo, hi)
+        alive = self.alive[candidates]
+        ranked = self._rank(candidates[alive], counts[alive], len(grams), followed, True, limit)
+
+        # Les préfixes passent avant tout le reste : la similarité ne sert que
+        # s'ils ne suffisent pas à remplir la page
+        if len(ranked) < limit and lists:
+            counts = np.bincount(np.concatenate(lists), minlength=len(self.names))
+            counts[lo:hi] = 0
+            # Similarité au plus commun / |trigrammes de la saisie|
+            candidates = np.flatnonzero(counts >= max(math.ceil(min_similarity * len(grams)), 1))
+            candidates = candidates[self.alive[candidates]]
+            ranked += self._rank(candidates, counts[candidates], len(grams), followed, False, limit, min_similarity)
+
+        # Comptes récents, hors des tableaux
+        followed_ids = set(followed_ids.tolist())
+        for user_id, (name, user_followers) in list(self.recent.items()):
+            name_grams = trigrams(name)
+            common = len(grams & name_grams)
+            name_similarity = common / max(len(grams | name_grams), 1)
+            if name.startswith(term) or name_similarity >= min_similarity:
+                key = _rank_key(name.startswith(term), name_similarity, user_id in followed_ids, user_followers)
+                ranked.append((key, user_id))
+        ranked.sort()
+        return [user_id for _, user_id in ranked[:limit]]
+
+
+class PostgresTypeahead:
+    """pg_trgm : candidats par préfixe (index text_pattern_ops) et par distance de trigrammes (index GiST)"""
+
+    def suggest(self, term, followed=(), limit=10):
+        term = term.lower()
+        prefix = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id FROM (
+                    (SELECT id, username, followers_count FROM users_user
+                     WHERE is_active AND lower(username) LIKE %(prefix)s
+                     ORDER BY followers_count DESC LIMIT %(candidates)s)
+                    UNION
+                    (SELECT id, username, followers_count FROM users_user WHERE is_active
+                     ORDER BY lower(username) <-> %(term)s LIMIT %(candidates)s)
+                    UNION
+                    (SELECT id, username, followers_count FROM users_user WHERE is_active AND id = ANY(%(followed)s))
+                ) candidates
+                WHERE lower(username) LIKE %(prefix)s OR similarity(lower(username), %(term)s) >= %(min)s
+                ORDER BY lower(username) LIKE %(prefix)s DESC,
+                         similarity(lower(username), %(term)s)
+                         + CASE WHEN id = ANY(%(followed)s) THEN %(boost)s ELSE 0 END DESC,
+                         followers_count DESC
+                LIMIT %(limit)s
+                """,
+                {
+                    'prefix': prefix, 'term': term, 'followed': list(followed),
+                    'candidates': settings.TYPEAHEAD_CANDIDATES, 'min': settings.TYPEAHEAD_MIN_SIMILARITY,
+                    'boost': settings.TYPEAHEAD_FOLLOW_BOOST, 'limit': limit,
+                },
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+# Index du processus (SQLite), chargé au premier appel
+_index = None
+_built_at = 0.0
+_refreshed_at = 0.0
+_load_lock = threading.Lock()
+
+
+def _rows(**filters):
+    return User.objects.filter(is_active=True, **filters).values_list('id', 'username', 'followers_count')
+
+
+def get_index():
+    """Retourner l'index du processus, reconstruit ou complété s'il est ancien"""
+    global _index, _built_at, _refreshed_at
+    now = time.monotonic()
+    if _index is None or now - _built_at >= settings.TYPEAHEAD_REBUILD_INTERVAL:
+        with _load_lock:
+            if _index is None or now - _built_at >= settings.TYPEAHEAD_REBUILD_INTERVAL:
+                _index = TrigramIndex(_rows().iterator(chunk_size=10000))
+                _built_at = _refreshed_at = now
+    elif now - _refreshed_at >= settings.TYPEAHEAD_REFRESH_INTERVAL:
+        _refreshed_at = now
+        for user_id, username, followers in _rows(id__gt=_index.watermark):
+            _index.update(user_id, username, followers)
+    return _index
+
+
+def reset():
+    global _index, _built_at, _refreshed_at
+    _index, _built_at, _refreshed_at = None, 0.0, 0.0
+
+
+def user_changed(user):
+    """Répercuter l'écriture d'un compte dans l'index du processus, s'il est chargé"""
+    if _index is None:
+        return
+    if user.is_active:
+        _index.update(user.pk, user.username, user.followers_count)
+    else:
+        _index.remove(user.pk)
+
+
+def user_deleted(user_id):
+    if _index is not None:
+        _index.remove(user_id)
+
+
+def suggest(term, followed=(), limit=10):
+    """IDs des comptes suggérés pour la saisie `term`, les plus pertinents d'abord ; `followed` reçoit le bonus"""
+    term = term.strip().lstrip('@')
+    if not term:
+        return []
+    if connection.vendor == 'postgresql':
+        return PostgresTypeahead().suggest(term, followed, limit)
+    return get_index().suggest(term, followed, limit)
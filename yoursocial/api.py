@@ -1,13 +1,19 @@
 from ninja import NinjaAPI, Router, Schema
+from ninja.errors import HttpError
 from ninja.security import HttpBearer
 from django.conf import settings
-from django.db.models import Q, Count
-from typing import List, Optional
-from datetime import datetime, timedelta
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from typing import Dict, List, Optional
+from datetime import datetime
+from functools import partial
 
 from users.models import User
+from social import search, search_cache, statistics
 from social.models import Post, Story
 from users.api import AuthBearer  # Import de notre classe AuthBearer personnalisée
+from yoursocial.pagination import set_next_cursor
 
 # Création de l'instance API avec la configuration CORS
 api = NinjaAPI(
@@ -32,6 +38,12 @@ class SearchResultSchema(Schema):
     created_at: datetime
     relevance_score: float
 
+class SearchCacheStatsSchema(Schema):
+    hits: int
+    misses: int
+    hit_rate: float
+    timeout: int
+
 class StatisticsSchema(Schema):
     total_users: int
     total_posts: int
@@ -40,128 +52,99 @@ class StatisticsSchema(Schema):
     new_posts_24h: int
     new_stories_24h: int
     popular_hashtags: List[dict]
+    # Date de l'instantané servi et son âge en secondes
+    created_at: datetime
+    age_seconds: float
 
-# Routes de recherche globale
-@global_router.get("/search", response=List[SearchResultSchema], auth=AuthBearer())
-def global_search(request, query: str, page: int = 1, limit: int = 20):
-    start = (page - 1) * limit
-    end = start + limit
-    
-    results = []
-    
-    # Recherche d'utilisateurs
-    users = User.objects.filter(
-        Q(username__icontains=query) |
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(bio__icontains=query)
-    ).select_related('avatar')[:limit]
-    
-    for user in users:
-        results.append({
+# Hydratation des résultats de recherche : {id: résultat} des documents visibles
+def _user_results(ids):
+    return {
+        user.id: {
             'type': 'user',
             'id': user.id,
             'title': user.username,
             'description': user.bio,
             'image': user.avatar.url if user.avatar else None,
             'created_at': user.date_joined,
-            'relevance_score': 1.0  # À améliorer avec un système de scoring
-        })
-    
-    # Recherche de posts
+        }
+        for user in User.objects.filter(id__in=ids)
+    }
+
+def _post_results(viewer, ids):
+    # Les posts privés des autres ne sont pas exposés
     posts = Post.objects.filter(
-        Q(content__icontains=query) |
-        Q(hashtags__contains=[query])
-    ).select_related('author', 'media')[:limit]
-    
-    for post in posts:
-        results.append({
+        Q(is_private=False) | Q(author=viewer), id__in=ids
+    ).select_related('author')
+    return {
+        post.id: {
             'type': 'post',
             'id': post.id,
             'title': f"Post de {post.author.username}",
             'description': post.content[:100] + '...' if len(post.content) > 100 else post.content,
             'image': post.media.url if post.media else None,
             'created_at': post.created_at,
-            'relevance_score': 0.8
-        })
-    
-    # Recherche de stories
-    stories = Story.objects.filter(
-        Q(caption__icontains=query) |
-        Q(hashtags__contains=[query])
-    ).filter(
-        expires_at__gt=datetime.now()
-    ).select_related('author', 'content')[:limit]
-    
-    for story in stories:
-        results.append({
+        }
+        for post in posts
+    }
+
+def _story_results(ids):
+    stories = Story.objects.filter(id__in=ids, expires_at__gt=timezone.now()).select_related('author')
+    return {
+        story.id: {
             'type': 'story',
             'id': story.id,
             'title': f"Story de {story.author.username}",
             'description': story.caption,
             'image': story.content.url if story.content else None,
             'created_at': story.created_at,
-            'relevance_score': 0.7
-        })
-    
-    # Trier par score de pertinence et date
-    results.sort(key=lambda x: (-x['relevance_score'], -x['created_at'].timestamp()))
-    
-    return results[start:end]
+        }
+        for story in stories
+    }
+
+# Routes de recherche globale
+@global_router.get("/search", response=List[SearchResultSchema], auth=AuthBearer())
+def global_search(request, response: HttpResponse, query: str, page: int = 1, limit: int = 20,
+                  cursor: Optional[str] = None, debug: bool = False):
+    # Index plein texte de chaque type, interrogés en parallèle et fusionnés
+    # par score normalisé (social/search.py) ; page suivante via X-Next-Cursor
+    sources = {
+        'users': _user_results,
+        'posts': partial(_post_results, request.user),
+        'stories': _story_results,
+    }
+    skip = 0 if cursor else (page - 1) * limit
+    run = partial(search.federated_search, query, sources, limit, cursor, skip)
+    if debug:
+        # Mesure des index : sans le cache
+        results, next_cursor, timings = run()
+    else:
+        results, next_cursor, timings = search_cache.get_or_compute(
+            'global', list(sources), (' '.join(search.terms(query)), cursor, skip, limit), run,
+            settings.SEARCH_CACHE_TIMEOUT, viewer_id=request.user.id,
+        )
+    if next_cursor:
+        set_next_cursor(response, next_cursor)
+    if debug:
+        response['Server-Timing'] = ', '.join(f'{kind};dur={duration:.2f}' for kind, duration in timings.items())
+    return results
+
+@global_router.get("/search/cache-stats", response=Dict[str, SearchCacheStatsSchema], auth=AuthBearer())
+def search_cache_stats(request):
+    # Réservé aux administrateurs : taux de succès du cache pour régler les durées
+    if not request.user.is_superuser:
+        raise HttpError(403, "Réservé aux administrateurs")
+    timeouts = {'global': settings.SEARCH_CACHE_TIMEOUT, 'users': settings.SEARCH_USERS_CACHE_TIMEOUT}
+    return {name: {**counts, 'timeout': timeouts[name]} for name, counts in search_cache.stats().items()}
 
 # Routes pour les statistiques
 @global_router.get("/statistics", response=StatisticsSchema, auth=AuthBearer())
 def get_statistics(request):
-    # Statistiques de base
-    total_users = User.objects.count()
-    total_posts = Post.objects.count()
-    total_stories = Story.objects.count()
-    
-    # Statistiques des dernières 24h
-    active_users_24h = User.objects.filter(
-        last_login__gte=datetime.now() - timedelta(days=1)
-    ).count()
-    
-    new_posts_24h = Post.objects.filter(
-        created_at__gte=datetime.now() - timedelta(days=1)
-    ).count()
-    
-    new_stories_24h = Story.objects.filter(
-        created_at__gte=datetime.now() - timedelta(days=1)
-    ).count()
-    
-    # Hashtags populaires
-    hashtags = Post.objects.exclude(
-        hashtags__isnull=True
-    ).values_list(
-        'hashtags', flat=True
-    )
-    
-    hashtag_counts = {}
-    for tags in hashtags:
-        for tag in tags:
-            if tag not in hashtag_counts:
-                hashtag_counts[tag] = 0
-            hashtag_counts[tag] += 1
-    
-    popular_hashtags = [
-        {'tag': tag, 'count': count}
-        for tag, count in sorted(
-            hashtag_counts.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:10]
-    ]
-    
-    return {
-        'total_users': total_users,
-        'total_posts': total_posts,
-        'total_stories': total_stories,
-        'active_users_24h': active_users_24h,
-        'new_posts_24h': new_posts_24h,
-        'new_stories_24h': new_stories_24h,
-        'popular_hashtags': popular_hashtags
-    }
+    # Dernier instantané écrit par la tâche generate_statistics (social/statistics.py)
+    snapshot = statistics.latest()
+    if snapshot is None:
+        raise HttpError(503, "Statistiques en cours de calcul, réessayez dans un instant")
+    snapshot.age_seconds = (timezone.now() - snapshot.created_at).total_seconds()
+    return snapshot
 
 # Importation et inclusion des routeurs après la création de l'API
 from users.api import router as users_router
@@ -1,7 +1,12 @@
+import logging
 import os
 from celery import Celery
 from django.conf import settings
 
+# Logger de l'application (et non get_task_logger) : il suit la configuration
+# LOGGING de Django, niveaux et handler en file d'attente compris
+logger = logging.getLogger(__name__)
+
 # Définir le module de paramètres par défaut pour Celery
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yoursocial.settings')
 
@@ -53,7 +58,7 @@ app.conf.update(
 # Tâche de test
 @app.task(bind=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
+    logger.debug('Request: %r', self.request)
     return 'Tâche de test exécutée avec succès'
 
 # Tâche pour nettoyer les stories expirées
@@ -70,43 +75,21 @@ def cleanup_expired_stories():
     count = expired_stories.count()
     expired_stories.delete()
     
-    print(f'{count} stories expirées ont été supprimées')
+    logger.info('%s stories expirées ont été supprimées', count)
     return count
 
 # Tâche pour mettre à jour les statistiques utilisateur
-@app.task
+@app.task(soft_time_limit=settings.RECONCILE_SOFT_TIME_LIMIT, time_limit=settings.RECONCILE_TIME_LIMIT)
 def update_user_statistics():
-    """Mettre à jour les statistiques de tous les utilisateurs"""
-    from users.models import User
-    from django.db.models import Count
-    
-    users = User.objects.all()
-    updated_count = 0
-    
-    for user in users:
-        # Mettre à jour le nombre de posts
-        posts_count = user.posts.count()
-        if user.posts_count != posts_count:
-            user.posts_count = posts_count
-            user.save(update_fields=['posts_count'])
-            updated_count += 1
-        
-        # Mettre à jour le nombre de followers
-        followers_count = user.followers.count()
-        if user.followers_count != followers_count:
-            user.followers_count = followers_count
-            user.save(update_fields=['followers_count'])
-            updated_count += 1
-        
-        # Mettre à jour le nombre de following
-        following_count = user.following.count()
-        if user.following_count != following_count:
-            user.following_count = following_count
-            user.save(update_fields=['following_count'])
-            updated_count += 1
+    """Recompter les publications, abonnés et abonnements et corriger les compteurs faux"""
+    from users.stats import reconcile_user_counts
     
-    print(f'Statistiques mises à jour pour {updated_count} utilisateurs')
-    return updated_count
+    report = reconcile_user_counts()
+    logger.info(
+        'Statistiques utilisateur : %s lignes parcourues, %s corrigées en %ss',
+        report['scanned'], report['fixed'], report['seconds'],
+    )
+    return report
 
 # Tâche pour envoyer un digest de notifications
 @app.task
@@ -164,12 +147,88 @@ def send_notification_digest():
                     fail_silently=False,
                 )
                 sent_count += 1
-            except Exception as e:
-                print(f'Erreur lors de l\'envoi de l\'email à {user.email}: {e}')
+            except Exception:
+                logger.exception("Erreur lors de l'envoi de l'email à %s", user.email)
     
-    print(f'Digest de notifications envoyé à {sent_count} utilisateurs')
+    logger.info('Digest de notifications envoyé à %s utilisateurs', sent_count)
     return sent_count
 
+# Tâche de diffusion d'un nouveau post dans les timelines
+@app.task
+def fan_out_post(post_id):
+    """Pousser un post dans les timelines matérialisées de l'auteur et de ses abonnés"""
+    from social.feed import fan_out
+    
+    pushed = fan_out(post_id)
+    logger.debug('Post %s diffusé dans %s timelines', post_id, pushed)
+    return pushed
+
+# Tâche pour appliquer les compteurs de likes et commentaires en attente
+@app.task
+def flush_counters():
+    """Vider le tampon des compteurs dans la base"""
+    from social.counters import flush
+    
+    updated = flush()
+    logger.debug('%s compteurs appliqués', updated)
+    return updated
+
+# Tâche pour corriger la dérive des compteurs
+@app.task(soft_time_limit=settings.RECONCILE_SOFT_TIME_LIMIT, time_limit=settings.RECONCILE_TIME_LIMIT)
+def reconcile_counters():
+    """Recompter les likes et commentaires et corriger les compteurs faux"""
+    from social.counters import reconcile
+    
+    return reconcile()
+
+# Tâche pour corriger la dérive des statistiques par utilisateur
+@app.task(soft_time_limit=settings.RECONCILE_SOFT_TIME_LIMIT, time_limit=settings.RECONCILE_TIME_LIMIT)
+def reconcile_user_stats():
+    """Recompter les statistiques UserStats et corriger les lignes fausses"""
+    from users.stats import reconcile
+    
+    return reconcile()
+
+# Tâche pour recalculer les classements de tendances
+@app.task
+def refresh_trending():
+    """Recalculer les classements de tendances de toutes les fenêtres"""
+    from social.trending import refresh
+    
+    refresh()
+
+# Tâche pour publier l'index d'autocomplétion des hashtags
+@app.task
+def snapshot_hashtag_index():
+    """Enregistrer l'index des hashtags dans le cache pour le démarrage des workers"""
+    from social.autocomplete import snapshot
+    
+    count = snapshot()
+    logger.info("Index d'autocomplétion enregistré: %s hashtags", count)
+    return count
+
+# Tâche pour recalculer les scores de popularité depuis les tables sources
+@app.task
+def recompute_hot_scores():
+    """Rescorer les posts récents depuis leurs likes et commentaires"""
+    from social.hot import recompute
+    
+    changed = recompute()
+    logger.info('%s scores de popularité corrigés', changed)
+    return changed
+
+# Tâche pour agréger les métriques d'activité par heure
+@app.task
+def rollup_metrics():
+    """Agréger les heures closes récentes pas encore agrégées (MetricBucket)"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from social.metrics import rollup
+    
+    hours = rollup(timezone.now() - timedelta(hours=settings.METRICS_ROLLUP_CATCHUP_HOURS))
+    logger.info('%s heures de métriques agrégées', hours)
+    return hours
+
 # Tâche pour traiter les uploads de médias
 @app.task
 def process_media_upload(file_path, media_type, user_id):
@@ -198,71 +257,22 @@ def process_media_upload(file_path, media_type, user_id):
                 # Sauvegarder l'image optimisée
                 img.save(file_path, 'JPEG', quality=85, optimize=True)
         
-        print(f'Média traité avec succès: {file_path}')
+        logger.info('Média traité avec succès: %s', file_path)
         return True
         
-    except Exception as e:
-        print(f'Erreur lors du traitement du média {file_path}: {e}')
+    except Exception:
+        logger.exception('Erreur lors du traitement du média %s', file_path)
         return False
 
 # Tâche pour générer des statistiques
 @app.task
 def generate_statistics():
-    """Générer des statistiques globales"""
-    from django.db.models import Count
-    from django.utils import timezone
-    from users.models import User
-    from social.models import Post, Story, Like, Comment
-    from messaging.models import Message, Conversation
-    from notifications.models import Notification
-    
-    # Statistiques de base
-    stats = {
-        'total_users': User.objects.count(),
-        'total_posts': Post.objects.count(),
-        'total_stories': Story.objects.count(),
-        'total_likes': Like.objects.count(),
-        'total_comments': Comment.objects.count(),
-        'total_messages': Message.objects.count(),
-        'total_conversations': Conversation.objects.count(),
-        'total_notifications': Notification.objects.count(),
-    }
-    
-    # Statistiques des dernières 24h
-    yesterday = timezone.now() - timezone.timedelta(days=1)
-    stats.update({
-        'new_users_24h': User.objects.filter(date_joined__gte=yesterday).count(),
-        'new_posts_24h': Post.objects.filter(created_at__gte=yesterday).count(),
-        'new_stories_24h': Story.objects.filter(created_at__gte=yesterday).count(),
-        'new_likes_24h': Like.objects.filter(created_at__gte=yesterday).count(),
-        'new_comments_24h': Comment.objects.filter(created_at__gte=yesterday).count(),
-        'new_messages_24h': Message.objects.filter(created_at__gte=yesterday).count(),
-    })
-    
-    # Utilisateurs actifs (connectés dans les dernières 24h)
-    stats['active_users_24h'] = User.objects.filter(
-        last_login__gte=yesterday
-    ).count()
-    
-    # Hashtags populaires
-    hashtags = Post.objects.exclude(
-        hashtags__isnull=True
-    ).values_list('hashtags', flat=True)
-    
-    hashtag_counts = {}
-    for tags in hashtags:
-        for tag in tags:
-            hashtag_counts[tag] = hashtag_counts.get(tag, 0) + 1
-    
-    stats['popular_hashtags'] = sorted(
-        hashtag_counts.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )[:10]
+    """Enregistrer un instantané des statistiques globales (servi par GET /statistics)"""
+    from social.statistics import take_snapshot
     
-    # Sauvegarder les statistiques (vous pourriez créer un modèle pour cela)
-    print('Statistiques générées:', stats)
-    return stats
+    snapshot = take_snapshot()
+    logger.info('Statistiques générées: %s utilisateurs, %s posts', snapshot.total_users, snapshot.total_posts)
+    return snapshot.pk
 
 # Configuration des tâches avec des priorités
 app.conf.task_routes = {
@@ -273,6 +283,10 @@ app.conf.task_routes = {
     '*.cleanup_expired_stories': {'queue': 'maintenance'},
     '*.update_user_statistics': {'queue': 'maintenance'},
     '*.generate_statistics': {'queue': 'maintenance'},
+    '*.reconcile_counters': {'queue': 'maintenance'},
+    '*.reconcile_user_stats': {'queue': 'maintenance'},
+    '*.recompute_hot_scores': {'queue': 'maintenance'},
+    '*.rollup_metrics': {'queue': 'maintenance'},
 }
 
 # Configuration des queues
@@ -0,0 +1,129 @@
+"""
+Outils de journalisation branchés dans LOGGING (yoursocial/settings.py).
+
+- BackgroundQueueHandler : les enregistrements sont mis dans une file bornée
+  et écrits par un thread dédié, les requêtes ne bloquent jamais sur stdout
+  ou sur le disque.
+- SamplingFilter : limite le débit des traces de bas niveau (DEBUG) par
+  message, avec un échantillonnage optionnel du surplus.
+- StructuredFormatter : ajoute les champs passés via `extra=` en clé=valeur.
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributs standard d'un LogRecord, exclus des champs structurés
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formatter qui suffixe le message avec les champs `extra` (clé=valeur)
+    """
+
+    def format(self, record):
+        message = super().format(record)
+        fields = {
+            key: value for key, value in record.__dict__.items()
+            if key not in _RECORD_ATTRS and not key.startswith('_')
+        }
+        if not fields:
+            return message
+        return message + ' ' + ' '.join(f'{key}={value!r}' for key, value in sorted(fields.items()))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Laisse passer au plus `rate` enregistrements par message et par fenêtre de
+    `per` secondes pour les niveaux <= `max_level`, puis une fraction `sample`
+    du surplus. Les niveaux supérieurs passent toujours.
+    """
+
+    def __init__(self, rate=20, per=1.0, sample=0.0, max_level='DEBUG'):
+        super().__init__()
+        self.rate = rate
+        self.per = per
+        self.sample = sample
+        self.max_level = max_level if isinstance(max_level, int) else logging.getLevelName(max_level)
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+
+        # Clé sur le gabarit du message (avant interpolation des arguments)
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.per:
+            if len(self._windows) > 10000:
+                self._windows.clear()
+            self._windows[key] = [now, 1]
+            return True
+        window[1] += 1
+        if window[1] <= self.rate:
+            return True
+        return self.sample > 0 and random.random() < self.sample
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    QueueHandler dont le QueueListener tourne dans un thread d'arrière-plan.
+
+    `handlers` référence des handlers déjà configurés, par exemple
+    'cfg://handlers.console' dans dictConfig (les handlers sont configurés par
+    ordre alphabétique : ce handler doit donc porter un nom qui les suit).
+    Quand la file est pleine, les enregistrements sont abandonnés et comptés
+    dans `dropped` plutôt que de bloquer l'appelant.
+    """
+
+    def __init__(self, handlers, maxsize=10000):
+        # Accès par index : dictConfig ne résout les 'cfg://' que via __getitem__
+        handlers = [handlers[i] for i in range(len(handlers))]
+        for handler in handlers:
+            if not isinstance(handler, logging.Handler):
+                # Message reconnu par dictConfig, qui réessaie plus tard
+                raise ValueError('target not configured yet')
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # Après un fork (gunicorn --preload) le thread du parent n'existe
+            # plus : on repart d'une file neuve dans le processus courant.
+            if self._listener_pid is not None:
+                self.queue = queue.Queue(self.maxsize)
+            self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            self._listener_pid = os.getpid()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        super().emit(record)
+
+    def close(self):
+        # Appelé par logging.shutdown() à la sortie : vide la file avant de quitter
+        with self._listener_lock:
+            if self.listener is not None and self._listener_pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self._listener_pid = None
+        super().close()
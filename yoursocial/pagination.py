@@ -0,0 +1,108 @@
+"""
+Pagination par curseur (keyset) partagée par les routeurs.
+
+Le curseur est opaque pour les clients : les valeurs de tri du dernier élément
+servi, sérialisées en JSON puis en base64. La page suivante est lue avec un
+WHERE (created_at, id) < (…) adossé à un index composite, à coût constant
+quelle que soit la profondeur, et sans doublons ni trous quand de nouvelles
+lignes arrivent. Le curseur suivant est renvoyé dans l'en-tête X-Next-Cursor ;
+sans curseur, les paramètres page/limit historiques restent acceptés.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from ninja.errors import HttpError
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(values):
+    """Encoder une liste de valeurs (dates, nombres, chaînes) en curseur opaque"""
+    data = json.dumps([_dump(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size, types=None):
+    """
+    Décoder un curseur de `size` valeurs, HttpError 400 s'il est invalide ou si
+    les valeurs ne sont pas des instances de `types` (un type par valeur)
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = [_load(value) for value in json.loads(data)]
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise HttpError(400, "Curseur invalide")
+    if len(values) != size:
+        raise HttpError(400, "Curseur invalide")
+    if types and not all(isinstance(value, type_) for value, type_ in zip(values, types)):
+        raise HttpError(400, "Curseur invalide")
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    Condition « strictement après `values` » pour un tri multi-colonnes, par
+    exemple ('-created_at', '-id') donne
+    created_at <= v0 AND (created_at < v0 OR (created_at = v0 AND id < v1))
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {previous.lstrip('-'): value for previous, value in zip(ordering[:i], values[:i])}
+        condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+
+    # Borne redondante sur la première colonne : sans elle, le OR empêche la
+    # base de démarrer le parcours d'index à la position du curseur
+    first = ordering[0]
+    bound = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+def _value(item, field):
+    name = field.lstrip('-')
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def set_next_cursor(response, values):
+    if response is not None:
+        response[NEXT_CURSOR_HEADER] = encode_cursor(values)
+
+
+def paginate_keyset(queryset, response=None, cursor=None, page=1, limit=20,
+                    ordering=('-created_at', '-id'), types=(datetime, int)):
+    """
+    Retourner une page de `queryset` triée par `ordering`, et positionner
+    X-Next-Cursor sur `response` s'il reste des éléments.
+
+    Avec un curseur, la page est lue par keyset ; sans curseur, `page` garde
+    l'ancien comportement par OFFSET pour la compatibilité des clients.
+    `types` donne le type attendu de chaque valeur du curseur.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, len(ordering), types)))
+    elif page > 1:
+        queryset = queryset[(page - 1) * limit:]
+
+    # Un élément de plus pour savoir s'il existe une page suivante
+    items = list(queryset[:limit + 1])
+    if len(items) > limit:
+        items = items[:limit]
+        set_next_cursor(response, [_value(items[-1], field) for field in ordering])
+    return items
@@ -0,0 +1,16 @@
+"""
+Accès direct à Redis pour les structures que le cache Django n'expose pas
+(sorted sets, hashes).
+"""
+
+
+def get_redis():
+    """
+    Retourner le client Redis du cache par défaut, ou None si le cache n'est
+    pas servi par django_redis (tests, cache en mémoire)
+    """
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
@@ -284,6 +284,10 @@ CORS_ALLOW_HEADERS = (
     'x-csrftoken',
     'x-requested-with',
 )
+# En-têtes lisibles par les clients navigateur (pagination par curseur)
+CORS_EXPOSE_HEADERS = (
+    'x-next-cursor',
+)
 
 
 # Configuration des cookies CSRF
@@ -315,6 +319,67 @@ CACHES = {
     }
 }
 
+# Cache des utilisateurs authentifiés (AuthBearer)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 300))  # Cache partagé (Redis)
+AUTH_USER_LOCAL_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_LOCAL_CACHE_TIMEOUT', 30))  # LRU en mémoire par worker
+AUTH_USER_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_USER_LOCAL_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 50000))  # Tokens vérifiés, gardés jusqu'à leur expiration
+
+# Fil d'actualité matérialisé (social/feed.py)
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', 800))  # Posts gardés par timeline, au-delà lecture SQL
+FEED_TIMELINE_TTL = int(os.getenv('FEED_TIMELINE_TTL', 7 * 86400))  # Timelines des utilisateurs inactifs
+FEED_FANOUT_BATCH = int(os.getenv('FEED_FANOUT_BATCH', 1000))  # Abonnés traités par lot lors de la diffusion
+FEED_FANOUT_ASYNC = os.getenv('FEED_FANOUT_ASYNC', 'True') == 'True'  # Diffusion via Celery
+# Au-delà de ce nombre d'abonnés, les posts ne sont plus diffusés : ils sont
+# fusionnés à la lecture depuis la timeline de l'auteur (0 = toujours diffuser)
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', 10000))
+FEED_CELEBRITIES_CACHE_TIMEOUT = int(os.getenv('FEED_CELEBRITIES_CACHE_TIMEOUT', 300))  # Comptes suivis au-delà du seuil
+
+# Compteurs de likes et commentaires en écriture différée : délai maximal
+# avant application en base
+COUNTERS_FLUSH_INTERVAL = int(os.getenv('COUNTERS_FLUSH_INTERVAL', 10))
+LIKES_BATCH_MAX_SIZE = int(os.getenv('LIKES_BATCH_MAX_SIZE', 500))  # Opérations par appel à /likes/batch
+
+# Autocomplétion des hashtags (index en mémoire de chaque processus)
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv('AUTOCOMPLETE_MAX_RESULTS', 20))  # Suggestions au plus par requête
+AUTOCOMPLETE_SCAN_LIMIT = int(os.getenv('AUTOCOMPLETE_SCAN_LIMIT', 200))  # Au-delà, classement précalculé
+AUTOCOMPLETE_REFRESH_INTERVAL = int(os.getenv('AUTOCOMPLETE_REFRESH_INTERVAL', 5))  # Relecture des modifications
+AUTOCOMPLETE_REFRESH_LAG = int(os.getenv('AUTOCOMPLETE_REFRESH_LAG', 60))  # Marge de relecture, en secondes
+
+# Tendances en flux : classements recalculés par Celery beat
+TRENDING_REFRESH_INTERVAL = int(os.getenv('TRENDING_REFRESH_INTERVAL', 60))
+TRENDING_BOARD_SIZE = int(os.getenv('TRENDING_BOARD_SIZE', 100))  # Entrées gardées par classement
+TRENDING_BUCKET_CAPACITY = int(os.getenv('TRENDING_BUCKET_CAPACITY', 10000))  # Éléments gardés par tranche close
+
+# Score de popularité des posts (tri order=hot)
+HOT_SCORE_DECAY = int(os.getenv('HOT_SCORE_DECAY', 45000))  # Secondes pour qu'un engagement pèse 10 fois moins
+HOT_SCORE_WEIGHTS = {'likes_count': 1, 'comments_count': 2}  # Poids d'un like, d'un commentaire
+HOT_SCORE_RECOMPUTE_DAYS = int(os.getenv('HOT_SCORE_RECOMPUTE_DAYS', 7))  # Posts rescorés par recompute_hot_scores
+
+# Statistiques globales : instantané enregistré par Celery beat (social/statistics.py)
+STATISTICS_SNAPSHOT_INTERVAL = int(os.getenv('STATISTICS_SNAPSHOT_INTERVAL', 900))
+# Statistiques par utilisateur (messagerie, stories) : durée du cache
+USER_STATISTICS_CACHE_TIMEOUT = int(os.getenv('USER_STATISTICS_CACHE_TIMEOUT', 30))
+# Métriques agrégées par heure (social/metrics.py) : heures rattrapées par rollup_metrics
+METRICS_ROLLUP_CATCHUP_HOURS = int(os.getenv('METRICS_ROLLUP_CATCHUP_HOURS', 168))
+
+# Recherche plein texte (social/search.py)
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'simple')  # Configuration de recherche PostgreSQL
+SEARCH_MAX_TERMS = int(os.getenv('SEARCH_MAX_TERMS', 8))  # Termes pris en compte par requête
+SEARCH_CANDIDATES = int(os.getenv('SEARCH_CANDIDATES', 5000))  # Correspondances les plus récentes classées
+SEARCH_PARALLEL = os.getenv('SEARCH_PARALLEL', 'True') == 'True'  # Types interrogés en parallèle
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', 8))  # Threads du pool de recherche, par processus
+SEARCH_CACHE_TIMEOUT = int(os.getenv('SEARCH_CACHE_TIMEOUT', 30))  # Résultats de /search en cache
+SEARCH_USERS_CACHE_TIMEOUT = int(os.getenv('SEARCH_USERS_CACHE_TIMEOUT', 60))  # Résultats de /users/search en cache
+
+# Suggestions de comptes à la saisie (users/typeahead.py)
+TYPEAHEAD_MAX_RESULTS = int(os.getenv('TYPEAHEAD_MAX_RESULTS', 20))  # Suggestions au plus par requête
+TYPEAHEAD_MIN_SIMILARITY = float(os.getenv('TYPEAHEAD_MIN_SIMILARITY', 0.3))  # Seuil de similarité des trigrammes
+TYPEAHEAD_FOLLOW_BOOST = float(os.getenv('TYPEAHEAD_FOLLOW_BOOST', 0.2))  # Bonus de similarité des comptes suivis
+TYPEAHEAD_CANDIDATES = int(os.getenv('TYPEAHEAD_CANDIDATES', 200))  # Candidats par préfixe et par trigrammes (PostgreSQL)
+TYPEAHEAD_REFRESH_INTERVAL = int(os.getenv('TYPEAHEAD_REFRESH_INTERVAL', 30))  # Relecture des nouveaux comptes
+TYPEAHEAD_REBUILD_INTERVAL = int(os.getenv('TYPEAHEAD_REBUILD_INTERVAL', 3600))  # Reconstruction complète de l'index
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
@@ -346,19 +411,53 @@ API_DESCRIPTION = "API pour le réseau social YourSocial"
 API_VERSION = "1.0.0"
 API_DOCS_URL = "/api/docs"
 
+# Journalisation des applications (voir yoursocial/log.py)
+LOG_APP_LOGGERS = ['yoursocial', 'users', 'social', 'messaging', 'notifications']
+# Niveau par défaut, surchargeable par logger (ex. LOG_LEVEL_USERS=DEBUG)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')
+# Traces DEBUG : au plus N par message et par seconde, puis une fraction échantillonnée
+LOG_DEBUG_RATE = int(os.getenv('LOG_DEBUG_RATE', 20))
+LOG_DEBUG_SAMPLE = float(os.getenv('LOG_DEBUG_SAMPLE', 0.01))
+# Taille de la file du handler asynchrone (au-delà, les traces sont abandonnées)
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
 # Configuration pour le développement
 if DEBUG:
     # Logging pour le développement
     LOGGING = {
         'version': 1,
         'disable_existing_loggers': False,
+        'formatters': {
+            'structured': {
+                '()': 'yoursocial.log.StructuredFormatter',
+                'format': '{levelname} {asctime} {name} {message}',
+                'style': '{',
+            },
+        },
+        'filters': {
+            'sampled_debug': {
+                '()': 'yoursocial.log.SamplingFilter',
+                'rate': LOG_DEBUG_RATE,
+                'sample': LOG_DEBUG_SAMPLE,
+            },
+        },
         'handlers': {
             'console': {
                 'class': 'logging.StreamHandler',
+                'formatter': 'structured',
             },
             'file': {
                 'class': 'logging.FileHandler',
                 'filename': 'debug.log',
+                'formatter': 'structured',
+            },
+            # Écritures déportées dans un thread : les requêtes n'attendent
+            # jamais stdout ni le disque
+            'queue': {
+                '()': 'yoursocial.log.BackgroundQueueHandler',
+                'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+                'maxsize': LOG_QUEUE_SIZE,
+                'filters': ['sampled_debug'],
             },
         },
         'loggers': {
@@ -366,9 +465,13 @@ if DEBUG:
                 'handlers': ['console', 'file'],
                 'level': 'INFO',
             },
-            'yoursocial': {
-                'handlers': ['console', 'file'],
-                'level': 'DEBUG',
+            **{
+                name: {
+                    'handlers': ['queue'],
+                    'level': os.getenv(f'LOG_LEVEL_{name.upper()}', LOG_LEVEL),
+                    'propagate': False,
+                }
+                for name in LOG_APP_LOGGERS
             },
         },
     }
@@ -393,6 +496,13 @@ if not DEBUG:
                 'style': '{',
             },
         },
+        'filters': {
+            'sampled_debug': {
+                '()': 'yoursocial.log.SamplingFilter',
+                'rate': LOG_DEBUG_RATE,
+                'sample': LOG_DEBUG_SAMPLE,
+            },
+        },
         'handlers': {
             'file': {
                 'class': 'logging.handlers.RotatingFileHandler',
@@ -401,6 +511,12 @@ if not DEBUG:
                 'backupCount': 5,
                 'formatter': 'verbose',
             },
+            'queue': {
+                '()': 'yoursocial.log.BackgroundQueueHandler',
+                'handlers': ['cfg://handlers.file'],
+                'maxsize': LOG_QUEUE_SIZE,
+                'filters': ['sampled_debug'],
+            },
         },
         'loggers': {
             'django': {
@@ -408,6 +524,14 @@ if not DEBUG:
                 'level': 'ERROR',
                 'propagate': True,
             },
+            **{
+                name: {
+                    'handlers': ['queue'],
+                    'level': os.getenv(f'LOG_LEVEL_{name.upper()}', LOG_LEVEL),
+                    'propagate': False,
+                }
+                for name in LOG_APP_LOGGERS
+            },
         },
     }
 
@@ -418,17 +542,53 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Tâches de réconciliation (parcours complet des tables) : délais propres, les
+# délais globaux des tâches (5 et 10 minutes, yoursocial/celery.py) ne suffisent pas
+RECONCILE_SOFT_TIME_LIMIT = int(os.getenv('RECONCILE_SOFT_TIME_LIMIT', 3 * 3600))
+RECONCILE_TIME_LIMIT = int(os.getenv('RECONCILE_TIME_LIMIT', 4 * 3600))
 CELERY_BEAT_SCHEDULE = {
     'cleanup-expired-stories': {
         'task': 'social.tasks.cleanup_expired_stories',
         'schedule': 3600.0,  # Toutes les heures
     },
     'update-user-statistics': {
-        'task': 'users.tasks.update_user_statistics',
+        'task': 'yoursocial.celery.update_user_statistics',
         'schedule': 86400.0,  # Tous les jours
     },
     'send-notification-digest': {
         'task': 'notifications.tasks.send_notification_digest',
         'schedule': 3600.0,  # Toutes les heures
     },
+    'flush-counters': {
+        'task': 'yoursocial.celery.flush_counters',
+        'schedule': float(COUNTERS_FLUSH_INTERVAL),
+    },
+    'reconcile-counters': {
+        'task': 'yoursocial.celery.reconcile_counters',
+        'schedule': 3600.0,  # Toutes les heures
+    },
+    'reconcile-user-stats': {
+        'task': 'yoursocial.celery.reconcile_user_stats',
+        'schedule': 86400.0,  # Tous les jours
+    },
+    'refresh-trending': {
+        'task': 'yoursocial.celery.refresh_trending',
+        'schedule': float(TRENDING_REFRESH_INTERVAL),
+    },
+    'snapshot-hashtag-index': {
+        'task': 'yoursocial.celery.snapshot_hashtag_index',
+        'schedule': 600.0,  # Toutes les 10 minutes
+    },
+    'recompute-hot-scores': {
+        'task': 'yoursocial.celery.recompute_hot_scores',
+        'schedule': 3600.0,  # Toutes les heures
+    },
+    'generate-statistics': {
+        'task': 'yoursocial.celery.generate_statistics',
+        'schedule': float(STATISTICS_SNAPSHOT_INTERVAL),
+    },
+    'rollup-metrics': {
+        'task': 'yoursocial.celery.rollup_metrics',
+        'schedule': 300.0,  # Toutes les 5 minutes : chaque heure close est agrégée peu après
+    },
 }